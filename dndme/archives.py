@@ -0,0 +1,155 @@
+import collections
+import os
+import posixpath
+import tarfile
+import threading
+import zipfile
+
+archive_extensions = ('.zip', '.tar')
+
+# How many archives to keep open (and indexed) at once
+max_open_archives = 16
+
+_archives = collections.OrderedDict()
+_archives_lock = threading.Lock()
+
+
+def is_archive(path):
+    return path.lower().endswith(archive_extensions)
+
+
+def member_name(name):
+    """
+    Tidy up a member name, e.g. monsters/./goblin.toml -> monsters/goblin.toml,
+    getting None for one that would land outside the pack, like
+    ../../settings.toml or /etc/passwd.
+    """
+    name = posixpath.normpath(name.replace('\\', '/'))
+    if name in ('.', '..') or name.startswith(('/', '../')):
+        return None
+    return name
+
+
+class ContentArchive:
+    """
+    A content pack shipped as a single zip or tar file, and read in place.
+
+    The archive's directory (or the tar's member headers) is read once, to
+    build an index of its files; after that, each file is read only when
+    somebody asks for it. An archive at content/<pack>.zip stands in for a
+    directory at content/<pack>, and the files in it can either be at the
+    top level (monsters/goblin.toml) or under a directory named for the
+    pack (<pack>/monsters/goblin.toml). Members whose names would put them
+    outside the pack's directory are left out.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.pack = os.path.splitext(os.path.basename(self.path))[0]
+        self.directory = os.path.join(os.path.dirname(self.path), self.pack)
+        self._lock = threading.Lock()
+
+        try:
+            self._file = self._open()
+            if isinstance(self._file, zipfile.ZipFile):
+                members = {x.filename: x for x in self._file.infolist()
+                        if not x.is_dir()}
+            else:
+                members = {x.name: x for x in self._file.getmembers()
+                        if x.isfile()}
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            raise ValueError(f"Can't read archive {self.path}: {e}")
+
+        members = {member_name(x): member for x, member in members.items()}
+        members.pop(None, None)
+
+        prefix = f"{self.pack}/"
+        if members and all(x.startswith(prefix) for x in members):
+            members = {x[len(prefix):]: member
+                    for x, member in members.items()}
+        self._members = members
+
+    def __contains__(self, name):
+        return member_name(name) in self._members
+
+    @property
+    def names(self):
+        return sorted(self._members)
+
+    def path_for(self, name):
+        """
+        Get the path a member would have if the pack were unpacked.
+        """
+        path = os.path.normpath(os.path.join(self.directory, *name.split('/')))
+        if os.path.commonpath([path, self.directory]) != self.directory:
+            raise ValueError(f"{name} is outside {self.directory}")
+        return path
+
+    def name_for(self, path):
+        """
+        Get the member name for a path under the pack's directory.
+        """
+        relpath = os.path.relpath(os.path.abspath(path), self.directory)
+        return relpath.replace(os.sep, '/')
+
+    def read(self, name):
+        member = self._members[member_name(name)]
+        # Neither kind of archive is happy being read from several threads
+        # at once
+        with self._lock:
+            if not self._file:
+                # Closed since whoever's asking got hold of us
+                self._file = self._open()
+            if isinstance(self._file, zipfile.ZipFile):
+                return self._file.read(member)
+            return self._file.extractfile(member).read()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def _open(self):
+        if self.path.lower().endswith('.zip'):
+            return zipfile.ZipFile(self.path)
+        return tarfile.open(self.path, 'r:')
+
+
+def open_archive(path):
+    """
+    Open an archive, reusing the already-open (and already-indexed) one
+    unless the file has changed since. Archives that have changed, or that
+    haven't been used in a while, get closed.
+    """
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    stale = []
+    try:
+        with _archives_lock:
+            cached = _archives.pop(path, None)
+            if cached and cached[0] == mtime:
+                _archives[path] = cached
+                return cached[1]
+            if cached:
+                stale.append(cached[1])
+
+            archive = ContentArchive(path)
+            _archives[path] = (mtime, archive)
+            while len(_archives) > max_open_archives:
+                stale.append(_archives.popitem(last=False)[1][1])
+            return archive
+    finally:
+        for archive in stale:
+            archive.close()
+
+
+def find_archive(directory):
+    """
+    Find the archive standing in for a directory, if there is one.
+    """
+    for extension in archive_extensions:
+        path = f"{directory}{extension}"
+        if os.path.isfile(path):
+            return open_archive(path)
+    return None
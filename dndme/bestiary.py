@@ -0,0 +1,270 @@
+import fnmatch
+import glob
+import os
+import re
+import threading
+from fractions import Fraction
+
+import numpy as np
+import pytoml as toml
+
+from dndme.content import path_matches
+from dndme.dice import dice_expr
+
+damage_types = ('acid', 'bludgeoning', 'cold', 'fire', 'force', 'lightning',
+        'necrotic', 'piercing', 'poison', 'psychic', 'radiant', 'slashing',
+        'thunder')
+
+numeric_fields = ('cr', 'xp', 'ac', 'hp', 'str', 'dex', 'con', 'int', 'wis',
+        'cha', 'speed')
+categorical_fields = ('size', 'mtype', 'alignment', 'pack')
+damage_fields = ('resist', 'immune', 'vulnerable')
+
+query_term = re.compile(r'^([a-z_]+)(>=|<=|!=|=|>|<)(.+)$')
+
+
+class Bestiary:
+    """
+    A columnar index of every monster template in the content packs, for
+    searching the whole bestiary at once.
+
+    Numbers (CR, XP, AC, average HP, ability scores, and walking speed)
+    are kept in NumPy arrays, and categories (size, type, alignment, and
+    the pack a monster comes from) as arrays of codes into a list of the
+    distinct values, so that a query is a handful of vectorized masks
+    rather than a loop over thousands of monsters. Damage resistances,
+    immunities, and vulnerabilities are bitmasks over the damage types.
+
+    Example usage:
+
+    >>> bestiary.find("cr>=5 mtype=dragon size=large")
+    ['young_green_dragon']
+    """
+
+    def __init__(self, content=None, base_dir=''):
+        self.content = content
+        self.pattern = os.path.abspath(
+                os.path.join(base_dir, 'content/*/monsters/*.toml'))
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._columns = None
+
+        if content:
+            content.add_listener(self._changed)
+
+    @property
+    def columns(self):
+        """
+        Get the columns, (re)building them first if any monster has changed.
+        """
+        with self._lock:
+            if self._columns is None:
+                self._columns = self._build()
+            return self._columns
+
+    def __len__(self):
+        return len(self.columns['name'])
+
+    def find(self, query):
+        """
+        Get the names of the monsters matching a query, sorted by CR and
+        then by name.
+        """
+        columns = self.columns
+        rows = np.flatnonzero(self.mask(query))
+        order = np.lexsort((columns['name'][rows], columns['cr'][rows]))
+        return [str(columns['name'][i]) for i in rows[order]]
+
+    def mask(self, query):
+        """
+        Get a boolean mask of the monsters matching a query made up of
+        terms like cr>=5, mtype=dragon, or resist=fire, all of which must
+        match. Raises ValueError if the query doesn't make sense.
+        """
+        columns = self.columns
+        mask = np.ones(len(columns['name']), dtype=bool)
+        for term in query.split():
+            mask &= self._term_mask(columns, term.lower())
+        return mask
+
+    def row(self, name):
+        """
+        Get all the indexed values for one monster, as a dict.
+        """
+        columns = self.columns
+        rows = np.flatnonzero(columns['name'] == name)
+        if not len(rows):
+            return None
+        i = rows[0]
+        row = {'name': name, 'path': str(columns['path'][i])}
+        for field in numeric_fields:
+            row[field] = columns[field][i].item()
+        for field in categorical_fields:
+            row[field] = columns[f'{field}_values'][columns[field][i]]
+        for field in damage_fields:
+            row[field] = [x for bit, x in enumerate(damage_types)
+                    if columns[field][i] & (1 << bit)]
+        return row
+
+    def _term_mask(self, columns, term):
+        match = query_term.match(term)
+        if not match:
+            raise ValueError(f"Can't understand: {term}")
+        field, op, value = match.groups()
+
+        if field in numeric_fields:
+            try:
+                number = float(Fraction(value))
+            except (ValueError, ZeroDivisionError):
+                raise ValueError(f"Not a number: {value}")
+            column = columns[field]
+            return {
+                '=': column == number,
+                '!=': column != number,
+                '>': column > number,
+                '>=': column >= number,
+                '<': column < number,
+                '<=': column <= number,
+            }[op]
+
+        if op not in ('=', '!='):
+            raise ValueError(f"Can only use = or != with {field}")
+
+        if field in categorical_fields:
+            values = columns[f'{field}_values']
+            codes = [code for code, x in enumerate(values)
+                    if category_matches(x, value)]
+            mask = np.isin(columns[field], codes)
+        elif field in damage_fields:
+            if value not in damage_types:
+                raise ValueError(f"Unknown damage type: {value}")
+            bit = 1 << damage_types.index(value)
+            mask = (columns[field] & bit) != 0
+        elif field == 'name':
+            mask = np.array([fnmatch.fnmatchcase(x, value)
+                    for x in columns['name']], dtype=bool)
+        else:
+            raise ValueError(f"Unknown field: {field}")
+
+        return ~mask if op == '!=' else mask
+
+    def _changed(self, path):
+        if path_matches(path, self.pattern):
+            with self._lock:
+                self._rows.pop(path, None)
+                self._columns = None
+
+    def _monster_files(self):
+        if self.content:
+            return self.content.glob(self.pattern)
+        return glob.glob(self.pattern)
+
+    def _load(self, path):
+        if self.content:
+            return self.content.load(path)
+        with open(path, 'r') as fin:
+            return toml.load(fin)
+
+    def _build(self):
+        paths = sorted(self._monster_files())
+        rows = {}
+        for path in paths:
+            row = self._rows.get(path)
+            if row is None:
+                try:
+                    row = make_row(path, self._load(path))
+                except (toml.TomlError, UnicodeDecodeError, KeyError):
+                    # dndme-check will have plenty to say about it
+                    continue
+            rows[path] = row
+        self._rows = rows
+
+        # Where more than one pack has the same monster, the first wins,
+        # same as MonsterLoader
+        unique = {}
+        for path in paths:
+            if path in rows:
+                unique.setdefault(rows[path]['name'], rows[path])
+        rows = list(unique.values())
+
+        columns = {
+            'name': np.array([x['name'] for x in rows], dtype=str),
+            'path': np.array([x['path'] for x in rows], dtype=str),
+        }
+        for field in numeric_fields:
+            columns[field] = np.array([x[field] for x in rows],
+                    dtype=np.float64)
+        for field in categorical_fields:
+            values = sorted({x[field] for x in rows})
+            codes = {x: i for i, x in enumerate(values)}
+            columns[f'{field}_values'] = values
+            columns[field] = np.array([codes[x[field]] for x in rows],
+                    dtype=np.int32)
+        for field in damage_fields:
+            columns[field] = np.array([x[field] for x in rows],
+                    dtype=np.uint16)
+        return columns
+
+
+def make_row(path, monster):
+    """
+    Pull out the indexed values from a monster template.
+    """
+    row = {
+        'name': monster['name'],
+        'path': path,
+        'cr': to_number(monster.get('cr', 0)),
+        'xp': to_number(monster.get('xp', 0)),
+        'ac': to_number(monster.get('ac', 10)),
+        'hp': average_hp(monster.get('max_hp', 0)),
+        'speed': to_number(monster.get('speed', 30)),
+        'size': str(monster.get('size', '')).lower(),
+        'mtype': str(monster.get('mtype', '')).lower(),
+        'alignment': str(monster.get('alignment', '')).lower(),
+        'pack': path.split(os.sep)[-3],
+    }
+    for field in ('str', 'dex', 'con', 'int', 'wis', 'cha'):
+        row[field] = to_number(monster.get(field, 10))
+    for field in damage_fields:
+        row[field] = damage_bits(monster.get(field, ''))
+    return row
+
+
+def to_number(value):
+    """
+    Get the first number out of a value, e.g. 1/4 from "1/4", or 30 from
+    "30 ft., fly 60 ft."; NaN if there isn't one.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    match = re.search(r'\d+(/\d+|\.\d+)?', str(value))
+    if not match:
+        return float('nan')
+    return float(Fraction(match.group(0)))
+
+
+def average_hp(max_hp):
+    if isinstance(max_hp, str):
+        match = dice_expr.match(max_hp.replace(' ', ''))
+        if match:
+            times, sides, modifier = match.groups()
+            return int(times) * (int(sides) + 1) / 2 + int(modifier or 0)
+    return to_number(max_hp)
+
+
+def damage_bits(value):
+    if isinstance(value, list):
+        value = ' '.join(str(x) for x in value)
+    words = set(re.findall(r'[a-z]+', str(value).lower()))
+    return sum(1 << bit for bit, x in enumerate(damage_types) if x in words)
+
+
+def category_matches(category, value):
+    """
+    Check a category against a value (which may have wildcards), either
+    as a whole or any one part of it, so "dragon" matches a dragon,
+    "goblinoid" matches "humanoid:goblinoid", and "evil" matches
+    "neutral evil".
+    """
+    parts = [category] + re.split(r'[:\s,()]+', category)
+    return any(fnmatch.fnmatchcase(x, value) for x in parts if x)
@@ -1,14 +1,566 @@
 #!/usr/bin/env python
+import hashlib
+import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
+import click
 import pytoml as toml
 
-if __name__ == "__main__":
-    filenames = sys.argv[1:]
+from dndme.dice import dice_expr
+from dndme.expressions import compile_expression
+from dndme.random_tables import RandomTable
+from dndme.weather import Climate
+
+base_dir = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+
+default_cache_file = f"{base_dir}/.dndme-check-cache.json"
+
+# Bump this whenever the checks change, so old cached results are ignored
+checks_version = 6
+
+number = (int, float)
+text_or_list = (str, list)
+
+# For each kind of file: field name -> (allowed types, required?)
+schemas = {
+    'monster': {
+        'name': (str, True),
+        'size': (str, False),
+        'mtype': (str, False),
+        'race': (str, False),
+        'alignment': (str, False),
+        'ac': (int, False),
+        'armor': (str, False),
+        'max_hp': ((int, str), True),
+        'speed': ((int, str), False),
+        'str': (int, False),
+        'dex': (int, False),
+        'con': (int, False),
+        'int': (int, False),
+        'wis': (int, False),
+        'cha': (int, False),
+        'cr': (number, False),
+        'xp': (int, False),
+        'vulnerable': (text_or_list, False),
+        'resist': (text_or_list, False),
+        'immune': (text_or_list, False),
+        'languages': (text_or_list, False),
+        'image_url': (str, False),
+        'notes': (str, False),
+        'skills': (dict, False),
+        'senses': (dict, False),
+        'features': (dict, False),
+        'actions': (dict, False),
+        'lair_actions': (dict, False),
+        'legendary_actions': (dict, False),
+        'reactions': (dict, False),
+    },
+    'encounter': {
+        'name': (str, True),
+        'location': (str, False),
+        'notes': (str, False),
+        'groups': (dict, True),
+    },
+    'encounter group': {
+        'monster': (str, True),
+        'count': ((int, str), True),
+        'name': (text_or_list, False),
+        'alias': (text_or_list, False),
+        'max_hp': ((int, str, list), False),
+        'remove': (list, False),
+    },
+    'table': {
+        'name': (str, True),
+        'location': (str, False),
+        'dice': (str, False),
+        'notes': (str, False),
+        'entries': (dict, True),
+    },
+    'table entry': {
+        'roll': ((int, str), False),
+        'weight': (number, False),
+        'encounter': (str, False),
+        'monster': (str, False),
+        'count': ((int, str), False),
+        'groups': (dict, False),
+        'time': (text_or_list, False),
+        'description': (str, False),
+    },
+    'character': {
+        'name': (str, True),
+        'race': (str, False),
+        'cclass': (str, False),
+        'ctype': (str, False),
+        'level': (int, False),
+        'pronouns': (str, False),
+        'max_hp': (int, True),
+        'cur_hp': (int, False),
+        'ac': (int, True),
+        'initiative_mod': (int, False),
+        'image_url': (str, False),
+        'senses': (dict, False),
+    },
+    'calendar': {
+        'name': (str, True),
+        'hours_in_day': (int, True),
+        'minutes_in_hour': (int, True),
+        'leap_year_rule': (str, False),
+        'axial_tilt': (number, True),
+        'solar_days_in_year': (number, True),
+        'default_day': (int, True),
+        'default_month': (str, True),
+        'default_year': (int, True),
+        'months': (dict, True),
+        'seasons': (dict, True),
+        'festivals': (dict, False),
+        'epoch': (dict, False),
+        'weather': (dict, False),
+        'moons': (dict, False),
+    },
+    'settings': {
+        'calendar_file': (str, False),
+        'log_file': (str, False),
+        'party_file': (str, False),
+        'encounters': (str, False),
+        'images': (str, False),
+        'schedule_file': (str, False),
+        'weather': (dict, False),
+        'weather_seed': (str, False),
+    },
+}
+
+
+@click.command()
+@click.argument('paths', nargs=-1, type=click.Path(exists=True))
+@click.option('--cache-file', default=default_cache_file,
+        help=f"Where to keep results between runs; default: "
+        f"{default_cache_file}")
+@click.option('--no-cache', is_flag=True,
+        help="Check everything, even files that haven't changed.")
+@click.option('--jobs', default=None, type=int,
+        help="How many processes to check with; default: one per CPU.")
+def main(paths, cache_file, no_cache, jobs):
+    """
+    Check monsters, encounters, parties, calendars, and campaign settings,
+    and the references between them. Checks everything under content/,
+    campaigns/, and calendars/ unless given specific files or directories.
+    """
+    # Cross-checking needs to know about everything, even when we're only
+    # reporting on some things
+    everything = find_files([f"{base_dir}/{x}"
+            for x in ('content', 'campaigns', 'calendars')])
+    filenames = find_files(paths) if paths else everything
+
+    cache = {} if no_cache else load_cache(cache_file)
+    results = check_files(sorted(set(everything) | set(filenames)), cache,
+            jobs=jobs)
+    problems = [(filename, problem)
+            for filename, problem in cross_check(results)
+            if filename in filenames]
+
+    if not no_cache:
+        save_cache(cache_file, {r['hash']: r for r in results.values()})
+
+    for filename, problem in problems:
+        print(f"{os.path.relpath(filename)}: {problem}")
+
+    if problems:
+        print(f"Found {len(problems)} problems in {len(filenames)} files.")
+        sys.exit(1)
+    print(f"All good! Checked {len(filenames)} files.")
+
+
+def find_files(paths):
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, files in os.walk(path):
+                filenames.extend(os.path.join(dirpath, x)
+                        for x in files if x.endswith('.toml'))
+        else:
+            filenames.append(path)
+    return sorted(os.path.abspath(x) for x in filenames)
+
+
+def load_cache(cache_file):
+    try:
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    if cache.get('version') != checks_version:
+        return {}
+    return cache.get('results', {})
+
+
+def save_cache(cache_file, results):
+    with open(cache_file, 'w') as f:
+        json.dump({'version': checks_version, 'results': results}, f)
+
+
+def check_files(filenames, cache, jobs=None):
+    """
+    Check each file on its own, skipping any whose contents we've already
+    checked, and get back a dict of filename -> result.
+    """
+    results = {}
+    to_check = []
+
     for filename in filenames:
+        with open(filename, 'rb') as f:
+            file_hash = hashlib.sha256(f.read()).hexdigest()
+        cached = cache.get(file_hash)
+        if cached and cached['kind'] == file_kind(filename):
+            results[filename] = dict(cached, filename=filename)
+        else:
+            to_check.append(filename)
+
+    if to_check:
+        workers = jobs or os.cpu_count() or 1
+        chunksize = max(1, len(to_check) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for result in executor.map(check_file, to_check,
+                    chunksize=chunksize):
+                results[result['filename']] = result
+
+    return results
+
+
+def file_kind(filename):
+    parts = filename.split(os.sep)
+    if len(parts) > 2 and parts[-2] == 'monsters':
+        return 'monster'
+    if len(parts) > 2 and parts[-2] == 'encounters':
+        return 'encounter'
+    if len(parts) > 2 and parts[-2] == 'tables':
+        return 'table'
+    if len(parts) > 2 and parts[-2] == 'calendars':
+        return 'calendar'
+    if len(parts) > 3 and parts[-3] == 'campaigns':
+        if parts[-1] == 'settings.toml':
+            return 'settings'
+        if parts[-1] == 'party.toml':
+            return 'party'
+    return 'other'
+
+
+def check_file(filename):
+    """
+    Check a single file: does it parse, does it fit the schema for its
+    kind, and what does it refer to that we'll need to cross-check?
+    """
+    with open(filename, 'rb') as f:
+        raw = f.read()
+
+    result = {
+        'filename': filename,
+        'hash': hashlib.sha256(raw).hexdigest(),
+        'kind': file_kind(filename),
+        'problems': [],
+        'refs': {},
+    }
+
+    try:
+        data = toml.loads(raw.decode('utf-8'))
+    except (toml.TomlError, UnicodeDecodeError) as e:
+        result['problems'].append(f"Can't parse: {e}")
+        return result
+
+    checker = checkers.get(result['kind'])
+    if checker:
+        try:
+            checker(data, result)
+        except Exception as e:
+            # Whatever's in there that we didn't see coming, it's a problem
+            # with this file, not a reason to give up on all the others
+            result['problems'].append(f"Can't check: {e!r}")
+    return result
+
+
+def check_schema(data, kind, problems, where=''):
+    where = f"{where}: " if where else ''
+    for field, (types, required) in schemas[kind].items():
+        if field not in data:
+            if required:
+                problems.append(f"{where}missing {field}")
+            continue
+        value = data[field]
+        if isinstance(value, bool) or not isinstance(value, types):
+            problems.append(f"{where}{field} should be "
+                    f"{type_names(types)}, not {type(value).__name__}")
+
+
+def tables_in(data, field, problems, what):
+    """
+    Get the (key, table) pairs from a table of tables, reporting anything
+    else in it instead of tripping over it. (If the field isn't a table at
+    all, check_schema will have said so.)
+    """
+    value = data.get(field, {})
+    if not isinstance(value, dict):
+        return []
+    tables = []
+    for key, table in value.items():
+        if isinstance(table, dict):
+            tables.append((key, table))
+        else:
+            problems.append(f"{what} {key}: should be a table")
+    return tables
+
+
+def type_names(types):
+    if not isinstance(types, tuple):
+        types = (types,)
+    return ' or '.join(t.__name__ for t in types)
+
+
+def check_monster(data, result):
+    check_schema(data, 'monster', result['problems'])
+
+    max_hp = data.get('max_hp')
+    if isinstance(max_hp, str) and not dice_expr.match(max_hp):
+        result['problems'].append(f"max_hp is not a number or dice: {max_hp}")
+
+    result['refs'] = {
+        'name': data.get('name'),
+        'image_url': data.get('image_url', ''),
+    }
+
+
+def check_encounter(data, result):
+    problems = result['problems']
+    check_schema(data, 'encounter', problems)
+
+    monsters = []
+    groups = data.get('groups', {})
+    if not isinstance(groups, dict):
+        groups = {}
+    for key, group in groups.items():
+        where = f"group {key}"
+        if not isinstance(group, dict):
+            problems.append(f"{where}: should be a table")
+            continue
+        check_schema(group, 'encounter group', problems, where)
+        monsters.append([key, group.get('monster')])
+
+        count = group.get('count', 1)
+        if isinstance(count, str) and not count.isdigit() and \
+                not dice_expr.match(count):
+            try:
+                expression = compile_expression(count)
+            except ValueError:
+                problems.append(f"{where}: invalid count: {count}")
+            else:
+                unknown = [x for x in expression.names if x not in groups
+                        and x not in ('players', 'sidekicks', 'party')]
+                if unknown:
+                    problems.append(f"{where}: count refers to unknown "
+                            f"groups: {', '.join(unknown)}")
+
+        max_hp = group.get('max_hp')
+        if isinstance(max_hp, list):
+            try:
+                count = int(count)
+            except ValueError:
+                problems.append(f"{where}: has {len(max_hp)} max_hp values "
+                        f"but a variable count: {count}")
+            else:
+                if len(max_hp) != count:
+                    problems.append(f"{where}: has {len(max_hp)} max_hp "
+                            f"values but a count of {count}")
+
+    result['refs'] = {'name': data.get('name'), 'monsters': monsters}
+
+
+def check_table(data, result):
+    problems = result['problems']
+    check_schema(data, 'table', problems)
+
+    monsters = []
+    encounters = []
+    entries = data.get('entries', {})
+    if not isinstance(entries, dict):
+        entries = {}
+    for key, entry in entries.items():
+        where = f"entry {key}"
+        if not isinstance(entry, dict):
+            problems.append(f"{where}: should be a table")
+            continue
+        check_schema(entry, 'table entry', problems, where)
+        if entry.get('encounter'):
+            encounters.append([key, entry['encounter']])
+        if entry.get('monster'):
+            monsters.append([key, entry['monster']])
+        # A groups that isn't a table has already been reported
+        for group_key, group in tables_in(entry, 'groups', problems,
+                f"{where} group"):
+            monsters.append([key, group.get('monster', group_key)])
+
+    if not problems:
+        # Does it all add up to something we can roll on?
+        try:
+            RandomTable(data)
+        except (ValueError, TypeError) as e:
+            problems.append(str(e))
+
+    result['refs'] = {'monsters': monsters, 'encounters': encounters}
+
+
+def check_party(data, result):
+    images = []
+    for key, character in data.items():
+        if not isinstance(character, dict):
+            result['problems'].append(f"{key}: should be a table")
+            continue
+        check_schema(character, 'character', result['problems'], key)
+        images.append(character.get('image_url', ''))
+    result['refs'] = {'images': images}
+
+
+def check_calendar(data, result):
+    problems = result['problems']
+    check_schema(data, 'calendar', problems)
+
+    if data.get('leap_year_rule'):
+        try:
+            compile_expression(data['leap_year_rule'])(year=1)
+        except ValueError:
+            problems.append(
+                    f"invalid leap_year_rule: {data['leap_year_rule']}")
+
+    months = tables_in(data, 'months', problems, 'month')
+    month_names = {str(month.get('name', '')).lower()
+            for key, month in months}
+    for key, month in months:
+        if isinstance(month.get('days'), bool) or \
+                not isinstance(month.get('days'), int):
+            problems.append(f"month {key}: needs a number of days")
+    if str(data.get('default_month', '')).lower() not in month_names:
+        problems.append(f"unknown default_month: {data.get('default_month')}")
+
+    for kind in ('season', 'festival'):
+        for key, season in tables_in(data, f'{kind}s', problems, kind):
+            if str(season.get('month', '')).lower() not in month_names:
+                problems.append(f"{kind} {key}: unknown month: "
+                        f"{season.get('month')}")
+
+    epoch = data.get('epoch')
+    if isinstance(epoch, dict):
+        date = str(epoch.get('date', '')).split()
+        if len(date) != 3 or date[1].lower() not in month_names:
+            problems.append("epoch: date should be a date like "
+                    "'1 Hammer 1488'")
+        if not isinstance(epoch.get('day', 0), int):
+            problems.append("epoch: day should be a whole number")
+
+    check_weather(data.get('weather', {}), problems)
+
+    for key, moon in tables_in(data, 'moons', problems, 'moon'):
+        if isinstance(moon.get('period'), bool) or \
+                not isinstance(moon.get('period'), number):
+            problems.append(f"moon {key}: period should be a number")
+        full_on = str(moon.get('full_on', '')).split()
+        if len(full_on) != 3 or full_on[1].lower() not in month_names:
+            problems.append(f"moon {key}: full_on should be a date like "
+                    "'1 Hammer 1488'")
+
+
+def check_weather(weather, problems):
+    if not isinstance(weather, dict):
+        return
+    for key, climate in tables_in(weather, 'climates', problems,
+            'weather climate'):
         try:
-            data = toml.load(open(filename, 'r'))
-        except:
-            print(f"Error in {filename}!")
-            raise
-    print("All good!")
+            Climate(key, climate)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            problems.append(f"weather climate {key}: {e!r}")
+
+
+def check_settings(data, result):
+    check_schema(data, 'settings', result['problems'])
+    check_weather(data.get('weather', {}), result['problems'])
+    result['refs'] = {'paths': [data[x] for x in
+            ('calendar_file', 'party_file', 'encounters') if x in data]}
+
+
+checkers = {
+    'monster': check_monster,
+    'encounter': check_encounter,
+    'table': check_table,
+    'party': check_party,
+    'calendar': check_calendar,
+    'settings': check_settings,
+}
+
+
+def cross_check(results):
+    """
+    Check the references between files, and get back a list of
+    (filename, problem) for everything that's wrong anywhere.
+    """
+    problems = [(filename, problem)
+            for filename, result in sorted(results.items())
+            for problem in result['problems']]
+
+    monster_names = {r['refs'].get('name') for r in results.values()
+            if r['kind'] == 'monster'}
+    encounter_names = {r['refs'].get('name') for r in results.values()
+            if r['kind'] == 'encounter'}
+
+    # Image files aren't TOML, so we look for them on disk, once
+    image_files = set()
+    for top in ('content', 'campaigns'):
+        for dirpath, dirnames, files in os.walk(f"{base_dir}/{top}"):
+            if os.sep + 'images' in dirpath:
+                image_files.update(os.path.relpath(
+                    os.path.join(dirpath, x), base_dir) for x in files)
+    monster_images = {os.path.basename(x) for x in image_files
+            if x.startswith('content') and x.split(os.sep)[-2] == 'monsters'}
+    player_images = {os.path.basename(x) for x in image_files
+            if x.startswith('campaigns')}
+
+    for filename, result in sorted(results.items()):
+        refs = result['refs']
+
+        if result['kind'] == 'encounter':
+            for key, monster in refs.get('monsters', []):
+                if monster and monster not in monster_names:
+                    problems.append((filename,
+                            f"group {key}: no such monster: {monster}"))
+
+        elif result['kind'] == 'table':
+            for key, monster in refs.get('monsters', []):
+                if monster and monster not in monster_names:
+                    problems.append((filename,
+                            f"entry {key}: no such monster: {monster}"))
+            for key, encounter in refs.get('encounters', []):
+                if encounter not in encounter_names:
+                    problems.append((filename,
+                            f"entry {key}: no such encounter: {encounter}"))
+
+        elif result['kind'] == 'monster':
+            image_url = refs.get('image_url')
+            if image_url and not image_url.startswith('http') and \
+                    image_url not in monster_images:
+                problems.append((filename,
+                        f"no such monster image: {image_url}"))
+
+        elif result['kind'] == 'party':
+            for image_url in refs.get('images', []):
+                if image_url and not image_url.startswith('http') and \
+                        image_url not in player_images:
+                    problems.append((filename,
+                            f"no such player image: {image_url}"))
+
+        elif result['kind'] == 'settings':
+            for path in refs.get('paths', []):
+                if not os.path.exists(f"{base_dir}/{path}"):
+                    problems.append((filename, f"no such file: {path}"))
+
+    return problems
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from dndme.completions import CompletionData
 from dndme.dice import roll_dice_expr
 from prompt_toolkit import print_formatted_text, HTML
 from prompt_toolkit.styles import Style
@@ -25,6 +26,19 @@ class Command:
     def get_suggestions(self, words):
         return []
 
+    def register_completions(self, name, provider, sources=()):
+        """
+        Offer a vocabulary of completions built by provider, which the
+        game's completion data will cache and rebuild whenever any of the
+        source files (glob patterns, relative to the base dir) change.
+        """
+        if not self.game.completions:
+            self.game.completions = CompletionData()
+        self.game.completions.register(name, provider, sources)
+
+    def get_completions(self, name):
+        return self.game.completions.get(name)
+
     def do_command(self, *args):
         print("Nothing happens.")
 
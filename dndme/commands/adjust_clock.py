@@ -25,6 +25,9 @@ Examples:
     > {keyword} -15:07
     Okay; the time is now 00:00
 
+    > {keyword} +72:00
+    Okay; the time is now 00:00 on 4 Hammer 1488
+
 Suggestions:
 
     * 1 simple task = 15 mins; 1 complex task = 1 hour
@@ -50,7 +53,7 @@ Cited from https://rpg.stackexchange.com/questions/55461/how-to-handle-time-in-d
         if not args:
             return
 
-        m = re.match('([+-]?)(\d{1,2}):(\d{1,2})', args[0])
+        m = re.match('([+-]?)(\d+):(\d{1,2})', args[0])
         if not m:
             print("Invalid time or time adjustment")
             return
@@ -65,15 +68,25 @@ Cited from https://rpg.stackexchange.com/questions/55461/how-to-handle-time-in-d
                 print("Invalid time")
                 return
 
-            self.game.clock.hour = hours
-            self.game.clock.minute = minutes
+            self.game.clock.set_time(hours, minutes)
 
         else:
             if sign == '-':
                 hours = -hours
                 minutes = -minutes
 
-            self.game.clock.adjust_time(hours, minutes)
+            date = self.game.calendar.date
+            conditions_removed = self.game.pass_time(
+                    hours * self.game.clock.minutes_in_hour + minutes)
+            for name, conditions in conditions_removed.items():
+                self.print(f"<x>{name}</x> conditions removed: "
+                        f"{', '.join(conditions)}")
+
+            if self.game.calendar.date != date:
+                print(f"Okay; game time is now {self.game.clock} "
+                        f"on {self.game.calendar}")
+                self.game.changed = True
+                return
 
         print(f"Okay; game time is now {self.game.clock}")
         self.game.changed = True
\ No newline at end of file
@@ -1,6 +1,11 @@
+import glob
+import os
 import re
+
+import pytoml as toml
+
 from dndme.commands import Command
-from dndme.gametime import Date
+from dndme.gametime import Calendar, Date
 
 
 class AdjustDate(Command):
@@ -9,13 +14,15 @@ class AdjustDate(Command):
     help_text = """{keyword}
 {divider}
 Summary: Query, set, or adjust the in-game date using the calendar
-specified at startup.
+specified at startup, or convert a date (by default, today's) to another
+calendar.
 
 Usage:
 
     {keyword}
     {keyword} <day> <month> [<year>]
     {keyword} [+|-]<days>
+    {keyword} convert <calendar> [<day> <month> [<year>]]
 
 Examples:
 
@@ -24,13 +31,29 @@ Examples:
     {keyword} 20 July 1969
     {keyword} +7
     {keyword} -10
+    {keyword} convert gregorian
+    {keyword} convert gregorian 1 Hammer 1492
 """
 
+    def __init__(self, game, session, player_view):
+        super().__init__(game, session, player_view)
+        self.register_completions('month_names',
+                lambda: [month['name'] for month in
+                    self.game.calendar.cal_data['months'].values()],
+                sources=['calendars/*.toml'])
+        self.register_completions('calendar_names',
+                lambda: sorted(self.calendar_files()),
+                sources=['calendars/*.toml'])
+        self._calendars = {}
+
     def get_suggestions(self, words):
-        calendar = self.game.calendar
-        if len(words) == 3:
-            return [month['name']
-                    for month in calendar.cal_data['months'].values()]
+        if len(words) > 1 and words[1] == 'convert':
+            if len(words) == 3:
+                return self.get_completions('calendar_names')
+            elif len(words) == 5:
+                return self.get_completions('month_names')
+        elif len(words) == 3:
+            return self.get_completions('month_names')
 
     def do_command(self, *args):
         calendar = self.game.calendar
@@ -40,10 +63,19 @@ Examples:
             print(f"The date is {calendar}")
             return
 
+        if args[0] == 'convert':
+            self.convert(*args[1:])
+            return
+
         m_adjustment = re.match('([+-]\d+)', data)
         if m_adjustment:
             days = int(m_adjustment.groups()[0])
-            calendar.adjust_date(days)
+            minutes_in_day = calendar.cal_data['hours_in_day'] * \
+                    calendar.cal_data['minutes_in_hour']
+            conditions_removed = self.game.pass_time(days * minutes_in_day)
+            for name, conditions in conditions_removed.items():
+                self.print(f"<x>{name}</x> conditions removed: "
+                        f"{', '.join(conditions)}")
             print(f"The date is now {calendar}")
             self.game.changed = True
             return
@@ -59,4 +91,68 @@ Examples:
             self.game.changed = True
             return
 
-        print(f"Invalid date: {data}")
\ No newline at end of file
+        print(f"Invalid date: {data}")
+
+    def convert(self, *args):
+        calendar = self.game.calendar
+
+        if not args:
+            print("Need a calendar to convert to.")
+            return
+        other = self.load_calendar(args[0])
+        if not other:
+            print(f"Unknown calendar: {args[0]}")
+            return
+
+        date = calendar.date
+        if len(args) > 1:
+            date = calendar.parse_date(' '.join(args[1:]))
+            if not date:
+                print(f"Invalid date: {' '.join(args[1:])}")
+                return
+
+        try:
+            converted = calendar.convert_date(date, other)
+        except ValueError as e:
+            print(f"Can't convert: {e}")
+            return
+
+        print(f"{date.day} {date.month} {date.year} ({calendar.cal_data['name']})"
+                f" is {converted.day} {converted.month} {converted.year} "
+                f"({other.cal_data['name']})")
+
+    def calendar_files(self):
+        pattern = os.path.join(self.game.base_dir, 'calendars', '*.toml')
+        return {os.path.splitext(os.path.basename(x))[0]: x
+                for x in glob.glob(pattern)}
+
+    def load_calendar(self, name):
+        """
+        Load a calendar by its filename (without .toml) or its name.
+        """
+        for key, path in self.calendar_files().items():
+            calendar = self.compiled_calendar(path)
+            if name.lower() in (key.lower(),
+                    calendar.cal_data['name'].lower()):
+                return calendar
+        return None
+
+    def compiled_calendar(self, path):
+        """
+        Get the calendar in a file, reusing the compiled one until the
+        file changes.
+        """
+        mtime = self.game.content.mtime(path) if self.game.content else None
+        if mtime is None:
+            mtime = os.stat(path).st_mtime_ns
+
+        cached = self._calendars.get(path)
+        if not cached or cached[0] != mtime:
+            if self.game.content:
+                cal_data = self.game.content.load(path)
+            else:
+                with open(path, 'r') as fin:
+                    cal_data = toml.load(fin)
+            cached = (mtime, Calendar(cal_data))
+            self._calendars[path] = cached
+        return cached[1]
@@ -0,0 +1,144 @@
+import os
+import re
+from fnmatch import fnmatch
+
+import pytoml as toml
+
+from dndme.bestiary import Bestiary
+from dndme.commands import Command
+from dndme.commands import convert_to_int_or_dice_expr
+from dndme.encounter_builder import EncounterBuilder, difficulties
+from dndme.loaders import EncounterLoader, ImageLoader, MonsterLoader
+
+
+class Build(Command):
+
+    keywords = ['build']
+    help_text = """{keyword}
+{divider}
+Summary: Build an encounter for the loaded party out of the bestiary,
+aiming for the XP budget of the given difficulty.
+
+An encounter is at most two kinds of monster: up to three leaders, and
+optionally a pack of no stronger followers, twelve monsters in all. It's
+picked at random from every mix that fits the budget, so building again
+will give something different; if nothing fits, it's the closest mix.
+
+Optionally narrow down the monsters it may use, with the same criteria
+as `find monster`, and/or with location=<pattern> to only use monsters
+that already appear in encounters at matching locations.
+
+Once built, the encounter can be loaded right away, and/or saved with
+the campaign's other encounters.
+
+Usage: {keyword} encounter <easy|medium|hard|deadly> [<criteria>...]
+
+Examples:
+
+    {keyword} encounter hard
+    {keyword} encounter medium mtype=undead
+    {keyword} encounter deadly location=*castle* cr>=2
+"""
+
+    def get_suggestions(self, words):
+        if len(words) == 2:
+            return ['encounter']
+        if len(words) == 3 and words[1] == 'encounter':
+            return list(difficulties)
+
+    def do_command(self, *args):
+        if len(args) < 2 or args[0] != 'encounter':
+            print("Sorry; can only build encounters, of some difficulty.")
+            return
+
+        levels = [x.level for x in self.game.combat.characters.values()]
+        if not levels:
+            print("Load a party first.")
+            return
+
+        difficulty = args[1].lower()
+        criteria = [x for x in args[2:] if not x.startswith('location=')]
+        locations = [x.split('=', 1)[1] for x in args[2:]
+                if x.startswith('location=')]
+
+        if not self.game.bestiary:
+            self.game.bestiary = Bestiary(self.game.content,
+                    self.game.base_dir)
+        builder = EncounterBuilder(self.game.bestiary)
+        encounter_loader = self.get_encounter_loader()
+
+        names = None
+        if locations:
+            names = self.get_monsters_at(encounter_loader, locations[-1])
+
+        try:
+            encounter = builder.build(levels, difficulty,
+                    query=' '.join(criteria), names=names)
+        except ValueError as e:
+            print(e)
+            return
+        if locations:
+            encounter.location = locations[-1].strip('*').title()
+
+        print(encounter.notes)
+        for group in encounter.groups.values():
+            print(f"    {group['count']} x {group['monster']}")
+
+        if self.safe_input("Load it", default='y').lower().startswith('y'):
+            monsters = encounter_loader.load(encounter)
+            print(f"Loaded encounter: {encounter.name}"
+                    f" with {len(monsters)} monsters")
+
+        # With no default, a blank answer comes back as ''
+        filename = self.safe_input("Save as (blank to skip)")
+        if filename:
+            self.save_encounter(encounter, filename)
+
+    def get_encounter_loader(self):
+
+        def prompt_initiative(monster):
+            # prompt to add the monsters to initiative order
+            roll_advice = f"1d20{monster.initiative_mod:+}" \
+                    if monster.initiative_mod else "1d20"
+            roll = self.safe_input(
+                    f"Initiative for {monster.name}",
+                    default=roll_advice,
+                    converter=convert_to_int_or_dice_expr)
+            print(f"Adding to turn order at: {roll}")
+            return roll
+
+        monster_loader = MonsterLoader(
+                ImageLoader(self.game), content=self.game.content)
+        return EncounterLoader(
+                self.game.encounters_dir,
+                monster_loader,
+                self.game.combat,
+                initiative_resolver=prompt_initiative,
+                content=self.game.content)
+
+    def get_monsters_at(self, encounter_loader, location):
+        pattern = location.lower()
+        names = set()
+        for summary in encounter_loader.get_encounter_summaries():
+            if fnmatch(summary.location.lower(), pattern):
+                encounter = encounter_loader.load_encounter_file(summary.path)
+                names.update(group.get('monster', key)
+                        for key, group in encounter.groups.items())
+        return names
+
+    def save_encounter(self, encounter, filename):
+        name = re.sub(r'[^a-z0-9]+', '_', filename.lower()).strip('_')
+        path = f"{self.game.encounters_dir}/{name}.toml"
+        if os.path.exists(path):
+            print(f"Sorry; {os.path.relpath(path)} already exists.")
+            return
+
+        data = {
+            'name': filename,
+            'location': encounter.location,
+            'notes': encounter.notes,
+            'groups': encounter.groups,
+        }
+        with open(path, 'w') as fout:
+            toml.dump(data, fout)
+        print(f"OK; saved {os.path.relpath(path)}")
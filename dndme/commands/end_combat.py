@@ -59,6 +59,6 @@ Usage: {keyword}
         print(f"Combat ended in {rounds} rounds ({duration})")
 
         self.game.clock.adjust_time(minutes=math.ceil(duration_sec / 60))
-        print(f"Game time is now {self.game.clock}")
+        print(f"Game time is now {self.game.clock} on {self.game.calendar}")
 
         self.game.changed = True
\ No newline at end of file
@@ -0,0 +1,79 @@
+from math import isnan
+
+from dndme.bestiary import Bestiary, categorical_fields, damage_fields, \
+        numeric_fields
+from dndme.commands import Command
+
+
+class Find(Command):
+
+    keywords = ['find']
+    help_text = """{keyword}
+{divider}
+Summary: Search the whole bestiary for monsters matching some criteria.
+
+Criteria look like <field><op><value>, and a monster has to match all of
+them. Numbers can be compared with =, !=, <, <=, >, or >=; everything else
+can be matched with = or !=, using * as a wildcard if needed.
+
+Numbers: cr, xp, ac, hp (average), str, dex, con, int, wis, cha, speed
+Others: name, size, mtype, alignment, pack (the content pack)
+Damage types: resist, immune, vulnerable
+
+Usage: {keyword} monster <criteria>...
+
+Examples:
+
+    {keyword} monster cr>=5 mtype=dragon size=large
+    {keyword} monster alignment=evil resist=fire
+    {keyword} monster name=*goblin*
+"""
+
+    max_results = 50
+
+    def get_suggestions(self, words):
+        if len(words) == 2:
+            return ['monster']
+        if len(words) > 2 and words[1] == 'monster':
+            return [f"{x}=" for x in
+                    ('name',) + numeric_fields + categorical_fields +
+                    damage_fields]
+
+    def do_command(self, *args):
+        if not args or args[0] != 'monster':
+            print("Sorry; can only find monsters.")
+            return
+
+        if not self.game.bestiary:
+            self.game.bestiary = Bestiary(self.game.content,
+                    self.game.base_dir)
+        bestiary = self.game.bestiary
+
+        try:
+            names = bestiary.find(' '.join(args[1:]))
+        except ValueError as e:
+            print(e)
+            return
+
+        if not names:
+            print("No monsters found.")
+            return
+
+        for name in names[:self.max_results]:
+            row = bestiary.row(name)
+            cr = self.format_cr(row['cr'])
+            print(f"{name:30} CR {cr:>4}  XP {row['xp']:>6.0f}  "
+                    f"AC {row['ac']:>2.0f}  HP {row['hp']:>4.0f}  "
+                    f"{row['size']} {row['mtype']}")
+
+        if len(names) > self.max_results:
+            print(f"...and {len(names) - self.max_results} more; "
+                    "try narrowing it down.")
+        print(f"Found {len(names)} of {len(bestiary)} monsters.")
+
+    def format_cr(self, cr):
+        if isnan(cr):
+            return '?'
+        if 0 < cr < 1:
+            return f"1/{round(1 / cr)}"
+        return f"{cr:.0f}"
@@ -12,8 +12,13 @@ Summary: Get help for a command.
 Usage: {keyword} <command>
 """
 
+    def __init__(self, game, session, player_view):
+        super().__init__(game, session, player_view)
+        self.register_completions('commands',
+                lambda: list(sorted(self.game.commands.keys())))
+
     def get_suggestions(self, words):
-        return list(sorted(self.game.commands.keys()))
+        return self.get_completions('commands')
 
     def do_command(self, *args):
         if not args:
@@ -26,14 +26,21 @@ Examples:
     def __init__(self, game, session, player_view):
         super().__init__(game, session, player_view)
         self.image_loader = ImageLoader(game)
-        self.monster_loader = MonsterLoader(self.image_loader)
+        self.monster_loader = MonsterLoader(
+                self.image_loader, content=game.content)
+        self.register_completions('content_images',
+                self.image_loader.get_available_content_images,
+                sources=['content/*/images/*'])
+        self.register_completions('monster_keys',
+                self.monster_loader.get_available_monster_keys,
+                sources=['content/*/monsters/*.toml'])
 
     def get_suggestions(self, words):
         if len(words) == 2:
-            return ['monster', 'player'] + self.image_loader.get_available_content_images()
+            return ['monster', 'player'] + self.get_completions('content_images')
         if len(words) == 3:
             if words[1] == 'monster':
-                return self.monster_loader.get_available_monster_keys()
+                return self.get_completions('monster_keys')
             elif words[1] == 'player':
                 return list(sorted(self.game.combat.characters.keys()))
 
@@ -1,12 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
 from fnmatch import fnmatch
 from dndme.commands import Command
 from dndme.commands import convert_to_int, convert_to_int_or_dice_expr
-from dndme.loaders import EncounterLoader, ImageLoader, MonsterLoader, PartyLoader
+from dndme.loaders import EncounterLoader, GroupPlan, ImageLoader, \
+        MonsterLoader, PartyLoader
 
 
 class Load(Command):
 
     keywords = ['load']
+    max_prepared_encounters = 10
     help_text = """{keyword}
 {divider}
 Summary: Load stuff!
@@ -32,13 +35,19 @@ Example:
     {keyword} encounter moria
 """
 
+    def __init__(self, game, session, player_view):
+        super().__init__(game, session, player_view)
+        monster_loader = MonsterLoader(
+                ImageLoader(game), content=game.content)
+        self.register_completions('monster_keys',
+                monster_loader.get_available_monster_keys,
+                sources=['content/*/monsters/*.toml'])
+
     def get_suggestions(self, words):
         if len(words) == 2:
             return ['encounter', 'monster', 'party']
         if len(words) == 3 and words[1] == 'monster':
-            image_loader = ImageLoader(self.game)
-            monster_loader = MonsterLoader(image_loader)
-            return monster_loader.get_available_monster_keys()
+            return self.get_completions('monster_keys')
 
     def do_command(self, *args):
         if not args:
@@ -54,7 +63,8 @@ Example:
             print("Sorry; can't load that.")
 
     def load_party(self):
-        party_loader = PartyLoader(self.game.party_file)
+        party_loader = PartyLoader(
+                self.game.party_file, content=self.game.content)
         party = party_loader.load(self.game.combat)
         self.game.changed = True
         print("OK; loaded {} characters".format(len(party)))
@@ -80,16 +90,18 @@ Example:
             return roll
 
         image_loader = ImageLoader(self.game)
-        monster_loader = MonsterLoader(image_loader)
+        monster_loader = MonsterLoader(
+                image_loader, content=self.game.content)
         encounter_loader = EncounterLoader(
                 self.game.encounters_dir,
                 monster_loader,
                 self.game.combat,
                 count_resolver=prompt_count,
-                initiative_resolver=prompt_initiative)
+                initiative_resolver=prompt_initiative,
+                content=self.game.content)
 
         filter_string = f"*{args[0].lower()}*" if args else "*"
-        encounters = [e for e in encounter_loader.get_available_encounters()
+        encounters = [e for e in encounter_loader.get_encounter_summaries()
                 if fnmatch(e.name.lower(), filter_string) or
                 fnmatch(e.location.lower(), filter_string)]
 
@@ -102,13 +114,30 @@ Example:
         for i, encounter in enumerate(encounters, 1):
             print(f"{i}: {encounter.name} ({encounter.location})")
 
-        pick = self.safe_input("Load encounter", converter=convert_to_int)
+        # While the DM decides, get a short list of candidates ready to go
+        futures = []
+        executor = ThreadPoolExecutor(max_workers=4)
+        if len(encounters) <= self.max_prepared_encounters:
+            futures = [executor.submit(encounter_loader.prepare, e.path)
+                    for e in encounters]
+
+        try:
+            pick = self.safe_input("Load encounter", converter=convert_to_int)
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
         pick = pick - 1
-        if pick < 0 or pick > len(encounters):
+        if pick < 0 or pick >= len(encounters):
             print("Invalid encounter.")
             return
 
-        encounter = encounters[pick]
+        # only now do we need the whole encounter, if it's not ready yet
+        if futures and not futures[pick].cancelled():
+            encounter = futures[pick].result()
+        else:
+            encounter = encounter_loader.prepare(encounters[pick].path)
         monsters = encounter_loader.load(encounter)
         print(f"Loaded encounter: {encounter.name}"
                 f" with {len(monsters)} monsters")
@@ -127,7 +156,8 @@ Example:
             return roll
 
         image_loader = ImageLoader(self.game)
-        monster_loader = MonsterLoader(image_loader)
+        monster_loader = MonsterLoader(
+                image_loader, content=self.game.content)
         count = self.safe_input(
                 "Number of monsters",
                 converter=convert_to_int_or_dice_expr)
@@ -142,9 +172,9 @@ Example:
                 self.game.encounters_dir,
                 monster_loader,
                 self.game.combat,
-                initiative_resolver=prompt_initiative)
-        encounter_loader._set_hp([], monsters)
-        encounter_loader._set_names([], monsters)
+                initiative_resolver=prompt_initiative,
+                content=self.game.content)
+        GroupPlan(monster_name, {'monster': monster_name}).apply(monsters)
         encounter_loader._add_to_combat(self.game.combat, monsters)
         for monster in monsters:
             monster.origin = "unplanned"
@@ -0,0 +1,126 @@
+import os
+
+from dndme.commands import Command
+from dndme.commands import convert_to_int_or_dice_expr
+from dndme.loaders import EncounterLoader, ImageLoader, MonsterLoader
+from dndme.random_tables import RandomTableLoader
+
+
+class RandomEncounter(Command):
+
+    keywords = ['random']
+    help_text = """{keyword}
+{divider}
+Summary: Roll on a random encounter table, and load whatever turns up.
+
+Tables live in content/<pack>/tables, and can be picked by their name,
+filename, or location. Entries may only happen at certain times of day
+(dawn, day, dusk, or night), going by the current date, time, and
+latitude.
+
+Usage: {keyword} encounter <table>
+
+Example:
+
+    {keyword} encounter wilderness
+"""
+
+    def __init__(self, game, session, player_view):
+        super().__init__(game, session, player_view)
+        self.table_loader = RandomTableLoader(
+                game.base_dir, content=game.content)
+        self.register_completions('random_tables',
+                self.table_loader.get_table_keys,
+                sources=['content/*/tables/*.toml'])
+
+    def get_suggestions(self, words):
+        if len(words) == 2:
+            return ['encounter']
+        if len(words) == 3 and words[1] == 'encounter':
+            return self.get_completions('random_tables')
+
+    def do_command(self, *args):
+        if len(args) < 2 or args[0] != 'encounter':
+            print("Sorry; can only roll random encounters, on some table.")
+            return
+
+        try:
+            table = self.table_loader.get_table(' '.join(args[1:]))
+        except ValueError as e:
+            print(e)
+            return
+        if not table:
+            print(f"No random encounter table: {' '.join(args[1:])}")
+            return
+
+        time_of_day = self.game.almanac.time_of_day(
+                self.game.calendar.date, self.game.clock, self.game.latitude)
+        entry = table.roll(time_of_day)
+        if not entry:
+            print(f"Nothing on {table.name} can happen at {time_of_day}.")
+            return
+
+        print(f"Rolled on {table.name} ({time_of_day}): "
+                f"{entry.get('name', entry['key'])}")
+        if entry.get('description'):
+            print(entry['description'].strip())
+        self.load_entry(table, entry)
+
+    def load_entry(self, table, entry):
+        """
+        Load the encounter for a table entry, if it has one.
+        """
+        encounter_loader = self.get_encounter_loader(table)
+        if 'encounter' in entry:
+            encounter = self.find_encounter(encounter_loader,
+                    entry['encounter'])
+            if not encounter:
+                print(f"Can't find encounter: {entry['encounter']}")
+                return
+        else:
+            encounter = table.encounter_for(entry)
+            if not encounter:
+                return
+
+        monsters = encounter_loader.load(encounter)
+        print(f"Loaded encounter: {encounter.name}"
+                f" with {len(monsters)} monsters")
+
+    def get_encounter_loader(self, table):
+
+        def prompt_count(count, monster_name="monsters"):
+            count = self.safe_input(
+                    f"Number of {monster_name}",
+                    default=count,
+                    converter=convert_to_int_or_dice_expr)
+            return count
+
+        def prompt_initiative(monster):
+            # prompt to add the monsters to initiative order
+            roll_advice = f"1d20{monster.initiative_mod:+}" \
+                    if monster.initiative_mod else "1d20"
+            roll = self.safe_input(
+                    f"Initiative for {monster.name}",
+                    default=roll_advice,
+                    converter=convert_to_int_or_dice_expr)
+            print(f"Adding to turn order at: {roll}")
+            return roll
+
+        # Encounters named by a table come from the table's own pack
+        encounters_dir = os.path.join(
+                os.path.dirname(os.path.dirname(table.path)), 'encounters')
+        monster_loader = MonsterLoader(
+                ImageLoader(self.game), content=self.game.content)
+        return EncounterLoader(
+                encounters_dir,
+                monster_loader,
+                self.game.combat,
+                count_resolver=prompt_count,
+                initiative_resolver=prompt_initiative,
+                content=self.game.content)
+
+    def find_encounter(self, encounter_loader, name):
+        for summary in encounter_loader.get_encounter_summaries():
+            if summary.name.lower() == name.lower():
+                return encounter_loader.prepare(summary.path)
+        return None
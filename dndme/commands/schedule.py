@@ -0,0 +1,213 @@
+import threading
+
+from dndme.commands import Command
+from dndme.gametime import Time
+from dndme.writers import ScheduleWriter
+
+
+class Schedule(Command):
+
+    keywords = ['schedule']
+    help_text = """{keyword}
+{divider}
+Summary: Schedule something to happen at a future game time, list what's
+scheduled, or cancel it. When game time reaches a scheduled event (by way
+of the time, date, or end commands), its message is shown and written to
+the campaign log; a message starting with / is run as a command instead.
+
+Usage:
+
+    {keyword}
+    {keyword} in <number> <units> [<number> <units>...] <message>
+    {keyword} at <time> [on <date>] <message>
+    {keyword} on <date> [at <time>] <message>
+    {keyword} cancel <number>
+
+Times can be like 18:30, or one of: dawn, sunrise, noon, sunset, dusk,
+midnight. Units are minutes, hours, or days.
+
+Examples:
+
+    {keyword} in 3 days The caravan reaches Phandalin
+    {keyword} in 1 hour 30 minutes The guard changes
+    {keyword} at dusk on 15 Mirtul 1489 The werewolves hunt
+    {keyword} at midnight /log The ritual is complete
+    {keyword} cancel 2
+"""
+
+    named_times = ['dawn', 'sunrise', 'noon', 'sunset', 'dusk', 'midnight']
+
+    def __init__(self, game, session, player_view):
+        super().__init__(game, session, player_view)
+        if self.game.timeline:
+            self.game.timeline.add_listener(self.time_moved)
+
+    def get_suggestions(self, words):
+        if len(words) == 2:
+            return ['in', 'at', 'on', 'cancel']
+        elif len(words) > 2 and words[-2] == 'at':
+            return self.named_times
+
+    def do_command(self, *args):
+        scheduler = self.game.scheduler
+
+        if not args:
+            if not len(scheduler):
+                print("Nothing scheduled.")
+            for i, event in enumerate(scheduler.events, 1):
+                print(f"{i}. {self.format_when(event.minutes)}: "
+                        f"{event.message}")
+            return
+
+        if args[0] == 'cancel':
+            events = scheduler.events
+            try:
+                event = events[int(args[1]) - 1]
+            except (IndexError, ValueError):
+                print("Need the number of a scheduled event to cancel.")
+                return
+            scheduler.cancel(event)
+            self.save()
+            print(f"Okay; cancelled: {event.message}")
+            return
+
+        try:
+            minutes, words = self.parse_when(list(args))
+        except ValueError as e:
+            print(e)
+            return
+        if not words:
+            print("Need a message or command to schedule.")
+            return
+        if minutes <= self.game.timeline.minutes:
+            print("That time has already passed.")
+            return
+
+        event = scheduler.add(minutes, ' '.join(words))
+        self.save()
+        print(f"Okay; scheduled for {self.format_when(minutes)}: "
+                f"{event.message}")
+
+    def parse_when(self, words):
+        """
+        Parse when an event should happen from the start of the words,
+        getting the game time and the rest of the words.
+        """
+        timeline = self.game.timeline
+
+        if words[0] == 'in':
+            words.pop(0)
+            minutes = 0
+            while len(words) >= 2 and words[0].isdigit() and \
+                    self.unit_minutes(words[1]):
+                minutes += int(words.pop(0)) * self.unit_minutes(words.pop(0))
+            if not minutes:
+                raise ValueError("Need how long, e.g. in 3 days")
+            return timeline.minutes + minutes, words
+
+        at = date = None
+        while words and words[0] in ('at', 'on'):
+            if words.pop(0) == 'at':
+                if not words:
+                    raise ValueError("Need a time")
+                at = words.pop(0).lower()
+            else:
+                date, words = self.parse_date(words)
+
+        if not at and not date:
+            raise ValueError("Need when: in ..., at ..., or on ...")
+
+        minutes = self.minutes_at(date or timeline.date, at or "midnight")
+        if not date and minutes <= timeline.minutes:
+            # Already passed today, so the next one
+            tomorrow = self.game.calendar.date_from_date_and_offset(
+                    timeline.date, 1)
+            minutes = self.minutes_at(tomorrow, at)
+        return minutes, words
+
+    def parse_date(self, words):
+        calendar = self.game.calendar
+        # The year is optional
+        for length in (3, 2):
+            date = calendar.parse_date(' '.join(words[:length]))
+            if date and len(words) >= length:
+                return date, words[length:]
+        raise ValueError(f"Invalid date: {' '.join(words[:3])}")
+
+    def minutes_at(self, date, at):
+        almanac = self.game.almanac
+        timeline = self.game.timeline
+        hours_in_day = self.game.calendar.cal_data['hours_in_day']
+
+        if at in ('dawn', 'sunrise', 'sunset', 'dusk'):
+            event = getattr(almanac, at)(date, self.game.latitude)
+            if not event:
+                raise ValueError(f"There's no {at} then at this latitude.")
+            time, date = event
+        elif at == 'noon':
+            time = Time(hours_in_day // 2, 0)
+        elif at == 'midnight':
+            time = Time(0, 0)
+        else:
+            try:
+                hour, minute = map(int, at.split(':'))
+            except ValueError:
+                raise ValueError(f"Invalid time: {at}")
+            if not (0 <= hour < hours_in_day and
+                    0 <= minute < timeline.minutes_in_hour):
+                raise ValueError(f"Invalid time: {at}")
+            time = Time(hour, minute)
+        return timeline.minutes_at(date, time)
+
+    def unit_minutes(self, unit):
+        timeline = self.game.timeline
+        unit = unit.lower().rstrip('s')
+        return {
+            'min': 1,
+            'minute': 1,
+            'hour': timeline.minutes_in_hour,
+            'day': timeline.minutes_in_day,
+        }.get(unit)
+
+    def format_when(self, minutes):
+        date, time = self.game.timeline.date_and_time(minutes)
+        return f"{date.day} {date.month} {date.year} " \
+                f"{time.hour:02}:{time.minute:02}"
+
+    def time_moved(self, previous, minutes):
+        # Events print things and may run commands, so they only go off
+        # on the main thread, same as every other command; anything due in
+        # the meantime waits for game time to move on there
+        if minutes > previous and \
+                threading.current_thread() is threading.main_thread():
+            self.fire()
+
+    def fire(self):
+        """
+        Show, log, or run every event that's come due.
+        """
+        events = self.game.scheduler.due(self.game.timeline.minutes)
+        if not events:
+            return
+        self.save()
+
+        log = self.game.commands.get('log')
+        for event in events:
+            when = self.format_when(event.minutes)
+            print(f"Scheduled for {when}: {event.message}")
+            if log:
+                log.log_message(f"{when}: {event.message}", with_bullet=True)
+
+            if event.message.startswith('/'):
+                words = event.message[1:].split()
+                command = self.game.commands.get(words[0]) if words else None
+                if command:
+                    command.do_command(*words[1:])
+                else:
+                    print(f"Unknown command: {event.message}")
+        self.game.changed = True
+
+    def save(self):
+        if self.game.schedule_file:
+            writer = ScheduleWriter(self.game.schedule_file)
+            writer.write(self.game.scheduler, self.game.timeline)
@@ -17,6 +17,11 @@ Examples:
     {keyword} Aragorn smolder 3
     {keyword} Gandalf concentrating 1 minute
     {keyword} Gollum lucid 5 minutes
+    {keyword} Bilbo poisoned 1 hour
+    {keyword} Frodo exhausted 2 days
+
+Durations count down a round at a time in combat, and run out as game
+time passes outside of it (e.g. with the time and date commands).
 """
     conditions = [
         'blinded',
@@ -46,6 +51,10 @@ Examples:
         'minute': 10,
         'minutes': 10,
         'min': 10,
+        'hour': 600,
+        'hours': 600,
+        'day': 14400,
+        'days': 14400,
     }
 
     def get_suggestions(self, words):
@@ -1,3 +1,4 @@
+import html
 import re
 from dndme.commands import Command
 
@@ -8,45 +9,125 @@ class ShowCalendar(Command):
     help_text = """{keyword}
 {divider}
 Summary: Show an overview of the calendar for the current year,
-or a given year.
+or a given year or range of years, optionally with the days each moon
+is full or new, and optionally written to a file (for handouts).
 
 Usage:
 
-    {keyword} [year]
+    {keyword} [<year>[..<year>]] [moons] [> <filename>]
 
 Examples:
 
     {keyword}
     {keyword} 1488
+    {keyword} 1488 moons
+    {keyword} 1480..1499 moons > handout.txt
 """
 
+    # Enough for a good long campaign, not so many we'd be at it all day
+    max_years = 100
+
     def do_command(self, *args):
         calendar = self.game.calendar
-        
+
+        args = list(args)
+        filename = None
+        if '>' in args:
+            i = args.index('>')
+            filename = ' '.join(args[i + 1:])
+            args = args[:i]
+            if not filename:
+                print("Need a file to write the calendar to.")
+                return
+
+        show_moons = 'moons' in args
+        args = [x for x in args if x != 'moons']
+
         if args:
-            try:
-                year = int(args[0])
-            except ValueError:
-                print(f"Invalid year: {year}")
+            m_years = re.match(r'^(-?\d+)(?:\.\.(-?\d+))?$', ''.join(args))
+            if not m_years:
+                print(f"Invalid year: {' '.join(args)}")
+                return
+            first_year = int(m_years.group(1))
+            last_year = int(m_years.group(2) or first_year)
+            if last_year < first_year:
+                print("The range should end after it starts")
+                return
+            if last_year - first_year + 1 > self.max_years:
+                print(f"Can only show up to {self.max_years} years at once.")
                 return
         else:
-            year = calendar.date.year
+            first_year = last_year = calendar.date.year
+
+        lines = []
+        for year in range(first_year, last_year + 1):
+            if lines:
+                lines.append("")
+            lines.extend(self.render_year(year, show_moons))
+
+        if not filename:
+            for line in lines:
+                self.print(line)
+            return
 
-        self.print(f"<x1>{year}</x1>")
-        print("-" * 20)
+        try:
+            with open(filename, 'w') as f:
+                for line in lines:
+                    f.write(html.unescape(re.sub(r'</?x1?>', '', line)) +
+                            "\n")
+        except OSError as e:
+            print(f"Can't write {filename}: {e}")
+            return
+        print(f"OK; wrote {last_year - first_year + 1} years to {filename}")
+
+    def render_year(self, year, show_moons=False):
+        """
+        Get the lines for a year, as HTML for self.print, so names from
+        the calendar data are escaped.
+        """
+        calendar = self.game.calendar
+        moons = calendar.cal_data.get('moons', {})
+
+        start = calendar.year_start(year)
+        end = start + calendar.days_in_year(year) - 1
+        seasons = calendar.seasonal_index(year)
+        moon_events = self.game.almanac.moon_events(
+                calendar.date_from_ordinal(start),
+                calendar.date_from_ordinal(end)) if show_moons else {}
+
+        lines = [f"<x1>{year}</x1>", "-" * 20]
+        month_start = start
         for key, month in calendar.cal_data['months'].items():
             days_in_month = calendar.days_in_month(key, year)
-            sdates = calendar.seasonal_dates_in_month(key)
-            if sdates:
-                if days_in_month > 1:
-                    sdates = ', '.join([f"{x['name']}: {x['day']}" for x in sdates])
-                else:
-                    sdates = ', '.join([f"{x['name']}" for x in sdates])
-            sdates = f" - {sdates}" if sdates else ""
-            
+            days = range(month_start, month_start + days_in_month)
+            month_start += days_in_month
             if days_in_month == 0:
                 continue
-            elif days_in_month == 1:
-                self.print(f"     <x>{month['name']}</x>{sdates}")
+
+            notes = []
+            sdates = [(ordinal - days.start + 1, name)
+                    for ordinal in days for name in seasons.get(ordinal, [])]
+            if days_in_month > 1:
+                notes.extend(f"{name}: {day}" for day, name in sdates)
+            else:
+                notes.extend(name for day, name in sdates)
+
+            for moon_key, moon in moons.items():
+                for phase in ('full', 'new'):
+                    mdays = [str(ordinal - days.start + 1) for ordinal in days
+                            if (moon_key, phase) in moon_events.get(ordinal, [])]
+                    if not mdays:
+                        continue
+                    if days_in_month > 1:
+                        notes.append(f"{moon['name']} {phase}: "
+                                f"{', '.join(mdays)}")
+                    else:
+                        notes.append(f"{moon['name']} {phase}")
+
+            notes = html.escape(f" - {', '.join(notes)}") if notes else ""
+            name = html.escape(month['name'])
+            if days_in_month == 1:
+                lines.append(f"     <x>{name}</x>{notes}")
             else:
-                print(f"1-{days_in_month} {month['name']}{sdates}")
\ No newline at end of file
+                lines.append(f"1-{days_in_month} {name}{notes}")
+        return lines
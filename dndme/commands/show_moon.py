@@ -1,45 +1,97 @@
-import re
 from dndme.commands import Command
-from dndme.gametime import Date
+
 
 class ShowMoon(Command):
 
     keywords = ['moon', 'moons']
     help_text = """{keyword}
 {divider}
-Summary: show the current phases of all moons, or the phases of all moons
-on a specific date.
+Summary: show the current phases of all moons, the phases of all moons
+on a specific date, or a table of them for a range of dates. Or find
+the next dates when all the moons are in the same phase together, or
+line up in their cycles.
+
+Usage:
 
-Usage: {keyword} [<date>]
+    {keyword} [<date>[..<date>]]
+    {keyword} next <phase>|together [<count>]
 
 Examples:
 
     moon
     moon 1 Hammer 1488
+    moon 1 Hammer..30 Mirtul
+    moon 1 Hammer 1488..1 Hammer 1489
+    moon next full
+    moon next new 5
+    moon next together 3
     """
 
+    def get_suggestions(self, words):
+        if len(words) == 3 and words[1] == 'next':
+            return ['full', 'new', 'together']
+
     def do_command(self, *args):
         almanac = self.game.almanac
         calendar = self.game.calendar
-        latitude = self.game.latitude
 
-        date = None
+        if args and args[0] == 'next':
+            self.show_next(*args[1:])
+            return
+
         data = ' '.join(args)
+        start, _, end = data.partition('..')
 
-        if not data:
-            date = calendar.date
-        else:
-            m_date = re.match('(\d+) (\w+) *(\d*)', data)
-            if m_date:
-                date = Date(
-                        int(m_date.groups()[0]),
-                        m_date.groups()[1],
-                        int(m_date.groups()[2] or calendar.date.year))
-        
-        if date:
+        start_date = calendar.parse_date(start) if start else calendar.date
+        if not start_date:
+            print(f"Invalid date: {start}")
+            return
+
+        if not end:
             for moon_key, moon_info in calendar.cal_data['moons'].items():
-                phase, _ = almanac.moon_phase(moon_key, date)
+                phase, _ = almanac.moon_phase(moon_key, start_date)
                 print(f"{moon_info['name']}: {phase}")
             return
-        
-        print(f"Invalid date: {data}")
\ No newline at end of file
+
+        # The end defaults to the same year as the start
+        end_date = calendar.parse_date(end, default_year=start_date.year)
+        if not end_date:
+            print(f"Invalid date: {end.strip()}")
+            return
+        if calendar.ordinal(end_date) < calendar.ordinal(start_date):
+            print("The range should end after it starts")
+            return
+
+        moons = almanac.moon_phases(start_date, end_date)
+        names = [calendar.cal_data['moons'][x]['name'] for x in moons]
+        phases = [phases for phases, _ in moons.values()]
+
+        print(f"{'Date':20} " + " ".join(f"{x:16}" for x in names))
+        start = calendar.ordinal(start_date)
+        for i, ordinal in enumerate(range(start,
+                calendar.ordinal(end_date) + 1)):
+            date = calendar.date_from_ordinal(ordinal)
+            day = f"{date.day} {date.month} {date.year}"
+            print(f"{day:20} " + " ".join(f"{x[i]:16}" for x in phases))
+
+    def show_next(self, *args):
+        calendar = self.game.calendar
+
+        count = 1
+        if args and args[-1].isdigit():
+            count = int(args[-1])
+            args = args[:-1]
+        phase = ' '.join(args).lower() or 'full'
+
+        try:
+            dates = self.game.almanac.find_conjunctions(calendar.date,
+                    count=count, phase=None if phase == 'together' else phase)
+        except ValueError as e:
+            print(e)
+            return
+
+        if not dates:
+            print("The moons won't line up like that any time soon.")
+            return
+        for date in dates:
+            print(f"{date.day} {date.month} {date.year}")
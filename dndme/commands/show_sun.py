@@ -7,25 +7,41 @@ class ShowSun(Command):
     help_text = """{keyword}
 {divider}
 Summary: show the times of the day's notable solar events,
-on the current date, at the current latitude.
+on the current date, at the current latitude; or a table of them
+for a range of dates.
 
-Usage: {keyword}
+Usage: {keyword} [<date>..<date>]
+
+Examples:
+
+    {keyword}
+    {keyword} 1 Hammer..30 Hammer
+    {keyword} 1 Hammer 1488..1 Hammer 1489
     """
 
     def do_command(self, *args):
+        data = ' '.join(args)
+        if data:
+            self.show_range(data)
+            return
+
         almanac = self.game.almanac
         calendar = self.game.calendar
         latitude = self.game.latitude
 
-        dawn, _ = almanac.dawn(calendar.date, latitude)
-        sunrise, _ = almanac.sunrise(calendar.date, latitude)
-        sunset, _ = almanac.sunset(calendar.date, latitude)
-        dusk, _ = almanac.dusk(calendar.date, latitude)
+        times = [almanac.dawn(calendar.date, latitude),
+                almanac.sunrise(calendar.date, latitude),
+                almanac.sunset(calendar.date, latitude),
+                almanac.dusk(calendar.date, latitude)]
+        # Near the poles, any of these may not happen on a given day
+        for name, event in zip(("Dawn:", "Sunrise:", "Sunset:", "Dusk:"),
+                times):
+            print(f"{name:8} {self.format_time(event)}")
 
-        print(f"Dawn:    {dawn.hour:2}:{dawn.minute:02}")
-        print(f"Sunrise: {sunrise.hour:2}:{sunrise.minute:02}")
-        print(f"Sunset:  {sunset.hour:2}:{sunset.minute:02}")
-        print(f"Dusk:    {dusk.hour:2}:{dusk.minute:02}")
+        if not times[1] or not times[2]:
+            print("The sun doesn't rise and set today at this latitude.")
+            return
+        sunrise, sunset = [time for time, _ in times[1:3]]
 
         minutes_in_hour = calendar.cal_data['minutes_in_hour']
         sunrise_hours = sunrise.hour + (sunrise.minute / minutes_in_hour)
@@ -35,4 +51,40 @@ Usage: {keyword}
                 sunset_hours - sunrise_hours - daylight_hours) * \
                 minutes_in_hour)
 
-        print(f"Daylight: {daylight_hours} hours, {daylight_minutes} minutes")
\ No newline at end of file
+        print(f"Daylight: {daylight_hours} hours, {daylight_minutes} minutes")
+
+    def show_range(self, data):
+        calendar = self.game.calendar
+
+        if '..' not in data:
+            print(f"Invalid date range: {data}")
+            return
+        start, end = [x.strip() for x in data.split('..', 1)]
+        start_date = calendar.parse_date(start)
+        if not start_date:
+            print(f"Invalid date: {start}")
+            return
+        # The end defaults to the same year as the start
+        end_date = calendar.parse_date(end, default_year=start_date.year)
+        if not end_date:
+            print(f"Invalid date: {end}")
+            return
+        if calendar.ordinal(end_date) < calendar.ordinal(start_date):
+            print("The range should end after it starts")
+            return
+
+        rows = self.game.almanac.sun_times(start_date, end_date,
+                self.game.latitude)
+
+        print(f"{'Date':20} {'Dawn':>7} {'Sunrise':>7} {'Sunset':>7} "
+                f"{'Dusk':>7}")
+        for date, *events in rows:
+            day = f"{date.day} {date.month} {date.year}"
+            print(f"{day:20} " + " ".join(f"{self.format_time(x):>7}"
+                    for x in events))
+
+    def format_time(self, event):
+        if not event:
+            return "  -- "
+        time, _ = event
+        return f"{time.hour:2}:{time.minute:02}"
@@ -0,0 +1,131 @@
+from dndme.commands import Command
+
+
+class Travel(Command):
+
+    keywords = ['travel']
+    help_text = """{keyword}
+{divider}
+Summary: Travel for a number of days, optionally moving north (or south,
+if negative) some degrees of latitude each day, and optionally checking
+for random encounters on a table every 12 hours along the way. Scheduled
+events fire as their time comes.
+
+Travel stops early, on the day of the first random encounter (which is
+loaded) or scheduled event; otherwise, it shows where the party was each
+day, and what the weather and daylight were like.
+
+Usage: {keyword} <days> [<latitude per day>] [through <table>]
+
+Examples:
+
+    {keyword} 3
+    {keyword} 40 -0.25
+    {keyword} 10 0.5 through wilderness
+"""
+
+    checks_per_day = 2
+
+    def get_suggestions(self, words):
+        if len(words) > 2 and words[-2] == 'through':
+            return self.get_completions('random_tables')
+        elif len(words) in (3, 4):
+            return ['through']
+
+    def do_command(self, *args):
+        args = list(args)
+        table = None
+        if 'through' in args:
+            i = args.index('through')
+            name = ' '.join(args[i + 1:])
+            args = args[:i]
+            random_encounter = self.game.commands.get('random')
+            table = random_encounter.table_loader.get_table(name) \
+                    if random_encounter else None
+            if not table:
+                print(f"No random encounter table: {name}")
+                return
+
+        try:
+            days = int(args[0])
+            latitude_per_day = float(args[1]) if len(args) > 1 else 0
+            if days < 1:
+                raise ValueError()
+        except (IndexError, ValueError):
+            print("Need a number of days to travel, and optionally how far "
+                    "north (or south) to go each day.")
+            return
+
+        game = self.game
+        almanac = game.almanac
+        calendar = game.calendar
+        minutes_in_day = calendar.cal_data['hours_in_day'] * \
+                calendar.cal_data['minutes_in_hour']
+        step = minutes_in_day // self.checks_per_day
+
+        itinerary = []
+        hit = None
+        for day in range(1, days + 1):
+            game.latitude = round(max(-90, min(90,
+                    game.latitude + latitude_per_day)), 4)
+
+            for check in range(self.checks_per_day):
+                pending = len(game.scheduler) if game.scheduler else 0
+                conditions_removed = game.pass_time(step if check else
+                        minutes_in_day - step * (self.checks_per_day - 1))
+                for name, conditions in conditions_removed.items():
+                    self.print(f"<x>{name}</x> conditions removed: "
+                            f"{', '.join(conditions)}")
+                if game.scheduler and len(game.scheduler) < pending:
+                    hit = "a scheduled event"
+                    break
+
+                if table:
+                    time_of_day = almanac.time_of_day(calendar.date,
+                            game.clock, game.latitude)
+                    entry = table.roll(time_of_day)
+                    if entry and any(x in entry for x in
+                            ('encounter', 'groups', 'monster')):
+                        hit = entry
+                        break
+
+            date = calendar.date
+            sunrise = almanac.sunrise(date, game.latitude)
+            sunset = almanac.sunset(date, game.latitude)
+            if sunrise and sunset:
+                (sunrise_time, sunrise_date), (sunset_time, sunset_date) = \
+                        sunrise, sunset
+                daylight = calendar.timeline.minutes_at(
+                        sunset_date, sunset_time) - \
+                        calendar.timeline.minutes_at(sunrise_date, sunrise_time)
+                daylight = f"{daylight // 60}h{daylight % 60:02}m daylight"
+            else:
+                daylight = "no sunrise or sunset"
+            weather = game.current_weather
+            itinerary.append(f"Day {day}: {date.day} {date.month} {date.year}"
+                    f", {game.latitude}°, {weather or 'weather unknown'}, "
+                    f"{daylight}")
+            if hit:
+                break
+
+        for line in itinerary:
+            print(line)
+
+        if hit:
+            print(f"Travel stopped on day {day} of {days}, at "
+                    f"{game.clock}, for {self.describe(hit)}.")
+            if isinstance(hit, dict):
+                if hit.get('description'):
+                    print(hit['description'].strip())
+                self.game.commands['random'].load_entry(table, hit)
+        else:
+            print(f"Arrived after {days} days; it's now {game.clock} on "
+                    f"{calendar}.")
+
+        # Just the one update for the player view, at the end
+        game.changed = True
+
+    def describe(self, hit):
+        if isinstance(hit, dict):
+            return hit.get('name', hit['key'].replace('_', ' '))
+        return hit
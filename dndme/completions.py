@@ -0,0 +1,98 @@
+import os
+import threading
+import traceback
+
+from dndme.content import path_matches
+
+
+class CompletionData:
+    """
+    Cache the vocabularies that commands offer as completions, so typing
+    at the prompt never has to wait on building them.
+
+    Commands register a provider for each vocabulary, along with the files
+    it's built from. When the content tree says one of those files has
+    changed, the vocabulary is rebuilt in a background thread and swapped
+    in once it's ready; until then the old one keeps being served.
+    """
+
+    def __init__(self, content=None, base_dir=''):
+        self.content = content
+        self.base_dir = base_dir
+        self._lock = threading.Lock()
+        self._providers = {}
+        self._sources = {}
+        self._cache = {}
+        self._dirty = set()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+        if content:
+            content.add_listener(self._changed)
+
+    def start(self):
+        self._thread = threading.Thread(
+                name="dndme-completion-data", target=self._run, daemon=True)
+        self._thread.start()
+
+    def register(self, name, provider, sources=()):
+        """
+        Register a callable that returns a list of completions. Sources are
+        glob patterns (relative to the base dir) of the files it depends on.
+        """
+        with self._lock:
+            self._providers[name] = provider
+            self._sources[name] = [os.path.join(self.base_dir, x)
+                    for x in sources]
+            self._dirty.add(name)
+        self._wakeup.set()
+
+    def get(self, name):
+        if not self.content:
+            # No way to know when things change, so no caching either
+            provider = self._providers.get(name)
+            return list(provider() or []) if provider else []
+
+        with self._lock:
+            if name in self._cache:
+                return self._cache[name]
+            provider = self._providers.get(name)
+
+        # Not built yet (or nobody's running the background thread), so
+        # we've no choice but to build it now
+        if not provider:
+            return []
+        return self.refresh(name)
+
+    def invalidate(self, name):
+        with self._lock:
+            self._dirty.add(name)
+        self._wakeup.set()
+
+    def refresh(self, name):
+        with self._lock:
+            provider = self._providers[name]
+            self._dirty.discard(name)
+        completions = list(provider() or [])
+        with self._lock:
+            self._cache[name] = completions
+        return completions
+
+    def _changed(self, path):
+        with self._lock:
+            names = [name for name, sources in self._sources.items()
+                    if any(path_matches(path, x) for x in sources)]
+        for name in names:
+            self.invalidate(name)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._lock:
+                dirty = list(self._dirty)
+            for name in dirty:
+                try:
+                    self.refresh(name)
+                except Exception:
+                    traceback.print_exc()
@@ -0,0 +1,486 @@
+import copy
+import fnmatch
+import glob
+import io
+import os
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import pytoml as toml
+
+from dndme.archives import is_archive, open_archive
+
+
+class ContentTree:
+    """
+    Keep an in-memory copy of the data files under a set of directories.
+
+    The tree knows the path and mtime of every file under its roots, so
+    listings never have to go back to the disk, and it holds on to the
+    parsed data of every TOML file that has been loaded. A ContentWatcher
+    tells it which files change, so only those get re-parsed.
+
+    A content pack can also be a zip or tar archive sitting where its
+    directory would be; the files inside it are listed (and loaded) as if
+    the archive had been unpacked, though loose files win over them.
+    """
+
+    def __init__(self, roots):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self._lock = threading.RLock()
+        self._mtimes = {}
+        self._data = {}
+        self._pending = {}
+        self._indexes = {}
+        self._listeners = []
+        self._members = {}
+        self.scan()
+
+    def scan(self):
+        mtimes = {}
+        archives = []
+        for root in self.roots:
+            for dirpath, dirnames, filenames in os.walk(root):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        mtimes[path] = os.stat(path).st_mtime_ns
+                    except FileNotFoundError:
+                        continue
+                    if is_archive(path):
+                        archives.append(path)
+
+        members = {}
+        for path in archives:
+            for member_path, member in _list_archive(path):
+                if member_path not in mtimes:
+                    mtimes[member_path] = mtimes[path]
+                    members[member_path] = member
+
+        with self._lock:
+            changed = [path for path in set(mtimes) | set(self._mtimes)
+                    if mtimes.get(path) != self._mtimes.get(path) or
+                    members.get(path) != self._members.get(path)]
+            for path in changed:
+                self._forget(path)
+            self._mtimes = mtimes
+            self._members = members
+
+        for path in changed:
+            self._notify(path)
+
+    def covers(self, path):
+        path = os.path.abspath(path)
+        return any(path == root or path.startswith(root + os.sep)
+                for root in self.roots)
+
+    def add_listener(self, listener):
+        """
+        Register a callable to be told the path of each file that changes.
+        """
+        self._listeners.append(listener)
+
+    def add_index(self, name, pattern, key):
+        """
+        Maintain a lookup table of key(data) for every parsed file whose
+        path matches the glob pattern.
+        """
+        index = ContentIndex(os.path.abspath(pattern), key)
+        with self._lock:
+            for path, data in self._data.items():
+                if index.matches(path):
+                    index.add(path, data)
+            self._indexes[name] = index
+        return index
+
+    def index(self, name):
+        return self._indexes.get(name)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._mtimes)
+
+    def mtime(self, path):
+        with self._lock:
+            return self._mtimes.get(os.path.abspath(path))
+
+    def glob(self, pattern):
+        """
+        Like glob.glob, but answered from memory when the tree covers the
+        directory being searched.
+        """
+        pattern = os.path.abspath(pattern)
+        if not self.covers(_literal_prefix(pattern)):
+            return glob.glob(pattern)
+
+        with self._lock:
+            paths = list(self._mtimes)
+        return [path for path in paths if path_matches(path, pattern)]
+
+    def in_archive(self, path):
+        with self._lock:
+            return os.path.abspath(path) in self._members
+
+    def is_loaded(self, path):
+        with self._lock:
+            return os.path.abspath(path) in self._data
+
+    def load(self, path):
+        """
+        Get the parsed contents of a TOML file, parsing it only if we don't
+        already have it. Callers get their own copy to mutate as they like.
+
+        If the file is being parsed in the background, wait for just that.
+        """
+        path = os.path.abspath(path)
+        if not self.covers(path):
+            # Nobody's watching it, so we can't safely hang on to it
+            return _parse_toml(path)
+
+        with self._lock:
+            data = self._data.get(path)
+            future = self._pending.get(path)
+
+        if data is None and future:
+            data = future.result()
+            with self._lock:
+                if self._pending.get(path) is future:
+                    self._pending.pop(path)
+                    self._store(path, data)
+
+        if data is None:
+            data = self._parse(path)
+            with self._lock:
+                self._store(path, data)
+
+        return copy.deepcopy(data)
+
+    def open(self, path):
+        """
+        Open a text file for reading, whether it's loose or in an archive.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            member = self._members.get(path)
+        if member:
+            return io.StringIO(_read_member(*member).decode('utf-8'))
+        return open(path, 'r')
+
+    def prefetch(self, paths, executor):
+        """
+        Parse files in the background on the given executor; anyone who
+        loads one of them before it's done will wait for just that file.
+        """
+        for path in paths:
+            path = os.path.abspath(path)
+            with self._lock:
+                if path in self._data or path in self._pending:
+                    continue
+                member = self._members.get(path)
+                if member:
+                    future = executor.submit(_parse_member, *member)
+                else:
+                    future = executor.submit(_parse_toml, path)
+                self._pending[path] = future
+            future.add_done_callback(
+                    lambda future, path=path: self._prefetched(path, future))
+
+    def _prefetched(self, path, future):
+        with self._lock:
+            if self._pending.get(path) is not future:
+                # Already collected, or the file changed while we were
+                # parsing it
+                return
+            self._pending.pop(path)
+            if not future.exception():
+                self._store(path, future.result())
+
+    def update(self, path):
+        """
+        Note that a file was created or changed; re-parse it if we were
+        holding on to its data, or if it's something we keep an index of.
+        """
+        path = os.path.abspath(path)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self.remove(path)
+            return
+
+        with self._lock:
+            if self._mtimes.get(path) == mtime and \
+                    path not in self._members:
+                return
+            self._mtimes[path] = mtime
+            self._members.pop(path, None)
+            reparse = path in self._data or path in self._pending or \
+                    any(x.matches(path) for x in self._indexes.values())
+            self._forget(path)
+
+        if is_archive(path):
+            self._update_archive(path)
+
+        if reparse:
+            try:
+                data = _parse_toml(path)
+            except (toml.TomlError, UnicodeDecodeError):
+                # Probably caught mid-edit; the next load will complain
+                # properly if it's still broken by then.
+                data = None
+            if data is not None:
+                with self._lock:
+                    self._store(path, data)
+
+        self._notify(path)
+
+    def remove(self, path):
+        """
+        Note that a file (or a whole directory) has gone away.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            removed = [x for x in self._mtimes
+                    if x == path or x.startswith(path + os.sep)]
+            archives = [x for x in removed if is_archive(x)]
+            removed.extend(x for x, (archive, name) in self._members.items()
+                    if archive in archives and x not in removed)
+            for x in removed:
+                self._mtimes.pop(x)
+                self._members.pop(x, None)
+                self._forget(x)
+
+        for x in removed:
+            self._notify(x)
+
+    def _update_archive(self, path):
+        members = dict(_list_archive(path))
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return
+
+        with self._lock:
+            old = [x for x, (archive, name) in self._members.items()
+                    if archive == path]
+            for x in old:
+                self._mtimes.pop(x)
+                self._members.pop(x)
+                self._forget(x)
+            new = [x for x in members if x not in self._mtimes]
+            for x in new:
+                self._mtimes[x] = mtime
+                self._members[x] = members[x]
+
+        for x in sorted(set(old) | set(new)):
+            self._notify(x)
+
+    def _parse(self, path):
+        with self._lock:
+            member = self._members.get(path)
+        if member:
+            return _parse_member(*member)
+        return _parse_toml(path)
+
+    def _store(self, path, data):
+        self._data[path] = data
+        for index in self._indexes.values():
+            if index.matches(path):
+                index.add(path, data)
+
+    def _forget(self, path):
+        self._data.pop(path, None)
+        self._pending.pop(path, None)
+        for index in self._indexes.values():
+            index.discard(path)
+
+    def _notify(self, path):
+        for listener in self._listeners:
+            try:
+                listener(path)
+            except Exception:
+                # Don't let one unhappy listener stop the others hearing
+                traceback.print_exc()
+
+
+class ContentIndex:
+    """
+    A two-way lookup table between the files matching a pattern and some
+    value pulled out of each one's data (e.g. a monster's name). Where
+    more than one file has the same value, the first by path wins, same
+    as MonsterLoader, however the files happened to finish loading.
+    """
+
+    def __init__(self, pattern, key):
+        self.pattern = pattern
+        self.key = key
+        self.values = {}
+        self.paths = {}
+
+    def matches(self, path):
+        return path_matches(path, self.pattern)
+
+    def add(self, path, data):
+        self.discard(path)
+        value = self.key(data)
+        self.values[path] = value
+        current = self.paths.get(value)
+        if current is None or path < current:
+            self.paths[value] = path
+
+    def discard(self, path):
+        if path not in self.values:
+            return
+        value = self.values.pop(path)
+        if self.paths.get(value) == path:
+            self.paths.pop(value)
+            # Another file may define the same thing
+            others = [other for other, other_value in self.values.items()
+                    if other_value == value]
+            if others:
+                self.paths[value] = min(others)
+
+
+class ImageIndex:
+    """
+    Map image filenames to the /static URLs they're served from, for
+    monster images, player images, and each content pack's images.
+
+    Built once from the content tree's listing, and kept up to date as
+    the tree tells us about files coming and going.
+    """
+
+    image_patterns = {
+        'monsters': 'content/*/images/monsters/*',
+        'players': 'campaigns/*/images/*',
+        'content': 'content/*/images/*',
+    }
+
+    def __init__(self, tree, base_dir):
+        self.tree = tree
+        self.base_dir = os.path.abspath(base_dir)
+        self._lock = threading.Lock()
+        self._images = {kind: {} for kind in self.image_patterns}
+
+        for path in tree.snapshot():
+            self._add(path)
+        tree.add_listener(self._changed)
+
+    def url(self, kind, filename):
+        """
+        Get the URL for an image file of the given kind, or '' if we
+        don't have one.
+        """
+        with self._lock:
+            paths = self._images[kind].get(filename)
+            path = min(paths) if paths else None
+        return f'/static/{path}' if path else ''
+
+    def filenames(self, kind, image_dir=None):
+        """
+        List the image filenames of a kind, optionally only those in one
+        image directory (relative to the base dir).
+        """
+        with self._lock:
+            images = self._images[kind]
+            return sorted(filename for filename, paths in images.items()
+                    if image_dir is None or any(
+                        os.path.dirname(x) == image_dir for x in paths))
+
+    def _changed(self, path):
+        if self.tree.mtime(path) is None:
+            self._discard(path)
+        else:
+            self._add(path)
+
+    def _classify(self, path):
+        relpath = os.path.relpath(path, self.base_dir)
+        filename = os.path.basename(relpath)
+        if '.' not in filename or filename.startswith('.'):
+            return []
+        return [(kind, relpath, filename)
+                for kind, pattern in self.image_patterns.items()
+                if path_matches(relpath, pattern)]
+
+    def _add(self, path):
+        with self._lock:
+            for kind, relpath, filename in self._classify(path):
+                self._images[kind].setdefault(filename, set()).add(relpath)
+
+    def _discard(self, path):
+        with self._lock:
+            for kind, relpath, filename in self._classify(path):
+                paths = self._images[kind].get(filename, set())
+                paths.discard(relpath)
+                if not paths:
+                    self._images[kind].pop(filename, None)
+
+
+def warm_up(tree, base_dir, executor=None):
+    """
+    Index the monster and encounter data, and start parsing all of it in
+    the background so it's ready by the time anyone asks for it.
+    """
+    monster_pattern = f'{base_dir}/content/*/monsters/*.toml'
+    encounter_pattern = f'{base_dir}/content/*/encounters/*.toml'
+
+    tree.add_index('monsters', monster_pattern, _name)
+    tree.add_index('encounters', encounter_pattern, _name_and_location)
+
+    # TOML parsing is pure Python, so processes beat threads here
+    executor = executor or ProcessPoolExecutor()
+    tree.prefetch(tree.glob(monster_pattern) + tree.glob(encounter_pattern),
+            executor)
+    executor.shutdown(wait=False)
+
+
+def _name(data):
+    return data.get('name')
+
+
+def _name_and_location(data):
+    return (data.get('name', ''), data.get('location', ''))
+
+
+def _parse_toml(path):
+    with open(path, 'r') as fin:
+        return toml.load(fin)
+
+
+def _parse_member(archive_path, name):
+    return toml.loads(_read_member(archive_path, name).decode('utf-8'))
+
+
+def _read_member(archive_path, name):
+    return open_archive(archive_path).read(name)
+
+
+def _list_archive(path):
+    """
+    Get (path, (archive path, member name)) for each file in an archive,
+    where the path is where the file would be if the archive were unpacked.
+    """
+    try:
+        archive = open_archive(path)
+    except (OSError, ValueError):
+        traceback.print_exc()
+        return []
+    return [(archive.path_for(name), (archive.path, name))
+            for name in archive.names]
+
+
+def path_matches(path, pattern):
+    """
+    Check a path against a glob pattern the way glob would, where a *
+    doesn't reach across directories.
+    """
+    return path.count(os.sep) == pattern.count(os.sep) and \
+            fnmatch.fnmatchcase(path, pattern)
+
+
+def _literal_prefix(pattern):
+    parts = pattern.split(os.sep)
+    for i, part in enumerate(parts):
+        if any(c in part for c in '*?['):
+            return os.sep.join(parts[:i])
+    return pattern
@@ -0,0 +1,186 @@
+import numpy as np
+
+from dndme.models import Encounter
+
+difficulties = ('easy', 'medium', 'hard', 'deadly')
+
+# XP thresholds per character, by level: easy, medium, hard, deadly
+xp_thresholds = {
+    1: (25, 50, 75, 100),
+    2: (50, 100, 150, 200),
+    3: (75, 150, 225, 400),
+    4: (125, 250, 375, 500),
+    5: (250, 500, 750, 1100),
+    6: (300, 600, 900, 1400),
+    7: (350, 750, 1100, 1700),
+    8: (450, 900, 1400, 2100),
+    9: (550, 1100, 1600, 2400),
+    10: (600, 1200, 1900, 2800),
+    11: (800, 1600, 2400, 3600),
+    12: (1000, 2000, 3000, 4500),
+    13: (1100, 2200, 3400, 5100),
+    14: (1250, 2500, 3800, 5700),
+    15: (1400, 2800, 4300, 6400),
+    16: (1600, 3200, 4800, 7200),
+    17: (2000, 3900, 5900, 8800),
+    18: (2100, 4200, 6300, 9500),
+    19: (2400, 4900, 7300, 10900),
+    20: (2800, 5700, 8500, 12700),
+}
+
+# Encounter multipliers, and the number of monsters at which each starts
+# to apply (for a party of three to five)
+multipliers = (0.5, 1, 1.5, 2, 2.5, 3, 4, 5)
+multiplier_steps = (1, 2, 3, 7, 11, 15)
+
+# How far past deadly a deadly encounter may go
+deadly_ceiling = 1.25
+
+
+def party_thresholds(levels):
+    """
+    Get the party's total XP threshold for each difficulty.
+    """
+    return {difficulty: sum(xp_thresholds[max(1, min(20, level))][i]
+            for level in levels)
+            for i, difficulty in enumerate(difficulties)}
+
+
+def encounter_multiplier(monster_count, party_size):
+    """
+    Get the encounter multiplier for a number of monsters (which may be an
+    array of them), shifted a step for unusually small or large parties.
+    """
+    step = np.searchsorted(multiplier_steps, monster_count, side='right')
+    if party_size < 3:
+        step = step + 1
+    elif party_size >= 6:
+        step = step - 1
+    return np.asarray(multipliers)[step]
+
+
+class EncounterBuilder:
+    """
+    Put together an encounter for a party from the bestiary, by finding a
+    mix of monsters whose adjusted XP lands between the party's threshold
+    for the difficulty and the next one up.
+
+    An encounter is a leader (one to a few of one kind of monster) and
+    optionally a pack of followers (any number of one kind that's no
+    stronger). Every monster that fits the criteria is considered: with
+    the monsters sorted by XP, the followers that would make the budget
+    with each leader and counts are a slice, found by binary search, so
+    it's all done at once in NumPy. The encounter is picked at random
+    from every one that fits, and only if none do is it the closest.
+    """
+
+    max_leaders = 3
+    max_monsters = 12
+
+    def __init__(self, bestiary):
+        self.bestiary = bestiary
+
+    def build(self, levels, difficulty, query='', names=None, rng=None):
+        """
+        Build an encounter for a party with the given levels. The query
+        (as for Bestiary.find) and the optional collection of monster
+        names limit which monsters may be used. Raises ValueError if the
+        difficulty or query is no good, or there's nothing to build with.
+        """
+        if difficulty not in difficulties:
+            raise ValueError(f"Difficulty should be one of: "
+                    f"{', '.join(difficulties)}")
+        if not levels:
+            raise ValueError("Need a party to build an encounter for")
+        rng = rng or np.random.default_rng()
+
+        thresholds = party_thresholds(levels)
+        budget = thresholds[difficulty]
+        i = difficulties.index(difficulty)
+        ceiling = thresholds[difficulties[i + 1]] \
+                if i + 1 < len(difficulties) else budget * deadly_ceiling
+
+        columns = self.bestiary.columns
+        mask = self.bestiary.mask(query) & (columns['xp'] > 0) & \
+                (columns['xp'] < ceiling)
+        if names is not None:
+            mask &= np.isin(columns['name'], list(names))
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            raise ValueError("No monsters to build an encounter with")
+
+        # Sorted by XP, a leader's followers (no stronger, and counting
+        # each pair of the same XP once) are the monsters up to it
+        rows = rows[np.argsort(columns['xp'][rows], kind='stable')]
+        xp = columns['xp'][rows]
+        last_follower = np.arange(len(xp))[:, None, None]
+        leaders = np.arange(1, self.max_leaders + 1)
+        followers = np.arange(0, self.max_monsters)
+        counts = leaders[:, None] + followers[None, :]
+        multiplier = encounter_multiplier(counts, len(levels))
+
+        # Indexed by [leader, leader count, follower count]: the raw XP
+        # the followers need to add to land on the budget or the ceiling
+        leader_xp = xp[:, None, None] * leaders[None, :, None]
+        low = budget / multiplier - leader_xp
+        high = ceiling / multiplier - leader_xp
+        per_follower = followers[None, None, 1:]
+
+        # How many kinds of follower fit with each, starting from which
+        first = np.zeros(low.shape, dtype=int)
+        first[:, :, 1:] = np.searchsorted(xp, low[:, :, 1:] / per_follower)
+        end = np.minimum(np.searchsorted(xp, high[:, :, 1:] / per_follower),
+                last_follower + 1)
+        fits = np.zeros(low.shape, dtype=int)
+        fits[:, :, 0] = (low[:, :, 0] <= 0) & (high[:, :, 0] > 0)
+        fits[:, :, 1:] = np.maximum(end - first[:, :, 1:], 0)
+        fits[:, counts > self.max_monsters] = 0
+
+        total = fits.sum()
+        if total:
+            # Every encounter that fits is as likely as any other
+            cumulative = np.cumsum(fits)
+            choice = rng.integers(total)
+            pick = np.searchsorted(cumulative, choice, side='right')
+            follower = first.flat[pick] + choice - \
+                    (cumulative[pick] - fits.flat[pick])
+        else:
+            # Nothing quite fits, so get as close as we can, trying the
+            # followers either side of the XP that would hit the budget
+            nearest = np.zeros(low.shape, dtype=int)
+            nearest[:, :, 1:] = np.minimum(np.searchsorted(xp,
+                    low[:, :, 1:] / per_follower), last_follower)
+            below = np.maximum(nearest - 1, 0)
+            misses = [np.abs((leader_xp + xp[x] * followers) * multiplier -
+                    budget) for x in (nearest, below)]
+            closer = np.where(misses[1] < misses[0], below, nearest)
+            misses = np.where(counts > self.max_monsters, np.inf,
+                    np.minimum(*misses))
+            pick = np.argmin(misses)
+            follower = closer.flat[pick]
+        leader, leader_count, follower_count = \
+                np.unravel_index(pick, low.shape)
+        leader_count = leaders[leader_count]
+        follower_count = followers[follower_count]
+
+        groups = {}
+        for row, count in ((leader, leader_count),
+                (follower, follower_count)):
+            if count:
+                name = str(columns['name'][rows[row]])
+                group = groups.setdefault(name, {'monster': name, 'count': 0})
+                group['count'] += int(count)
+
+        raw_xp = xp[leader] * leader_count + xp[follower] * follower_count
+        adjusted_xp = raw_xp * encounter_multiplier(
+                leader_count + follower_count, len(levels))
+        notes = (f"Built as a {difficulty} encounter for a party of "
+                f"{len(levels)} (levels {', '.join(map(str, levels))}): "
+                f"{adjusted_xp:.0f} adjusted XP "
+                f"({raw_xp:.0f} XP) against a budget of {budget}.")
+
+        return Encounter(
+                name=f"{difficulty.title()} encounter",
+                location="Anywhere",
+                notes=notes,
+                groups=groups)
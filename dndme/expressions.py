@@ -0,0 +1,97 @@
+import ast
+import functools
+import sys
+
+# Before Python 3.8, literals parse as Num and NameConstant nodes rather
+# than Constant
+if sys.version_info < (3, 8):
+    constant_nodes = (ast.Constant, ast.Num, ast.NameConstant)
+else:
+    constant_nodes = (ast.Constant,)
+
+allowed_nodes = (
+    ast.Expression,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.UnaryOp, ast.UAdd, ast.USub, ast.Not,
+    ast.BoolOp, ast.And, ast.Or,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+    ast.Name, ast.Load,
+) + constant_nodes
+
+
+def constant_value(node):
+    """
+    Get the value of a literal, however this version of Python parsed it.
+    """
+    if sys.version_info < (3, 8) and isinstance(node, ast.Num):
+        return node.n
+    return node.value
+
+
+class Expression:
+    """
+    A little arithmetic (and comparison) expression, like the counts in
+    encounter groups or a calendar's leap year rule, checked for safety
+    and compiled once so it can be cheaply evaluated over and over.
+
+    Example usage:
+
+    >>> is_leap_year = compile_expression("year % 4 == 0")
+    >>> is_leap_year(year=1488)
+    True
+    >>> count = compile_expression("goblins + 2")
+    >>> count.names
+    ('goblins',)
+    >>> count(goblins=3)
+    5
+    """
+
+    def __init__(self, text, tree):
+        self.text = text
+        self.names = tuple(sorted({node.id for node in ast.walk(tree)
+                if isinstance(node, ast.Name)}))
+        self.moduli = tuple(sorted({constant_value(node.right)
+                for node in ast.walk(tree)
+                if isinstance(node, ast.BinOp) and
+                isinstance(node.op, ast.Mod) and
+                isinstance(node.right, constant_nodes)}))
+        self.constants = tuple(sorted({constant_value(node)
+                for node in ast.walk(tree)
+                if isinstance(node, constant_nodes) and
+                type(constant_value(node)) in (int, float)}))
+        self._code = compile(tree, f"<expression {text!r}>", 'eval')
+
+    def __repr__(self):
+        return f"Expression({self.text!r})"
+
+    def __call__(self, **variables):
+        missing = set(self.names) - set(variables)
+        if missing:
+            raise ValueError(f"No value for {', '.join(sorted(missing))} "
+                    f"in expression: {self.text}")
+        try:
+            return eval(self._code, {'__builtins__': {}}, variables)
+        except ArithmeticError as e:
+            # e.g. year % 0
+            raise ValueError(f"Can't evaluate expression: {self.text}: {e}")
+
+
+@functools.lru_cache(maxsize=None)
+def compile_expression(text):
+    """
+    Compile an expression, raising ValueError if it's not valid or uses
+    anything beyond numbers, variables, arithmetic, and comparisons.
+    """
+    try:
+        tree = ast.parse(str(text).strip(), mode='eval')
+    except SyntaxError:
+        raise ValueError(f"Invalid expression: {text}")
+
+    for node in ast.walk(tree):
+        if not isinstance(node, allowed_nodes):
+            raise ValueError(f"Invalid expression: {text}")
+        if isinstance(node, constant_nodes) and \
+                type(constant_value(node)) not in (int, float, bool):
+            raise ValueError(f"Invalid expression: {text}")
+
+    return Expression(text, tree)
@@ -1,23 +1,71 @@
 import math
+import re
+from bisect import bisect_right
 from collections import namedtuple
 
+import numpy as np
+
+from dndme.expressions import compile_expression
+
 Date = namedtuple('Date', 'day month year')
 Time = namedtuple('Time', 'hour minute')
 
+# Leap year rules that take longer than this to repeat are treated as if
+# they never do
+max_leap_cycle = 100000
+
 
 class Clock:
     
-    def __init__(self, hours_in_day=24, minutes_in_hour=60, hour=0, minute=0):
+    def __init__(self, hours_in_day=24, minutes_in_hour=60, hour=0, minute=0,
+            timeline=None):
         self.hours_in_day = hours_in_day
         self.minutes_in_hour = minutes_in_hour
 
-        self.hour = hour
-        self.minute = minute
+        # With a timeline, the time of day comes from that, and moving the
+        # clock past midnight moves the date along with it
+        self.timeline = timeline
+        if not timeline:
+            self._hour = hour
+            self._minute = minute
 
     def __str__(self):
         return f"{self.hour:02}:{self.minute:02}"
 
+    @property
+    def hour(self):
+        return self.timeline.time.hour if self.timeline else self._hour
+
+    @hour.setter
+    def hour(self, hour):
+        if self.timeline:
+            self.timeline.time = Time(hour, self.minute)
+        else:
+            self._hour = hour
+
+    @property
+    def minute(self):
+        return self.timeline.time.minute if self.timeline else self._minute
+
+    @minute.setter
+    def minute(self, minute):
+        if self.timeline:
+            self.timeline.time = Time(self.hour, minute)
+        else:
+            self._minute = minute
+
+    def set_time(self, hour, minute):
+        if self.timeline:
+            # All at once, so nobody watching sees a time in between
+            self.timeline.time = Time(hour, minute)
+        else:
+            self._hour, self._minute = hour, minute
+
     def adjust_time(self, hours=0, minutes=0):
+        if self.timeline:
+            self.timeline.advance(hours * self.minutes_in_hour + minutes)
+            return
+
         new_minute = (self.minute + minutes) % self.minutes_in_hour
         new_hour = (((self.hour + hours) + 
                      ((self.minute + minutes) // self.minutes_in_hour)) % 
@@ -27,15 +75,210 @@ class Clock:
         self.minute = new_minute
 
 
+class Timeline:
+    """
+    Game time, as the number of minutes since the calendar's epoch (the
+    start of the first day of year 0). The date and the time of day both
+    come from it, so they can never drift apart: skipping 72 hours, or 400
+    days, is just adding to one number.
+
+    Example usage:
+
+    >>> timeline = Timeline(calendar)
+    >>> timeline.date = Date(30, 'Hammer', 1488)
+    >>> timeline.time = Time(23, 0)
+    >>> timeline.advance(90)
+    >>> timeline.date, timeline.time
+    (Date(day=1, month='Midwinter', year=1488), Time(hour=0, minute=30))
+    """
+
+    def __init__(self, calendar, minutes=0):
+        self.calendar = calendar
+        self._listeners = []
+        self.minutes = minutes
+
+    @property
+    def minutes(self):
+        return self._minutes
+
+    @minutes.setter
+    def minutes(self, minutes):
+        previous = getattr(self, '_minutes', minutes)
+        self._minutes = minutes
+        for listener in self._listeners:
+            listener(previous, minutes)
+
+    def add_listener(self, listener):
+        """
+        Call listener(previous, minutes) whenever game time changes.
+        """
+        self._listeners.append(listener)
+
+    def rebase(self, minutes):
+        """
+        Put the same moment at a different number of minutes, as when the
+        calendar changes under it. No game time has passed, so nobody
+        listening is told.
+        """
+        self._minutes = minutes
+
+    @property
+    def minutes_in_hour(self):
+        return self.calendar.cal_data.get('minutes_in_hour', 60)
+
+    @property
+    def minutes_in_day(self):
+        return self.calendar.cal_data.get('hours_in_day', 24) * \
+                self.minutes_in_hour
+
+    @property
+    def date(self):
+        return self.calendar.date_from_ordinal(
+                self.minutes // self.minutes_in_day)
+
+    @date.setter
+    def date(self, date):
+        self.minutes = self.minutes_at(date, self.time)
+
+    @property
+    def time(self):
+        return Time(*divmod(self.minutes % self.minutes_in_day,
+                self.minutes_in_hour))
+
+    @time.setter
+    def time(self, time):
+        day_start = self.minutes - self.minutes % self.minutes_in_day
+        self.minutes = day_start + time[0] * self.minutes_in_hour + time[1]
+
+    def advance(self, minutes):
+        self.minutes += minutes
+
+    def minutes_at(self, date, time=Time(0, 0)):
+        """
+        Get the game time at a time of day on a date.
+        """
+        return self.calendar.ordinal(date) * self.minutes_in_day + \
+                time[0] * self.minutes_in_hour + time[1]
+
+    def date_and_time(self, minutes):
+        """
+        Get the date and time of day for a game time.
+        """
+        day, minute = divmod(minutes, self.minutes_in_day)
+        return (self.calendar.date_from_ordinal(day),
+                Time(*divmod(minute, self.minutes_in_hour)))
+
+
 class Calendar:
 
     def __init__(self, cal_data):
         self.cal_data = cal_data
+        self.timeline = Timeline(self)
         self.date = Date(
                 cal_data['default_day'],
                 cal_data['default_month'],
                 cal_data['default_year'])
 
+    @property
+    def date(self):
+        return self.timeline.date
+
+    @date.setter
+    def date(self, date):
+        self.timeline.date = date
+
+    @property
+    def cal_data(self):
+        return self._cal_data
+
+    @cal_data.setter
+    def cal_data(self, cal_data):
+        # Whatever the new calendar makes of the epoch, stay on the same
+        # date and time
+        timeline = getattr(self, 'timeline', None)
+        if timeline:
+            date, time = timeline.date, timeline.time
+
+        self._cal_data = cal_data
+
+        # Compile the leap year rule just the once, since it gets checked
+        # for just about every date calculation
+        leap_year_rule = cal_data.get('leap_year_rule')
+        self._leap_year_rule = compile_expression(leap_year_rule) \
+                if leap_year_rule else None
+
+        self._compile_tables()
+
+        if timeline:
+            timeline.rebase(timeline.minutes_at(date, time))
+
+    def _compile_tables(self):
+        """
+        Work out, once, everything needed to turn dates into ordinal days
+        (days since 1 <first month> of year 0) and back without walking
+        through the months or years in between.
+
+        For each kind of year (leap or not) that's the running total of
+        days at the start of each month. The leap year rule repeats every
+        so many years (the least common multiple of whatever it takes the
+        year modulo), so the running total of days at the start of each
+        year in one such cycle covers every year there is.
+        """
+        months = self.cal_data['months']
+        self._month_keys = list(months)
+        self._month_names = [x['name'] for x in months.values()]
+        self._month_index = {key: i for i, key in enumerate(months)}
+
+        self._month_starts = {}
+        for leap in (False, True):
+            starts = [0]
+            for month in months.values():
+                days = month.get('leap_year_days', month['days']) \
+                        if leap else month['days']
+                starts.append(starts[-1] + days)
+            self._month_starts[leap] = starts
+
+        rule = self._leap_year_rule
+        cycle = 1
+        if rule:
+            for modulus in rule.moduli:
+                cycle = cycle * int(modulus) // math.gcd(cycle, int(modulus))
+            # Make sure the rule really does just depend on the year modulo
+            # the cycle (and isn't something like "year > 1000 and ..."),
+            # at least around zero and any numbers it mentions
+            if cycle > max_leap_cycle or any(
+                    self.is_leap_year(year) != self.is_leap_year(year + cycle)
+                    for start in {0} | {int(x) for x in rule.constants}
+                    for year in range(start - cycle, start + cycle)):
+                cycle = None
+
+        self._leap_cycle = cycle
+        self._year_starts = {}
+
+        # Seasons and festivals, by month, and (once worked out for a year)
+        # by ordinal day
+        self._seasons_by_month = {}
+        for kind in ('seasons', 'festivals'):
+            for season in self.cal_data.get(kind, {}).values():
+                self._seasons_by_month.setdefault(
+                        season['month'].lower(), []).append(season)
+        self._seasonal_index = {}
+
+        if cycle:
+            starts = [0]
+            for year in range(cycle):
+                starts.append(starts[-1] + self.days_in_year(year))
+            self._cycle_starts = starts
+
+        # Where the calendar's ordinal days line up with epoch days, which
+        # are shared with other calendars
+        self._epoch_offset = None
+        epoch = self.cal_data.get('epoch')
+        if epoch:
+            day, month, year = epoch['date'].split()
+            self._epoch_offset = self.ordinal(
+                    Date(int(day), month, int(year))) - epoch.get('day', 0)
+
     def __str__(self):
         date = self.date
         if self.days_in_month(date.month, date.year) > 1:
@@ -43,12 +286,7 @@ class Calendar:
         return f"{date.month} {date.year}"
 
     def days_in_year(self, year):
-        days = 0
-        for month in self.cal_data['months'].values():
-            days += month.get('leap_year_days', month['days']) \
-                    if self.is_leap_year(year) \
-                    else month['days']
-        return days
+        return self._month_starts[self.is_leap_year(year)][-1]
 
     def days_in_month(self, month, year):
         month = month.lower()
@@ -58,11 +296,9 @@ class Calendar:
         return days
     
     def is_leap_year(self, year):
-        leap_year_rule = self.cal_data.get('leap_year_rule')
-        if not leap_year_rule:
+        if not self._leap_year_rule:
             return False
-        # TODO: check validity of leap_year_rule because SECURITY
-        return eval(leap_year_rule.replace('year', str(year)))
+        return bool(self._leap_year_rule(year=year))
     
     def set_date(self, date):
         if not self._date_is_valid(date):
@@ -78,114 +314,231 @@ class Calendar:
         return True
         
     def adjust_date(self, days):
-        new_date = self.date_from_date_and_offset(self.date, days)
-        self.date = new_date
+        self.timeline.advance(days * self.timeline.minutes_in_day)
 
     def date_from_date_and_offset(self, date, days):
-        month_keys = list(self.cal_data['months'].keys())
+        if not days:
+            return Date(*date)
+        return self.date_from_ordinal(self.ordinal(date) + days)
 
+    def days_since_date(self, date_then, date_now):
+        return self.ordinal(date_now) - self.ordinal(date_then)
+
+    def day_of_year(self, date):
+        if not self._date_is_valid(date):
+            return "lol nope" # TODO: raise an exception here
+
+        starts = self._month_starts[self.is_leap_year(date.year)]
+        return starts[self._month_index[date.month.lower()]] + date.day
+
+    def year_start(self, year):
+        """
+        Get the ordinal day of the first day of a year.
+        """
+        if self._leap_cycle:
+            cycles, year_in_cycle = divmod(year, self._leap_cycle)
+            return cycles * self._cycle_starts[-1] + \
+                    self._cycle_starts[year_in_cycle]
+
+        # The leap year rule doesn't repeat, so count up (or down) from
+        # the nearest year we know, remembering as we go
+        if year not in self._year_starts:
+            known = min(self._year_starts, key=lambda x: abs(x - year),
+                    default=0)
+            start = self._year_starts.get(known, 0)
+            for y in range(known, year):
+                start += self.days_in_year(y)
+                self._year_starts[y + 1] = start
+            for y in range(known - 1, year - 1, -1):
+                start -= self.days_in_year(y)
+                self._year_starts[y] = start
+            self._year_starts[year] = start
+        return self._year_starts[year]
+
+    def ordinal(self, date):
+        """
+        Get the number of days from the first day of year 0 to a date.
+        """
         day, month, year = date
+        starts = self._month_starts[self.is_leap_year(year)]
+        return self.year_start(year) + \
+                starts[self._month_index[month.lower()]] + day - 1
+
+    def date_from_ordinal(self, ordinal):
+        """
+        Get the date a number of days from the first day of year 0.
+        """
+        if self._leap_cycle:
+            cycles, day_in_cycle = divmod(ordinal, self._cycle_starts[-1])
+            year_in_cycle = bisect_right(self._cycle_starts, day_in_cycle) - 1
+            year = cycles * self._leap_cycle + year_in_cycle
+        else:
+            # Guess from the average year length, then nudge
+            average = (self._month_starts[False][-1] +
+                    self._month_starts[True][-1]) / 2
+            year = int(ordinal // average)
+            while self.year_start(year) > ordinal:
+                year -= 1
+            while self.year_start(year + 1) <= ordinal:
+                year += 1
+
+        day_in_year = ordinal - self.year_start(year)
+        starts = self._month_starts[self.is_leap_year(year)]
+        # Skips over any months with no days this year
+        i = bisect_right(starts, day_in_year) - 1
+        return Date(day_in_year - starts[i] + 1, self._month_names[i], year)
+    
+    def epoch_day(self, date):
+        """
+        Get the epoch day for a date, for converting it to other calendars.
+        """
+        if self._epoch_offset is None:
+            raise ValueError(f"{self.cal_data['name']} has no epoch")
+        return self.ordinal(date) - self._epoch_offset
+
+    def date_from_epoch_day(self, epoch_day):
+        if self._epoch_offset is None:
+            raise ValueError(f"{self.cal_data['name']} has no epoch")
+        return self.date_from_ordinal(epoch_day + self._epoch_offset)
+
+    def convert_date(self, date, calendar):
+        """
+        Convert a date in this calendar to the same day in another one.
+        """
+        return calendar.date_from_epoch_day(self.epoch_day(date))
+
+    def parse_date(self, text, default_year=None):
+        """
+        Parse a date like "1 Hammer 1488" (or "1 Hammer", in the default
+        year, which is the current year unless otherwise given), getting
+        None if it's not a valid date.
+        """
+        m_date = re.match(r'^\s*(\d+) +(\w+) *(-?\d*)\s*$', text)
+        if not m_date:
+            return None
+        day, month, year = m_date.groups()
+        month = self.cal_data['months'].get(month.lower(), {}).get('name')
+        if not month:
+            return None
+        if year:
+            year = int(year)
+        else:
+            year = self.date.year if default_year is None else default_year
+        date = Date(int(day), month, year)
+        return date if self._date_is_valid(date) else None
 
-        if days > 0:   
-            while (day + days) > self.days_in_month(month, year):
-                # bleed off days to the end of the month
-                days -= (self.days_in_month(month, year) - day)
-
-                # move to the next month
-                i = month_keys.index(month.lower())
-                
-                # advancing the month would roll over to next year
-                if i+1 == len(month_keys):
-                    i = -1
-                    year += 1
-                
-                new_month = self.cal_data['months'][month_keys[i+1]]['name']
-
-                month = new_month
-                day = 0
-            
-            day += days
-
-        elif days < 0:
-            days = abs(days)
-            while (day - days) < 1:
-                # bleed off days to the beginning of the month
-                days -= day
-
-                # move to the previous month
-                i = month_keys.index(month.lower())
-
-                # going back a month would roll over to the prior year
-                if i-1 < 0:
-                    i = 0
-                    year -= 1
-                
-                new_month = self.cal_data['months'][month_keys[i-1]]['name']
-
-                month = new_month
-                day = self.days_in_month(month, year)
-            
-            day -= days
-        
-        new_date = Date(day, month, year)
-        return new_date
+    def seasonal_dates_in_month(self, month):
+        return self._seasons_by_month.get(month.lower(), [])
+
+    def seasonal_index(self, year):
+        """
+        Get the seasons and festivals in a year, as {ordinal day: [names]}.
+        """
+        index = self._seasonal_index.get(year)
+        if index is None:
+            index = {}
+            for month, seasons in self._seasons_by_month.items():
+                for season in seasons:
+                    date = Date(season['day'], month, year)
+                    # e.g. a festival in a month only leap years have
+                    if self._date_is_valid(date):
+                        index.setdefault(self.ordinal(date), []).append(
+                                season['name'])
+            self._seasonal_index[year] = index
+        return index
+
+
+class Ephemeris:
+    """
+    A year's worth of rising and setting times for the sun, at one
+    latitude and depression, worked out for every day at once.
+
+    Times are kept as minutes from the start of each day, which may fall
+    outside the day when the sun rises before midnight or sets after it,
+    and are NaN on days when the sun doesn't get that high (or low).
+    """
+
+    def __init__(self, almanac, year, latitude, depression):
+        calendar = almanac.calendar
+        self.calendar = calendar
+        self.year = year
+        self.start = calendar.year_start(year)
+        self.hours_in_day = almanac.hours_in_day
+        self.minutes_in_hour = almanac.minutes_in_hour
 
-    def days_since_date(self, date_then, date_now):
-        days_since = 0
+        ordinals = self.start + np.arange(calendar.days_in_year(year))
+        declination = np.radians(
+                almanac.solar_declinations(year, ordinals))
+
+        # Gotta be in radians for NumPy's math functions
+        alt = math.radians(depression) # altitude of center of solar disc
+        latitude = math.radians(latitude)
+
+        cos_hour_angle = (
+            (math.sin(alt) - math.sin(latitude) * np.sin(declination)) /
+            (math.cos(latitude) * np.cos(declination))
+        )
+        with np.errstate(invalid='ignore'):
+            hour_angle = np.degrees(np.arccos(cos_hour_angle))
 
-        if date_now.year == date_then.year:
-            days_since += self.day_of_year(date_now) - self.day_of_year(date_then)
+        # longitude would factor in here if we cared
+        noon_minutes = (self.hours_in_day / 2) * self.minutes_in_hour
+        self.rising_minutes = noon_minutes - 4 * hour_angle
+        self.setting_minutes = noon_minutes + 4 * hour_angle
 
-        elif date_now.year > date_then.year:
-            # get the days until the end of the year
-            days_since += self.days_in_year(date_then.year) - \
-                    self.day_of_year(date_then)
-            year_diff = date_now.year - date_then.year
+    def rising(self, date):
+        return self._time(self.rising_minutes, date)
 
-            # get days for intervening years
-            if year_diff > 1:
-                for i in range(1, year_diff):
-                    days_since += self.days_in_year(date_then.year + i)
-            
-            # get elapsed days of current year
-            days_since += self.day_of_year(date_now)
+    def setting(self, date):
+        return self._time(self.setting_minutes, date)
 
+    def _time(self, minutes, date):
+        ordinal = self.calendar.ordinal(date)
+        time_utc = minutes[ordinal - self.start]
+        if np.isnan(time_utc):
+            return None
+
+        hour = int(time_utc // self.minutes_in_hour)
+        minute = int(time_utc % self.minutes_in_hour)
+
+        if hour > self.hours_in_day - 1:
+            hour -= self.hours_in_day
+            new_date = self.calendar.date_from_ordinal(ordinal + 1)
+        elif hour < 0:
+            hour += self.hours_in_day
+            new_date = self.calendar.date_from_ordinal(ordinal - 1)
         else:
-            # "now" is in an earlier year so invert how we count...
-            # get the days until the end of the year
-            days_since -= self.days_in_year(date_now.year) - \
-                    self.day_of_year(date_now)
-            year_diff = date_then.year - date_now.year
-
-            # get days for intervening years
-            if year_diff > 1:
-                for i in range(1, year_diff):
-                    days_since -= self.days_in_year(date_now.year + i)
-            
-            # get elapsed days of current year
-            days_since -= self.day_of_year(date_then)
-        
-        return days_since
+            new_date = date
 
-    def day_of_year(self, date):
-        if not self._date_is_valid(date):
-            return "lol nope" # TODO: raise an exception here
+        return Time(hour, minute), new_date
 
-        day_of_year = 0
-        month = date.month.lower()
 
-        for month_key in self.cal_data['months']:
-            if month_key == month:
-                day_of_year += date.day
-                break
-            else:
-                day_of_year += self.days_in_month(month_key, date.year)
+# Where each phase of the moon starts, as a fraction of the way from one
+# full moon to the next
+moon_phase_starts = np.array([0.02, 0.218, 0.25, 0.467, 0.50, 0.72, 0.75,
+        0.99])
+moon_phase_names = np.array(['full', 'waning gibbous', 'third quarter',
+        'waning crescent', 'new', 'waxing crescent', 'first quarter',
+        'waxing gibbous', 'full'])
 
-        return day_of_year
-    
-    def seasonal_dates_in_month(self, month):
-        return [x for x in self.cal_data['seasons'].values()
-                if x['month'].lower() == month.lower()]
+
+def moon_phase_name(fractions):
+    """
+    Get the names of the phases for an array of fractions of a cycle.
+    """
+    return moon_phase_names[
+            np.searchsorted(moon_phase_starts, fractions, side='right')]
+
+
+def moon_phase_span(phase):
+    """
+    Get the fractions of a cycle where a phase starts and ends; for full,
+    which wraps around, the end is past 1.
+    """
+    i = list(moon_phase_names).index(phase)
+    if i in (0, len(moon_phase_names) - 1):
+        return moon_phase_starts[-1], moon_phase_starts[0] + 1
+    return moon_phase_starts[i - 1], moon_phase_starts[i]
 
 
 # This class is based largely on the awesome Astral library:
@@ -200,6 +553,15 @@ class Almanac:
     rising = 1
     setting = -1
 
+    depression_horizon = -0.833
+
+    # How many years' worth of ephemerides to hang on to
+    max_ephemerides = 64
+
+    # How far ahead to look for moons lining up before giving up, in days
+    max_conjunction_days = 10000000
+    conjunction_chunk = 4096
+
     def __init__(self, calendar):
         self.calendar = calendar
 
@@ -208,39 +570,86 @@ class Almanac:
         self.solar_days_in_year = calendar.cal_data['solar_days_in_year']
         self.axial_tilt = calendar.cal_data['axial_tilt']
 
+        self._ephemerides = {}
+
     def dawn(self, date, latitude, depression=0):
         if not depression:
             depression = self.depression_civil
+        # None if there's no "dawn" at this latitude on this date
+        return self.ephemeris(date.year, latitude, depression).rising(date)
 
-        try:
-            return self.calc_time(depression, self.rising, date, latitude)
-        except ValueError:
-            # no "dawn" at this latitude on this date
-            return None
-    
     def sunrise(self, date, latitude):
-        try:
-            return self.calc_time(-0.833, self.rising, date, latitude)
-        except ValueError:
-            # no sunrise at this latitude on this date
-            return None
+        return self.ephemeris(date.year, latitude,
+                self.depression_horizon).rising(date)
 
     def sunset(self, date, latitude):
-        try:
-            return self.calc_time(-0.833, self.setting, date, latitude)
-        except ValueError:
-            # no sunset at this latitude on this date
-            return None
-    
+        return self.ephemeris(date.year, latitude,
+                self.depression_horizon).setting(date)
+
     def dusk(self, date, latitude, depression=0):
         if not depression:
             depression = self.depression_civil
-
-        try:
-            return self.calc_time(depression, self.setting, date, latitude)
-        except ValueError:
-            # no "dusk" at this latitude on this date
-            return None
+        return self.ephemeris(date.year, latitude, depression).setting(date)
+
+    def ephemeris(self, year, latitude, depression):
+        """
+        Get the rising and setting times for the sun at a depression, for
+        every day of a year at a latitude, working them out if need be.
+        """
+        key = (year, latitude, depression)
+        ephemeris = self._ephemerides.get(key)
+        if ephemeris is None:
+            if len(self._ephemerides) >= self.max_ephemerides:
+                self._ephemerides.clear()
+            ephemeris = Ephemeris(self, year, latitude, depression)
+            self._ephemerides[key] = ephemeris
+        return ephemeris
+
+    def sun_times(self, start_date, end_date, latitude):
+        """
+        Get (date, dawn, sunrise, sunset, dusk) for each date in a range,
+        including both ends.
+        """
+        calendar = self.calendar
+        rows = []
+        for ordinal in range(calendar.ordinal(start_date),
+                calendar.ordinal(end_date) + 1):
+            date = calendar.date_from_ordinal(ordinal)
+            rows.append((date,
+                    self.dawn(date, latitude),
+                    self.sunrise(date, latitude),
+                    self.sunset(date, latitude),
+                    self.dusk(date, latitude)))
+        return rows
+
+    def time_of_day(self, date, time, latitude):
+        """
+        Get whether it's dawn, day, dusk, or night at a time on a date.
+        """
+        sunrise = self.sunrise(date, latitude)
+        sunset = self.sunset(date, latitude)
+        if not sunrise or not sunset:
+            # Midnight sun, or polar night
+            declination = self.solar_declination(date)
+            return 'day' if declination * latitude > 0 else 'night'
+
+        dawn = self.dawn(date, latitude) or sunrise
+        dusk = self.dusk(date, latitude) or sunset
+        # Mornings that start the day before, or evenings that end the day
+        # after, cover the very start or end of this one
+        start, end = Time(0, 0), Time(self.hours_in_day, 0)
+        times = [x if x_date == date else default
+                for (x, x_date), default in ((dawn, start), (sunrise, start),
+                    (sunset, end), (dusk, end))]
+
+        time = Time(time.hour, time.minute)
+        if time < times[0] or time >= times[3]:
+            return 'night'
+        if time < times[1]:
+            return 'dawn'
+        if time < times[2]:
+            return 'day'
+        return 'dusk'
 
     def calc_time(self, depression, direction, date, latitude):
         hour_angle = direction * self.hour_angle(depression, date, latitude)
@@ -280,56 +689,203 @@ class Almanac:
     
     def solar_declination(self, date):
         # Get the solar declination in degrees...
-
+        ordinal = self.calendar.ordinal(date)
+        return float(self.solar_declinations(date.year, ordinal))
+
+    def solar_declinations(self, year, ordinals):
+        """
+        Get the solar declination in degrees for ordinal days (which may be
+        an array of them) in a year.
+        """
         # Figure out days since the previous winter solstice
-        # TODO: this section should be extracted into the Calendar?
-        ws = self.calendar.cal_data['seasons']['winter_solstice']
-        
-        ws_year = date.year \
-                if date.month == ws['month'] \
-                and date.day >= ws['day'] \
-                else date.year - 1
-
-        ws_date = Date(ws['day'], ws['month'].lower(), ws_year)
-
-        days_since_ws = self.calendar.days_since_date(ws_date, date)
+        ws_this_year = self.winter_solstice(year)
+        ws_last_year = self.winter_solstice(year - 1)
+        days_since_ws = np.where(ordinals >= ws_this_year,
+                ordinals - ws_this_year, ordinals - ws_last_year)
 
         # Figure out how much rotation has happened since the winter solstice
         deg_per_day = 360 / self.solar_days_in_year
         rotation = days_since_ws * deg_per_day
 
         # Calculate the declination
-        declination = -self.axial_tilt * math.cos(math.radians(rotation))
+        return -self.axial_tilt * np.cos(np.radians(rotation))
 
-        return declination
+    def winter_solstice(self, year):
+        ws = self.calendar.cal_data['seasons']['winter_solstice']
+        return self.calendar.ordinal(Date(ws['day'], ws['month'], year))
     
     def moon_phase(self, moon_key, date):
-        moon_data = self.calendar.cal_data['moons'][moon_key]
-        ref_day, ref_month, ref_year = moon_data['full_on'].split()
-        ref_date = Date(int(ref_day), ref_month, int(ref_year))
-        day_diff = self.calendar.days_since_date(ref_date, date)
-        period = moon_data['period']
-        period_percentage = round((day_diff/period) - int(day_diff/period), 3)
-
-        phases = {
-            (0.99, 0.02): 'full',
-            (0.02, 0.218): 'waning gibbous',
-            (0.218, 0.25): 'third quarter',
-            (0.26, 0.467): 'waning crescent',
-            (0.467, 0.50): 'new',
-            (0.50, 0.72): 'waxing crescent',
-            (0.72, 0.75): 'first quarter',
-            (0.75, 0.99): 'waxing gibbous',
-        }
-
-        phase = None
-        for (p_start, p_end), p in phases.items():
-            if p_start > p_end:
-                if period_percentage >= p_start or \
-                        period_percentage < p_end:
-                    phase = p
-                    break
-            elif p_start <= period_percentage < p_end:
-                phase = p
-                break
-        return phase, period_percentage
\ No newline at end of file
+        phases, fractions = self.moon_phases(date)[moon_key]
+        return str(phases[0]), float(fractions[0])
+
+    def moon_phases(self, start_date, end_date=None):
+        """
+        Get the phase names and fractions of every moon, for each date from
+        the start date up to and including the end date (or for just the
+        start date), as {moon_key: (phases, fractions)} arrays.
+        """
+        start = self.calendar.ordinal(start_date)
+        end = self.calendar.ordinal(end_date) if end_date else start
+        days = np.arange(start, end + 1)
+
+        return {moon_key: (moon_phase_name(fractions), fractions)
+                for moon_key, fractions in self._moon_fractions(days).items()}
+
+    def find_conjunctions(self, start_date, count=1, phase='full',
+            window=None, moons=None):
+        """
+        Find the next dates, from the start date on, when the moons (all of
+        them, or the given moon keys) are all in the same phase, e.g. all
+        full or all new; or, if the phase is None, when they're all within
+        a window of each other in their cycles, whatever phase that is.
+
+        The window is a fraction of a cycle. For a phase, it's how far from
+        the ideal full (or new) moon each moon may be, and by default the
+        phase is as the moon command would name it; for lining up, it
+        defaults to 0.02.
+
+        Rather than checking day by day, this jumps from one candidate to
+        the next: the few days around each time the moon with the longest
+        period is in the phase, or around each time the slowest-drifting
+        pair of moons line up. The rest of the moons are checked at
+        thousands of those candidates at once, so even an answer millennia
+        away is quick to find. Returns fewer dates than asked for if the
+        moons don't line up that often, or never do.
+        """
+        all_moons = self.calendar.cal_data['moons']
+        moons = list(moons or all_moons)
+        unknown = set(moons) - set(all_moons)
+        if unknown:
+            raise ValueError(f"Unknown moon: {', '.join(sorted(unknown))}")
+        if not moons:
+            return []
+        if phase is not None and phase not in moon_phase_names:
+            raise ValueError(f"Unknown phase: {phase}")
+
+        refs = {}
+        for moon_key in moons:
+            moon_data = all_moons[moon_key]
+            ref_day, ref_month, ref_year = moon_data['full_on'].split()
+            refs[moon_key] = (self.calendar.ordinal(
+                    Date(int(ref_day), ref_month, int(ref_year))),
+                    moon_data['period'])
+
+        if phase is not None:
+            if window is None:
+                low, high = moon_phase_span(phase)
+            else:
+                ideal = {'full': 0.0, 'new': 0.5}.get(phase,
+                        sum(moon_phase_span(phase)) / 2)
+                low, high = ideal - window, ideal + window
+
+            # Candidates are the days around each time the moon with the
+            # longest period is in the phase; a day of slack on each side
+            # covers the rounding of fractions
+            ref, period = max(refs.values(), key=lambda x: x[1])
+            spacing = period
+            offset = ref + period * (low + high) / 2
+            half_width = period * (high - low) / 2 + 1
+
+            def matches(days):
+                fractions = self._moon_fractions(days, moons)
+                ok = np.ones(len(days), dtype=bool)
+                for x in fractions.values():
+                    if window is None:
+                        ok &= moon_phase_name(x) == phase
+                    else:
+                        ideal = (low + high) / 2
+                        ok &= np.abs((x - ideal + 0.5) % 1 - 0.5) <= window
+                return ok
+        else:
+            if window is None:
+                window = 0.02
+
+            # Each pair of moons line up again every so often, when the
+            # faster one has gained a whole cycle on the slower one
+            spacing = None
+            for i, a in enumerate(moons):
+                for b in moons[i + 1:]:
+                    (ref_a, period_a), (ref_b, period_b) = refs[a], refs[b]
+                    rate = 1 / period_b - 1 / period_a
+                    if not rate:
+                        # Same period, so they're always as far apart
+                        apart = ((ref_a - ref_b) / period_a + 0.5) % 1 - 0.5
+                        if abs(apart) > window:
+                            return []
+                        continue
+                    if spacing is None or 1 / abs(rate) > spacing:
+                        spacing = 1 / abs(rate)
+                        offset = (ref_b / period_b - ref_a / period_a) / rate
+                        half_width = window * spacing + 1
+
+            def matches(days):
+                fractions = np.sort(np.array(list(
+                        self._moon_fractions(days, moons).values())), axis=0)
+                # The spread is whatever the biggest gap between them
+                # (going round the cycle) leaves
+                gaps = np.diff(np.concatenate([fractions, fractions[:1] + 1]),
+                        axis=0)
+                return 1 - gaps.max(axis=0) <= window + 1e-9
+
+            if spacing is None:
+                # Nothing ever drifts apart, so every day will do
+                start = self.calendar.ordinal(start_date)
+                return [self.calendar.date_from_ordinal(x)
+                        for x in range(start, start + count)]
+
+        start = self.calendar.ordinal(start_date)
+        end = start + self.max_conjunction_days
+        offsets = np.arange(int(2 * half_width) + 2)
+        k = math.floor((start - half_width - offset) / spacing)
+
+        found = []
+        while len(found) < count and offset + k * spacing - half_width <= end:
+            centers = offset + spacing * np.arange(k,
+                    k + self.conjunction_chunk)
+            days = np.floor(centers - half_width)[:, None] + offsets[None, :]
+            days = days[days <= centers[:, None] + half_width]
+            days = np.unique(days[(days >= start) & (days <= end)])
+            days = days.astype(np.int64)
+            found.extend(days[matches(days)][:count - len(found)].tolist())
+            k += self.conjunction_chunk
+
+        return [self.calendar.date_from_ordinal(x) for x in found]
+
+    def moon_events(self, start_date, end_date):
+        """
+        Get the days from the start date up to and including the end date
+        when each moon becomes full or new, as {ordinal day: [(moon key,
+        phase)]}.
+        """
+        calendar = self.calendar
+        start = calendar.ordinal(start_date)
+        # From the day before, to tell whether the first day is the first
+        # of its phase
+        moons = self.moon_phases(calendar.date_from_ordinal(start - 1),
+                end_date)
+
+        events = {}
+        for moon_key, (phases, _) in moons.items():
+            starts = np.flatnonzero((phases[1:] != phases[:-1]) &
+                    np.isin(phases[1:], ['full', 'new']))
+            for i in starts:
+                events.setdefault(start + int(i), []).append(
+                        (moon_key, str(phases[i + 1])))
+        return events
+
+    def _moon_fractions(self, days, moon_keys=None):
+        """
+        Get how far through its cycle (from full, at 0) each moon is, on
+        each of an array of ordinal days.
+        """
+        fractions = {}
+        for moon_key, moon_data in self.calendar.cal_data['moons'].items():
+            if moon_keys is not None and moon_key not in moon_keys:
+                continue
+            ref_day, ref_month, ref_year = moon_data['full_on'].split()
+            ref_date = Date(int(ref_day), ref_month, int(ref_year))
+            day_diff = days - self.calendar.ordinal(ref_date)
+            period = moon_data['period']
+            fractions[moon_key] = np.round(
+                    np.mod(day_diff, period) / period, 3)
+        return fractions
@@ -1,9 +1,15 @@
 import json
 import logging
+import mimetypes
 import os
 
 from flask import Flask
+from flask import Response
+from flask import abort
 from flask import render_template
+from flask import send_from_directory
+
+from dndme.archives import find_archive
 app = Flask(__name__)
 
 base_dir = os.path.normpath(os.path.join(os.path.dirname(__file__), '../..'))
@@ -30,4 +36,22 @@ def player_view_api():
 
 @app.route("/player-view")
 def player_view():
-    return render_template("player-view.html")
\ No newline at end of file
+    return render_template("player-view.html")
+
+
+@app.route("/static/content/<pack>/<path:filename>")
+def content_file(pack, filename):
+    if pack.startswith('.'):
+        abort(404)
+
+    # Loose files first, just like plain old static files...
+    pack_dir = os.path.join(base_dir, 'content', pack)
+    if os.path.isfile(os.path.join(pack_dir, filename)):
+        return send_from_directory(pack_dir, filename)
+
+    # ...but the pack might be an archive
+    archive = find_archive(pack_dir)
+    if not archive or filename not in archive:
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    return Response(archive.read(filename), mimetype=mimetype)
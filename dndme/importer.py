@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+import csv
+import json
+import os
+import re
+import shutil
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import click
+import pytoml as toml
+
+from dndme.check_data import check_schema, schemas
+from dndme.dice import dice_expr
+
+base_dir = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Field names used by other bestiary exports -> the ones our monsters use
+field_aliases = {
+    'type': 'mtype',
+    'armor_class': 'ac',
+    'armor_desc': 'armor',
+    'hit_dice': 'max_hp',
+    'hit_points': 'max_hp',
+    'hp': 'max_hp',
+    'strength': 'str',
+    'dexterity': 'dex',
+    'constitution': 'con',
+    'intelligence': 'int',
+    'wisdom': 'wis',
+    'charisma': 'cha',
+    'damage_vulnerabilities': 'vulnerable',
+    'damage_resistances': 'resist',
+    'damage_immunities': 'immune',
+    'challenge_rating': 'cr',
+    'challenge': 'cr',
+    'experience': 'xp',
+    'desc': 'notes',
+    'description': 'notes',
+    'special_abilities': 'features',
+    'traits': 'features',
+    'image': 'image_url',
+    'img_main': 'image_url',
+}
+
+integer_fields = ('ac', 'str', 'dex', 'con', 'int', 'wis', 'cha', 'xp')
+lower_case_fields = ('size', 'mtype', 'race', 'alignment')
+section_fields = ('features', 'actions', 'lair_actions', 'legendary_actions',
+        'reactions')
+stat_fields = ('skills', 'senses')
+
+# Mostly so that a huge import can't pile up everything in memory waiting
+# to be written
+pending_writes_per_job = 8
+
+
+@click.command()
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.argument('pack')
+@click.option('--format', 'source_format', type=click.Choice(['json', 'csv']),
+        default=None, help="Format of the source; default: guess from "
+        "its extension.")
+@click.option('--content-dir', default=f"{base_dir}/content",
+        help=f"Where content packs live; default: {base_dir}/content")
+@click.option('--overwrite', is_flag=True,
+        help="Replace monsters that are already in the pack.")
+@click.option('--jobs', default=None, type=int,
+        help="How many files to write at once; default: one per CPU.")
+def main(source, pack, source_format, content_dir, overwrite, jobs):
+    """
+    Import a bestiary from a JSON or CSV export into a content pack,
+    creating the pack if needed. JSON should be a list of monster objects
+    (or one object per line); CSV should have a column per field, using
+    dotted names like skills.stealth for nested values.
+    """
+    if not source_format:
+        source_format = 'csv' if source.lower().endswith('.csv') else 'json'
+
+    monsters_dir = f"{content_dir}/{pack}/monsters"
+    images_dir = f"{content_dir}/{pack}/images/monsters"
+    os.makedirs(monsters_dir, exist_ok=True)
+    os.makedirs(images_dir, exist_ok=True)
+
+    readers = {'json': read_json_records, 'csv': read_csv_records}
+    importer = Importer(monsters_dir, images_dir,
+            source_dir=os.path.dirname(os.path.abspath(source)),
+            overwrite=overwrite)
+
+    try:
+        with open(source, 'r', encoding='utf-8', newline='') as f:
+            importer.run(readers[source_format](f), jobs=jobs)
+    except ValueError as e:
+        print(f"Can't read {source}: {e}")
+        sys.exit(1)
+
+    for problem in importer.problems:
+        print(problem)
+    print(f"Imported {importer.imported} monsters into {pack}; "
+            f"skipped {importer.skipped}.")
+    if importer.problems:
+        sys.exit(1)
+
+
+class Importer:
+    """
+    Convert a stream of monster records into TOML files, writing them from
+    a pool of threads while the next records are still being read.
+    """
+
+    def __init__(self, monsters_dir, images_dir, source_dir='.',
+            overwrite=False):
+        self.monsters_dir = monsters_dir
+        self.images_dir = images_dir
+        self.source_dir = source_dir
+        self.overwrite = overwrite
+        self.imported = 0
+        self.skipped = 0
+        self.problems = []
+        self._seen = set()
+
+    def run(self, records, jobs=None):
+        workers = jobs or os.cpu_count() or 1
+        pending = set()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for i, record in enumerate(records, 1):
+                monster = self.convert(record, f"record {i}")
+                if not monster:
+                    self.skipped += 1
+                    continue
+                pending.add(executor.submit(self.write, monster))
+
+                if len(pending) >= workers * pending_writes_per_job:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collect(done)
+            done, pending = wait(pending)
+            self._collect(done)
+
+    def convert(self, record, where):
+        try:
+            monster = convert_record(record)
+        except (TypeError, ValueError) as e:
+            self.problems.append(f"{where}: {e}")
+            return None
+
+        problems = []
+        check_schema(monster, 'monster', problems, where)
+        if problems:
+            self.problems.extend(problems)
+            return None
+
+        name = monster['name']
+        if name in self._seen:
+            self.problems.append(f"{where}: duplicate monster {name}")
+            return None
+        self._seen.add(name)
+        return monster
+
+    def write(self, monster):
+        filename = f"{self.monsters_dir}/{monster['name']}.toml"
+        if os.path.exists(filename) and not self.overwrite:
+            return False
+
+        image_url = monster.get('image_url', '')
+        if image_url and not image_url.startswith('http'):
+            monster['image_url'] = self.copy_image(image_url)
+
+        # Write it all at once, so nobody watching the pack ever sees
+        # half a monster
+        temp_filename = f"{filename}.tmp"
+        with open(temp_filename, 'w', encoding='utf-8') as f:
+            toml.dump(monster, f)
+        os.replace(temp_filename, filename)
+        return True
+
+    def copy_image(self, image_url):
+        source = os.path.join(self.source_dir, image_url)
+        filename = os.path.basename(image_url)
+        if os.path.exists(source):
+            shutil.copyfile(source, f"{self.images_dir}/{filename}")
+        # Images are looked up by filename across all packs, so even one
+        # we couldn't copy may already be there
+        return filename
+
+    def _collect(self, futures):
+        for future in futures:
+            try:
+                written = future.result()
+            except OSError as e:
+                self.problems.append(f"Can't write monster: {e}")
+                continue
+            if written:
+                self.imported += 1
+            else:
+                self.skipped += 1
+
+
+def read_json_records(f, chunk_size=65536):
+    """
+    Read monster objects one at a time from a JSON list (or from one JSON
+    object per line), without holding the whole file in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    while True:
+        # Skip over whatever's between records: the brackets of the list,
+        # the commas, and whitespace
+        while pos < len(buffer) and buffer[pos] in '[], \t\r\n':
+            pos += 1
+
+        if pos < len(buffer):
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                # Probably just haven't read the rest of this record yet
+                if eof:
+                    raise ValueError(str(e))
+            else:
+                if not isinstance(record, dict):
+                    raise ValueError(f"expected an object, not: {record!r}")
+                yield record
+                continue
+        elif eof:
+            return
+
+        chunk = f.read(chunk_size)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        eof = not chunk
+
+
+def read_csv_records(f):
+    """
+    Read monster records from CSV rows, nesting dotted column names like
+    skills.stealth or actions.bite.name into tables.
+    """
+    for row in csv.DictReader(f):
+        record = {}
+        for column, value in row.items():
+            if not column or value is None or value == '':
+                continue
+            table = record
+            *path, key = column.strip().split('.')
+            for part in path:
+                table = table.setdefault(part, {})
+            table[key] = value
+        yield record
+
+
+def convert_record(record):
+    """
+    Convert a record from a bestiary export into our monster format, as
+    described by templates/monster.toml.
+    """
+    monster = {}
+    for key, value in record.items():
+        key = field_aliases.get(key.lower(), key.lower())
+        if key in schemas['monster'] and key not in monster and \
+                value not in (None, '', [], {}):
+            monster[key] = value
+
+    if not monster.get('name'):
+        raise ValueError("monster has no name")
+    name = make_key(monster['name'], '_')
+    if not name:
+        # Would be saved as .toml, and nobody could load it by name
+        raise ValueError(f"monster name has no letters or numbers: "
+                f"{monster['name']!r}")
+    monster['name'] = name
+
+    subtype = record.get('subtype')
+    if subtype and 'mtype' in monster:
+        monster['mtype'] = f"{monster['mtype']}:{subtype}"
+    for field in lower_case_fields:
+        if isinstance(monster.get(field), str):
+            monster[field] = monster[field].lower()
+
+    for field in integer_fields:
+        if field in monster:
+            monster[field] = to_number(monster[field], integer=True)
+    if 'cr' in monster:
+        monster['cr'] = to_number(monster['cr'])
+    if 'max_hp' in monster:
+        monster['max_hp'] = convert_max_hp(monster['max_hp'])
+    if 'speed' in monster:
+        monster['speed'] = convert_speed(monster['speed'])
+
+    for field in stat_fields:
+        if field in monster:
+            monster[field] = convert_stats(monster[field])
+    for field in section_fields:
+        if field in monster:
+            monster[field] = convert_section(monster[field])
+
+    return monster
+
+
+def make_key(name, separator=''):
+    """
+    Make a name into a key like the ones used in our content, e.g.
+    "Adult Red Dragon" -> adult_red_dragon, "Nimble Escape" -> nimbleescape.
+    """
+    return re.sub(r'[^a-z0-9]+', separator, str(name).lower()).strip('_')
+
+
+def to_number(value, integer=False):
+    if isinstance(value, bool):
+        raise ValueError(f"not a number: {value}")
+    if isinstance(value, (int, float)):
+        return int(value) if integer else value
+
+    value = str(value).strip()
+    if '/' in value:
+        numerator, denominator = value.split('/', 1)
+        number = float(numerator) / float(denominator)
+    else:
+        # Things like "15 (natural armor)" or "1,800"
+        match = re.match(r'[+-]?[\d,]*\.?\d+', value)
+        if not match:
+            raise ValueError(f"not a number: {value}")
+        number = float(match.group(0).replace(',', ''))
+
+    if integer or number.is_integer():
+        return int(number)
+    return number
+
+
+def convert_max_hp(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+
+    # Things like "2d6 + 2" or "7 (2d6)"
+    match = re.search(r'\d+d\d+(\s*[+-]\s*\d+)?', value)
+    if match:
+        dice = re.sub(r'\s+', '', match.group(0))
+        if dice_expr.match(dice):
+            return dice
+    return to_number(value, integer=True)
+
+
+def convert_speed(value):
+    if isinstance(value, dict):
+        value = ", ".join(f"{mode} {speed}" if mode != 'walk' else f"{speed}"
+                for mode, speed in value.items())
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return value
+
+
+def convert_stats(value):
+    """
+    Convert skills or senses, either already a table or written out like
+    "Stealth +6" or "darkvision 60 ft., passive Perception 9".
+    """
+    if isinstance(value, str):
+        value = {name: number for name, number in
+                re.findall(r'([A-Za-z][A-Za-z ]*?)\s+([+-]?\d+)', value)}
+
+    stats = {}
+    for name, number in value.items():
+        name = make_key(re.sub(r'^passive\s+', '', name.strip().lower()))
+        stats[name] = to_number(number, integer=True)
+    return stats
+
+
+def convert_section(value):
+    """
+    Convert features, actions, and so on, from either a table of tables or
+    a list of {name, desc} records.
+    """
+    if isinstance(value, dict):
+        return value
+
+    section = {}
+    for item in value:
+        if not isinstance(item, dict) or not item.get('name'):
+            raise ValueError(f"expected a named entry, not: {item!r}")
+        entry = {k: v for k, v in item.items() if k != 'desc'}
+        if 'desc' in item:
+            entry.setdefault('description', item['desc'])
+        section[make_key(item['name'])] = entry
+    return section
+
+
+if __name__ == '__main__':
+    main()
@@ -1,216 +1,348 @@
+import copy
 import glob
+import os
 import re
 import uuid
 
 import pytoml as toml
 
 from dndme.dice import dice_expr, roll_dice, roll_dice_expr
-from dndme.models import Character, Encounter, Monster
+from dndme.expressions import compile_expression
+from dndme.models import Character, Encounter, EncounterSummary, Monster
+
+
+class GroupPlan:
+    """
+    Everything an encounter group does to its monsters, worked out once
+    from the group definition so that it can be applied to each monster
+    in a single pass.
+    """
+
+    stat_fields = ['str', 'dex', 'con', 'int', 'wis', 'cha', 'armor', 'ac',
+            'alignment', 'race', 'languages', 'xp', 'disposition']
+    update_fields = ['skills', 'features', 'actions', 'legendary_actions',
+            'reactions']
+
+    def __init__(self, key, group):
+        self.key = key
+        self.monster = group.get('monster', key)
+
+        self.count = group.get('count', 1)
+        try:
+            int(self.count)
+            self.count_expression = None
+        except ValueError:
+            if dice_expr.match(self.count):
+                self.count_expression = dice_expr
+            else:
+                self.count_expression = compile_expression(self.count)
+
+        # Names and aliases may be one for all, or one for each
+        self.names = self._per_monster(group.get('name'))
+        self.aliases = self._per_monster(group.get('alias'))
+
+        self.setters = [(field, group[field]) for field in self.stat_fields
+                if field in group]
+        self.updates = [(field, group[field]) for field in self.update_fields
+                if field in group]
+
+        self.max_hp = group.get('max_hp')
+
+        self.removals = []
+        for attr in group.get('remove', []):
+            try:
+                (attr, key) = attr.split('.')
+            except ValueError:
+                key = None
+            self.removals.append((attr, key))
+
+    @property
+    def depends_on(self):
+        if self.count_expression in (None, dice_expr):
+            return ()
+        return self.count_expression.names
+
+    def _per_monster(self, value):
+        if value is None:
+            return None
+        if hasattr(value, 'islower'):
+            return lambda i: value
+        return lambda i: value[i] if i < len(value) else None
+
+    def apply(self, monsters):
+        max_hps = self._max_hps(len(monsters))
+
+        for i, monster in enumerate(monsters):
+            self._apply_names(i, monster)
+
+            for field, value in self.setters:
+                setattr(monster, field, value)
+
+            # Either the override, or roll up the template's own max hp
+            monster.max_hp = max_hps[i] if max_hps else monster._max_hp
+            monster.cur_hp = monster.max_hp
+
+            for field, value in self.updates:
+                getattr(monster, field).update(value)
+
+            for attr, key in self.removals:
+                if not hasattr(monster, attr):
+                    continue
+                if key is None:
+                    delattr(monster, attr)
+                else:
+                    getattr(monster, attr).pop(key, None)
+
+    def _max_hps(self, count):
+        max_hp = self.max_hp
+        if max_hp is None:
+            return None
+        # Have we got a list of max hp?
+        if hasattr(max_hp, 'append'):
+            return max_hp if len(max_hp) == count else None
+        # Have we got a single int or dice expression?
+        return [max_hp] * count
+
+    def _apply_names(self, i, monster):
+        if self.names:
+            name = self.names(i)
+            if name is not None:
+                monster.name = name
+
+        if self.aliases:
+            alias = self.aliases(i)
+            if alias is not None:
+                monster.alias = alias
+
+        if monster.name.islower():
+            if not monster._alias:
+                monster.alias = \
+                        f"{monster.name.replace('_', ' ').title()} {i+1}"
+            monster.name += f"-{i+1:0>2}/{str(uuid.uuid4())[:4]}"
+        elif not monster._alias:
+            monster.alias = monster.name.replace('_', ' ').title()
+
+
+class EncounterPlan:
+    """
+    The plans for all the groups in an encounter, and an order to load
+    them in that makes sure that any group whose count depends on other
+    groups (e.g. count = "goblins + evil_mage") comes after them.
+    """
+
+    def __init__(self, encounter):
+        self.groups = {key: GroupPlan(key, group)
+                for key, group in encounter.groups.items()}
+        self.load_order = self._sort_groups(encounter.name)
+
+    def _sort_groups(self, encounter_name):
+        dependencies = {key: [x for x in plan.depends_on
+                    if x in self.groups and x != key]
+                for key, plan in self.groups.items()}
+
+        # Repeatedly take every group whose dependencies are all loaded,
+        # otherwise sticking to the order the groups were written in
+        load_order = []
+        remaining = list(self.groups)
+        while remaining:
+            ready = [key for key in remaining
+                    if all(x in load_order for x in dependencies[key])]
+            if not ready:
+                raise ValueError("Circular monster counts in encounter "
+                        f"{encounter_name}: {', '.join(remaining)}")
+            load_order.extend(ready)
+            remaining = [key for key in remaining if key not in ready]
+        return load_order
+
+
+class EncounterCatalog:
+    """
+    Keep a cheap listing of the encounters in a directory: just the name,
+    location, and path of each encounter file.
+
+    Only the top-level "header" keys of each file are parsed, and each
+    file is only re-read when its mtime changes, so listing hundreds of
+    encounters doesn't mean parsing hundreds of monster groups.
+    """
+
+    def __init__(self, base_dir, content=None):
+        self.base_dir = base_dir
+        self.content = content
+        self._entries = {}
+
+    def get_summaries(self):
+        entries = {}
+        for filename in self._glob(f"{self.base_dir}/*.toml"):
+            try:
+                mtime = self._mtime(filename)
+            except FileNotFoundError:
+                continue
+            cached = self._entries.get(filename)
+            if cached and cached[0] == mtime:
+                entries[filename] = cached
+            else:
+                entries[filename] = (mtime, self._read_summary(filename))
+        self._entries = entries
+        return [entries[filename][1] for filename in sorted(entries)]
+
+    def _glob(self, pattern):
+        if self.content:
+            return self.content.glob(pattern)
+        return glob.glob(pattern)
+
+    def _open(self, filename):
+        # Might be in an archive, if the content tree knows about it
+        if self.content:
+            return self.content.open(filename)
+        return open(filename, 'r')
+
+    def _mtime(self, filename):
+        # The content tree already knows, if it's watching this directory
+        mtime = self.content.mtime(filename) if self.content else None
+        if mtime is None:
+            mtime = os.stat(filename).st_mtime_ns
+        return mtime
+
+    def _read_summary(self, filename):
+        # Already parsed in the background? Then we can skip the disk.
+        index = self.content.index('encounters') if self.content else None
+        if index and filename in index.values:
+            name, location = index.values[filename]
+            return EncounterSummary(name=name, location=location, path=filename)
+
+        try:
+            header = toml.loads(self._read_header(filename))
+        except toml.TomlError:
+            # Something unusual before the first table; parse it all
+            with self._open(filename) as fin:
+                header = toml.load(fin)
+        return EncounterSummary(
+                name=header.get('name', ''),
+                location=header.get('location', ''),
+                path=filename)
+
+    def _read_header(self, filename):
+        # Read up to the first table header, taking care not to be
+        # fooled by brackets at the start of a line in multiline notes.
+        lines = []
+        quote = None
+        with self._open(filename) as fin:
+            for line in fin:
+                if not quote and line.lstrip().startswith('['):
+                    break
+                if quote:
+                    if line.count(quote) % 2:
+                        quote = None
+                else:
+                    for q in ('"""', "'''"):
+                        if line.count(q) % 2:
+                            quote = q
+                            break
+                lines.append(line)
+        return ''.join(lines)
+
+
+# Catalogs are shared by every loader looking at the same directory, since
+# commands tend to make a fresh loader each time they run.
+_encounter_catalogs = {}
 
 
 class EncounterLoader:
 
     def __init__(self, base_dir, monster_loader, combat,
             count_resolver=None,
-            initiative_resolver=None):
+            initiative_resolver=None,
+            content=None):
         self.base_dir = base_dir
         self.monster_loader = monster_loader
         self.combat = combat
         self.count_resolver = count_resolver
         self.initiative_resolver = initiative_resolver
+        self.content = content
+        self.catalog = _encounter_catalogs.setdefault(
+                (base_dir, content), EncounterCatalog(base_dir, content))
 
     def get_available_encounters(self):
-        available_encounter_files = glob.glob(f"{self.base_dir}/*.toml")
-        encounters = [Encounter(**toml.load(open(filename, 'r')))
-                for filename in sorted(available_encounter_files)]
+        encounters = [self.load_encounter_file(summary.path)
+                for summary in self.get_encounter_summaries()]
         return encounters
 
+    def get_encounter_summaries(self):
+        return self.catalog.get_summaries()
+
+    def load_encounter_file(self, filename):
+        if self.content:
+            return Encounter(**self.content.load(filename))
+        with open(filename, 'r') as fin:
+            return Encounter(**toml.load(fin))
+
     def load(self, encounter):
+        plan = self.plan(encounter)
+
         monster_groups = {}
-        for key, group in encounter.groups.items():
-            monster_groups[key] = self._load_group(group, monster_groups)
+        for key in plan.load_order:
+            monster_groups[key] = self._load_group(
+                    plan.groups[key], monster_groups)
 
-        monsters = [y for x in monster_groups.values() for y in x]
+        # Keep the monsters in the order the groups were written in
+        monsters = [y for key in plan.groups for y in monster_groups[key]]
 
         self._set_origin(encounter, monsters)
         self._add_to_combat(self.combat, monsters)
 
         return monsters
 
-    def _load_group(self, group, monster_groups):
-        count = self._determine_count(group, monster_groups)
-        monsters = self.monster_loader.load(group['monster'], count=count)
-        self._set_names(group, monsters)
-        self._set_stats(group, monsters)
-        self._set_hp(group, monsters)
-        self._set_armor(group, monsters)
-        self._set_alignment(group, monsters)
-        self._set_race(group, monsters)
-        self._set_languages(group, monsters)
-        self._set_xp(group, monsters)
-        self._set_disposition(group, monsters)
-        self._add_attributes(group, monsters)
-        self._remove_attributes(group, monsters)
+    def prepare(self, filename):
+        """
+        Get an encounter ready to load: parsed, planned, and with all of
+        its monsters at hand, leaving only the counts and initiative (which
+        may need asking about) for when it's actually loaded.
+        """
+        encounter = self.load_encounter_file(filename)
+        for group in self.plan(encounter).groups.values():
+            self.monster_loader.prepare(group.monster)
+        return encounter
+
+    def plan(self, encounter):
+        if encounter.plan is None:
+            encounter.plan = EncounterPlan(encounter)
+        return encounter.plan
+
+    def _load_group(self, plan, monster_groups):
+        count = self._determine_count(plan, monster_groups)
+        monsters = self.monster_loader.load(plan.monster, count=count)
+        plan.apply(monsters)
         return monsters
 
-    def _determine_count(self, group, monster_groups):
-        try:
-            count = int(group['count'])
-        except ValueError:
-            if dice_expr.match(group['count']):
-                if self.count_resolver:
-                    count = self.count_resolver(group['count'], group['monster'])
-                else:
-                    count = roll_dice_expr(group['count'])
+    def _determine_count(self, plan, monster_groups):
+        if plan.count_expression is None:
+            count = int(plan.count)
+        elif plan.count_expression is dice_expr:
+            if self.count_resolver:
+                count = self.count_resolver(plan.count, plan.monster)
             else:
-                group_count = group['count']
-                names = {x: 0 for x in re.findall(r"(\w+)", group['count'])
-                        if not x.isdigit()}
-                for name in names:
-                    if name in monster_groups:
-                        names[name] = len(monster_groups[name])
-                    elif name == 'players':
-                        names[name] = len([x for x in
-                            self.combat.characters.values()
-                            if x.ctype == 'player'])
-                    elif name == 'sidekicks':
-                        names[name] = len([x for x in
-                            self.combat.characters.values()
-                            if x.ctype == 'sidekick'])
-                    elif name == 'party':
-                        names[name] = len(self.combat.characters)
-                    group_count = group_count.replace(name, str(names[name]))
-                if re.match(r"[^\d\s\(\)\+\-\*\/]", group_count):
-                    raise ValueError(f"Invalid monster count: {group['count']}")
-                count = max(eval(group_count), 1)
+                count = roll_dice_expr(plan.count)
+        else:
+            names = {}
+            for name in plan.count_expression.names:
+                if name in monster_groups:
+                    names[name] = len(monster_groups[name])
+                elif name == 'players':
+                    names[name] = len([x for x in
+                        self.combat.characters.values()
+                        if x.ctype == 'player'])
+                elif name == 'sidekicks':
+                    names[name] = len([x for x in
+                        self.combat.characters.values()
+                        if x.ctype == 'sidekick'])
+                elif name == 'party':
+                    names[name] = len(self.combat.characters)
+                else:
+                    names[name] = 0
+            count = max(int(plan.count_expression(**names)), 1)
 
         return count
 
-    def _set_names(self, group, monsters):
-        if 'name' in group:
-            if hasattr(group['name'], 'islower'):
-                for monster in monsters:
-                    monster.name = group['name']
-            else:
-                for i, name in enumerate(group['name']):
-                    monsters[i].name = name
-
-        if 'alias' in group:
-            if hasattr(group['alias'], 'islower'):
-                for monster in monsters:
-                    monster.alias = group['alias']
-            else:
-                for i, alias in enumerate(group['alias']):
-                    monsters[i].alias = alias
-
-        for i, monster in enumerate(monsters, 1):
-            if monster.name.islower():
-                if not monster._alias:
-                    monster.alias = f"{monster.name.replace('_', ' ').title()} {i}"
-                monster.name += f"-{i:0>2}/{str(uuid.uuid4())[:4]}"
-            elif not monster._alias:
-                monster.alias = monster.name.replace('_', ' ').title()
-
-    def _set_stats(self, group, monsters):
-        for monster in monsters:
-            if 'str' in group:
-                monster.str = group['str']
-            if 'dex' in group:
-                monster.dex = group['dex']
-            if 'con' in group:
-                monster.con = group['con']
-            if 'int' in group:
-                monster.int = group['int']
-            if 'wis' in group:
-                monster.wis = group['wis']
-            if 'cha' in group:
-                monster.cha = group['cha']
-
-    def _set_hp(self, group, monsters):
-        # Are we overriding max hp?
-        if 'max_hp' in group:
-
-            # Have we got a list of max hp?
-            if hasattr(group['max_hp'], 'append') and \
-                    len(group['max_hp']) == len(monsters):
-                for i, monster in enumerate(monsters):
-                    monster.max_hp = group['max_hp'][i]
-                    monster.cur_hp = monster.max_hp
-
-            # Have we got a single int or dice expression?
-            elif hasattr(group['max_hp'], 'real') or \
-                    hasattr(group['max_hp'], 'join'):
-                for monster in monsters:
-                    monster.max_hp = group['max_hp']
-                    monster.cur_hp = monster.max_hp
-
-        # Not overriding max hp at all
-        else:
-            for monster in monsters:
-                monster.max_hp = monster._max_hp
-                monster.cur_hp = monster.max_hp
-
-    def _set_armor(self, group, monsters):
-        if 'armor' in group:
-            for monster in monsters:
-                monster.armor = group['armor']
-
-        if 'ac' in group:
-            for monster in monsters:
-                monster.ac = group['ac']
-
-    def _set_alignment(self, group, monsters):
-        if 'alignment' in group:
-            for monster in monsters:
-                monster.alignment = group['alignment']
-
-    def _set_race(self, group, monsters):
-        if 'race' in group:
-            for monster in monsters:
-                monster.race = group['race']
-
-    def _set_languages(self, group, monsters):
-        if 'languages' in group:
-            for monster in monsters:
-                monster.languages = group['languages']
-
-    def _set_xp(self, group, monsters):
-        if 'xp' in group:
-            for monster in monsters:
-                monster.xp = group['xp']
-
-    def _set_disposition(self, group, monsters):
-        if 'disposition' in group:
-            for monster in monsters:
-                monster.disposition = group['disposition']
-
-    def _add_attributes(self, group, monsters):
-        for monster in monsters:
-            if 'skills' in group:
-                monster.skills.update(group['skills'])
-            if 'features' in group:
-                monster.features.update(group['features'])
-            if 'actions' in group:
-                monster.actions.update(group['actions'])
-            if 'legendary_actions' in group:
-                monster.legendary_actions.update(group['legendary_actions'])
-            if 'reactions' in group:
-                monster.reactions.update(group['reactions'])
-
-    def _remove_attributes(self, group, monsters):
-        for attr in group.get('remove', []):
-            try:
-                (attr, key) = attr.split('.')
-                for monster in monsters:
-                    if hasattr(monster, attr):
-                        getattr(monster, attr).pop(key)
-            except KeyError:
-                pass
-            except ValueError:
-                for monster in monsters:
-                    if hasattr(monster, attr):
-                        delattr(monster, attr)
-
     def _set_origin(self, encounter, monsters):
         for monster in monsters:
             monster.origin = f"{encounter.name} ({encounter.location})"
@@ -238,32 +370,86 @@ class EncounterLoader:
 
 class MonsterLoader:
 
-    def __init__(self, image_loader):
+    def __init__(self, image_loader, content=None):
         self.image_loader = image_loader
+        self.content = content
+        self._templates = {}
 
     def load(self, monster_name, count=1):
-        # TODO: hey maybe make this more efficient, yeah?
+        monster = self.prepare(monster_name)
+        if not monster:
+            return []
 
-        monster_files = self.get_available_monster_files()
-        monsters = []
+        monsters = [Monster(**copy.deepcopy(monster)) for i in range(count)]
+        return monsters
 
-        for filename in monster_files:
-            monster = toml.load(open(filename, 'r'))
+    def prepare(self, monster_name):
+        """
+        Find a monster's data and resolve its image, once, so that this
+        loader can stamp out copies of it quickly from then on (until its
+        file changes).
+        """
+        cached = self._templates.get(monster_name)
+        if cached and self._is_current(monster_name, *cached[:2]):
+            return cached[2]
+
+        filename, monster = self._find_monster(monster_name)
+        if not monster:
+            return None
+        mtime = self._mtime(filename)
+
+        image_url = monster.get('image_url')
+        if image_url and not image_url.startswith('http'):
+            monster['image_url'] = self.image_loader.get_monster_image_path(image_url)
+
+        self._templates[monster_name] = (filename, mtime, monster)
+        return monster
+
+    def _is_current(self, monster_name, filename, mtime):
+        index = self.content.index('monsters') if self.content else None
+        if index and index.paths.get(monster_name) != filename:
+            return False
+        try:
+            return self._mtime(filename) == mtime
+        except FileNotFoundError:
+            return False
+
+    def _mtime(self, filename):
+        # The content tree already knows, if it's watching this directory
+        mtime = self.content.mtime(filename) if self.content else None
+        if mtime is None:
+            mtime = os.stat(filename).st_mtime_ns
+        return mtime
+
+    def _find_monster(self, monster_name):
+        index = self.content.index('monsters') if self.content else None
+        if index and monster_name in index.paths:
+            filename = index.paths[monster_name]
+            return filename, self.content.load(filename)
 
-            if monster['name'] != monster_name:
-                continue
+        monster_files = self.get_available_monster_files()
+        if index:
+            # Anything indexed already isn't it, and we're most likely
+            # after the file named for the monster, so check (or wait for)
+            # that one before any of the others
+            monster_files = sorted(
+                    [x for x in monster_files if x not in index.values],
+                    key=lambda x: os.path.basename(x) != f"{monster_name}.toml")
 
-            image_url = monster.get('image_url')
-            if image_url and not image_url.startswith('http'):
-                monster['image_url'] = self.image_loader.get_monster_image_path(image_url)
+        for filename in monster_files:
+            if self.content:
+                monster = self.content.load(filename)
+            else:
+                monster = toml.load(open(filename, 'r'))
 
-            for i in range(count):
-                monsters.append(Monster(**monster))
-            break
+            if monster['name'] == monster_name:
+                return filename, monster
 
-        return monsters
+        return None, None
 
     def get_available_monster_files(self):
+        if self.content:
+            return self.content.glob('content/*/monsters/*.toml')
         monster_files = glob.glob('content/*/monsters/*.toml')
         return monster_files
 
@@ -275,12 +461,16 @@ class MonsterLoader:
 
 class PartyLoader:
 
-    def __init__(self, filename):
+    def __init__(self, filename, content=None):
         self.filename = filename
+        self.content = content
 
     def load(self, combat):
-        with open(self.filename, 'r') as fin:
-            party = toml.load(fin)
+        if self.content:
+            party = self.content.load(self.filename)
+        else:
+            with open(self.filename, 'r') as fin:
+                party = toml.load(fin)
         combat.characters.update(
                 {x['name']: Character(**x) for x in party.values()})
         return party
@@ -293,6 +483,9 @@ class ImageLoader:
 
     def get_available_content_images(self):
         image_dir = self.game.encounters_dir.replace('encounters', 'images')
+        if self.game.image_index:
+            return self.game.image_index.filenames('content',
+                    os.path.relpath(image_dir, self.game.base_dir))
         images = [x.replace(image_dir, '').lstrip('/') for x in glob.glob(f'{image_dir}/*.*')]
         return images
 
@@ -302,13 +495,17 @@ class ImageLoader:
         return image
 
     def get_monster_image_path(self, filename):
+        if self.game.image_index:
+            return self.game.image_index.url('monsters', filename)
         monster_image = glob.glob(f'content/*/images/monsters/{filename}')
         if monster_image:
             return f'/static/{monster_image[0]}'
         return ''
 
     def get_player_image_path(self, filename):
+        if self.game.image_index:
+            return self.game.image_index.url('players', filename)
         player_image = glob.glob(f'campaigns/*/images/{filename}')
         if player_image:
             return f'/static/{player_image[0]}'
-        return ''
\ No newline at end of file
+        return ''
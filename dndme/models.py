@@ -6,6 +6,9 @@ from attr import Factory as attr_factory
 
 from dndme import dice
 
+# Six seconds to a round
+rounds_per_minute = 10
+
 
 @attrs
 class Combatant:
@@ -72,13 +75,13 @@ class Combatant:
             # to remove a condition that isn't in effect.
             pass
 
-    def decrement_condition_durations(self):
+    def decrement_condition_durations(self, rounds=1):
         conditions_removed = []
 
         for condition in list(self.conditions):
-            self.conditions[condition] -= 1
+            self.conditions[condition] -= rounds
 
-            if self.conditions[condition] == 0:
+            if self.conditions[condition] <= 0:
                 self.conditions.pop(condition)
                 conditions_removed.append(condition)
 
@@ -183,6 +186,15 @@ class Encounter:
     location = attrib(default="")
     notes = attrib(default="")
     groups = attrib(default=[])
+    plan = attrib(default=None, repr=False)
+
+
+@attrs
+class EncounterSummary:
+
+    name = attrib(default="")
+    location = attrib(default="")
+    path = attrib(default="")
 
 
 @attrs
@@ -250,6 +262,15 @@ class Game:
 
     commands = attrib(default={})
 
+    content = attrib(default=None)
+    image_index = attrib(default=None)
+    completions = attrib(default=None)
+    bestiary = attrib(default=None)
+    timeline = attrib(default=None)
+    schedule_file = attrib(default=None)
+    scheduler = attrib(default=None)
+    weather = attrib(default=None)
+
     changed = attrib(default=True)
     player_message = attrib(default="") # TODO: rename for consistency with image
     player_view_image = attrib(default="")
@@ -260,6 +281,40 @@ class Game:
         self.combats.append(combat)
         return combat
 
+    def pass_time(self, minutes):
+        """
+        Move game time along (outside of combat), wearing off conditions
+        that run out in the meantime. Returns the conditions removed, by
+        combatant name.
+        """
+        self.clock.adjust_time(minutes=minutes)
+        if minutes <= 0:
+            return {}
+
+        combatants = list(self.stash.values())
+        for combat in self.combats:
+            combatants.extend(combat.characters.values())
+            combatants.extend(combat.monsters.values())
+
+        conditions_removed = {}
+        for combatant in combatants:
+            removed = combatant.decrement_condition_durations(
+                    minutes * rounds_per_minute)
+            if removed:
+                conditions_removed[combatant.name] = removed
+        return conditions_removed
+
+    @property
+    def current_weather(self):
+        """
+        Get the weather right now, where the party is, or None if there's
+        no telling.
+        """
+        if not self.weather:
+            return None
+        return self.weather.at(self.calendar.date, self.clock,
+                self.latitude)
+
     @property
     def stashed_monster_names(self):
         return [k for k, v in self.stash.items() if hasattr(v, 'mtype')]
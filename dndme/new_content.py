@@ -13,6 +13,7 @@ def main(name):
     content_dir = create_content_dir(name)
     create_encounters_dir(content_dir)
     create_monsters_dir(content_dir)
+    create_tables_dir(content_dir)
     create_images_dirs(content_dir)
 
 
@@ -44,6 +45,15 @@ def create_monsters_dir(content_dir):
     shutil.copyfile(template_file, destination_file)
 
 
+def create_tables_dir(content_dir):
+    tables_dir = f"{content_dir}/tables"
+    os.mkdir(tables_dir)
+
+    template_file = f"{base_dir}/templates/table.toml"
+    destination_file = f"{tables_dir}/TEMPLATE"
+    shutil.copyfile(template_file, destination_file)
+
+
 def create_images_dirs(content_dir):
     images_dir = f"{content_dir}/images"
     os.mkdir(images_dir)
@@ -71,6 +71,7 @@ class PlayerViewManager():
 
         data['date'] = str(self.game.calendar)
         data['time'] = str(self.game.clock)
+        data['weather'] = self.game.current_weather
         data['message'] = self.game.player_message
         data['image_url'] = self.game.player_view_image
 
@@ -0,0 +1,226 @@
+import glob
+import os
+import random
+import re
+
+import pytoml as toml
+
+from dndme.dice import dice_expr
+from dndme.models import Encounter
+
+times_of_day = ('dawn', 'day', 'dusk', 'night')
+
+roll_range = re.compile(r'^(\d+)(?:\s*-\s*(\d+))?$')
+
+
+class AliasSampler:
+    """
+    Pick from a fixed set of weighted choices in constant time, however
+    many there are, using Vose's alias method: a little work up front to
+    build the tables, then each pick is one random index and one coin flip.
+
+    Example usage:
+
+    >>> sampler = AliasSampler(['nothing', 'wolves', 'bandits'], [6, 3, 1])
+    >>> sampler.sample()
+    'nothing'
+    """
+
+    def __init__(self, choices, weights):
+        if not choices or len(choices) != len(weights):
+            raise ValueError("Need a weight for each of one or more choices")
+        total = sum(weights)
+        if total <= 0 or any(x < 0 for x in weights):
+            raise ValueError("Weights must be positive")
+
+        n = len(choices)
+        self.choices = list(choices)
+        self.probabilities = [0.0] * n
+        self.aliases = [0] * n
+
+        scaled = [x * n / total for x in weights]
+        small = [i for i, x in enumerate(scaled) if x < 1]
+        large = [i for i, x in enumerate(scaled) if x >= 1]
+
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+
+        # Whatever's left over is (give or take rounding) a sure thing
+        for i in small + large:
+            self.probabilities[i] = 1.0
+
+    def sample(self, rng=random):
+        i = rng.randrange(len(self.choices))
+        if rng.random() < self.probabilities[i]:
+            return self.choices[i]
+        return self.choices[self.aliases[i]]
+
+
+class RandomTable:
+    """
+    A random encounter table, for a location, with its entries chosen by
+    dice ranges or weights and optionally limited to times of day.
+
+    A sampler is built for each time of day up front, so rolling on the
+    table costs the same whether it has three entries or three hundred.
+    """
+
+    def __init__(self, data, path=''):
+        self.path = path
+        self.name = data.get('name', '')
+        self.location = data.get('location', '')
+        self.dice = data.get('dice')
+
+        faces = dice_weights(self.dice) if self.dice else None
+        self.entries = []
+        for key, entry in data.get('entries', {}).items():
+            entry = dict(entry, key=key)
+            entry['weight'] = entry_weight(entry, faces)
+            times = entry.get('time', times_of_day)
+            entry['time'] = [times] if isinstance(times, str) else times
+            unknown = set(entry['time']) - set(times_of_day)
+            if unknown:
+                raise ValueError(f"Unknown time of day in {self.name} "
+                        f"entry {key}: {', '.join(sorted(unknown))}")
+            self.entries.append(entry)
+
+        self.samplers = {}
+        for time in times_of_day:
+            entries = [x for x in self.entries
+                    if time in x['time'] and x['weight'] > 0]
+            if entries:
+                self.samplers[time] = AliasSampler(entries,
+                        [x['weight'] for x in entries])
+
+    def roll(self, time_of_day='day', rng=random):
+        """
+        Get a random entry for the time of day, or None if nothing on the
+        table can happen then.
+        """
+        sampler = self.samplers.get(time_of_day)
+        return sampler.sample(rng) if sampler else None
+
+    def encounter_for(self, entry):
+        """
+        Make an Encounter for an entry that lists monster groups (or one
+        monster); entries that refer to an encounter by name are left for
+        the caller to look up.
+        """
+        if 'groups' in entry:
+            groups = entry['groups']
+        elif 'monster' in entry:
+            groups = {entry['monster']: {'monster': entry['monster'],
+                    'count': entry.get('count', 1)}}
+        else:
+            return None
+        return Encounter(
+                name=entry.get('name', entry['key'].replace('_', ' ').title()),
+                location=self.location,
+                notes=entry.get('description', ''),
+                groups=groups)
+
+
+def dice_weights(dice):
+    """
+    Get how many ways a dice expression like 1d20 or 2d6 can roll each
+    total, as a dict of total -> ways.
+    """
+    match = dice_expr.match(str(dice))
+    if not match:
+        raise ValueError(f"Invalid dice: {dice}")
+    times, sides, modifier = match.groups()
+
+    ways = {0: 1}
+    for i in range(int(times)):
+        rolled = {}
+        for total, count in ways.items():
+            for face in range(1, int(sides) + 1):
+                rolled[total + face] = rolled.get(total + face, 0) + count
+        ways = rolled
+    return {total + int(modifier or 0): count
+            for total, count in ways.items()}
+
+
+def entry_weight(entry, faces):
+    """
+    Get an entry's weight: how many ways the table's dice can land in its
+    roll range, or else its weight (which defaults to 1).
+    """
+    if 'roll' not in entry:
+        return entry.get('weight', 1)
+    if not faces:
+        raise ValueError(f"Entry {entry['key']} has a roll but the table "
+                "has no dice")
+
+    match = roll_range.match(str(entry['roll']).strip())
+    if not match:
+        raise ValueError(f"Invalid roll for entry {entry['key']}: "
+                f"{entry['roll']}")
+    low = int(match.group(1))
+    high = int(match.group(2) or low)
+    return sum(ways for total, ways in faces.items() if low <= total <= high)
+
+
+class RandomTableLoader:
+    """
+    Load random encounter tables from content/<pack>/tables/*.toml, and
+    keep each one (with its samplers) until its file changes.
+    """
+
+    def __init__(self, base_dir='', content=None):
+        self.pattern = os.path.join(base_dir, 'content/*/tables/*.toml')
+        self.content = content
+        self._tables = {}
+
+    def get_tables(self):
+        tables = {}
+        for path in sorted(self._glob(self.pattern)):
+            mtime = self._mtime(path)
+            cached = self._tables.get(path)
+            if cached and cached[0] == mtime:
+                tables[path] = cached
+            else:
+                tables[path] = (mtime, RandomTable(self._load(path), path))
+        self._tables = tables
+        return [table for mtime, table in tables.values()]
+
+    def get_table(self, name):
+        """
+        Find a table by its name, its filename, or its location.
+        """
+        name = name.lower()
+        for table in self.get_tables():
+            filename = os.path.splitext(os.path.basename(table.path))[0]
+            if name in (table.name.lower(), filename.lower(),
+                    table.location.lower()):
+                return table
+        return None
+
+    def get_table_keys(self):
+        return sorted(os.path.splitext(os.path.basename(x))[0]
+                for x in self._glob(self.pattern))
+
+    def _glob(self, pattern):
+        if self.content:
+            return self.content.glob(pattern)
+        return glob.glob(pattern)
+
+    def _mtime(self, path):
+        mtime = self.content.mtime(path) if self.content else None
+        if mtime is None:
+            mtime = os.stat(path).st_mtime_ns
+        return mtime
+
+    def _load(self, path):
+        if self.content:
+            return self.content.load(path)
+        with open(path, 'r') as fin:
+            return toml.load(fin)
@@ -0,0 +1,107 @@
+import heapq
+import itertools
+import os
+import re
+from collections import namedtuple
+
+import pytoml as toml
+
+from dndme.gametime import Time
+
+ScheduledEvent = namedtuple('ScheduledEvent', 'minutes seq message date time')
+
+
+class Scheduler:
+    """
+    Events to happen at set game times, kept in a heap by game time so
+    that, whenever time moves on, the ones that have come due can be
+    popped off in order without looking at the rest.
+
+    Example usage:
+
+    >>> scheduler = Scheduler()
+    >>> scheduler.add(timeline.minutes + 3 * 24 * 60, "The caravan arrives")
+    >>> scheduler.due(timeline.minutes)
+    []
+    """
+
+    def __init__(self, timeline=None):
+        self.timeline = timeline
+        self._heap = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def events(self):
+        """
+        Get all the events still to come, soonest first.
+        """
+        return sorted(self._heap)
+
+    def add(self, minutes, message):
+        # Remember the date and time too, so that if the calendar changes
+        # the event can stay on the same date
+        date, time = self.timeline.date_and_time(minutes) \
+                if self.timeline else (None, None)
+        event = ScheduledEvent(minutes, next(self._seq), message, date, time)
+        heapq.heappush(self._heap, event)
+        return event
+
+    def cancel(self, event):
+        self._heap.remove(event)
+        heapq.heapify(self._heap)
+
+    def rebuild(self):
+        """
+        Work out each event's game time again from its date and time, after
+        the calendar has changed.
+        """
+        heap = []
+        for event in self._heap:
+            if event.date:
+                try:
+                    event = event._replace(minutes=self.timeline.minutes_at(
+                            event.date, event.time))
+                except (KeyError, ValueError):
+                    print(f"Can't find {event.date.day} {event.date.month} "
+                            f"{event.date.year} in the calendar any more; "
+                            f"leaving it be: {event.message}")
+            heap.append(event)
+        heapq.heapify(heap)
+        self._heap = heap
+
+    def due(self, minutes):
+        """
+        Pop all the events due at or before a game time, soonest first.
+        """
+        events = []
+        while self._heap and self._heap[0].minutes <= minutes:
+            events.append(heapq.heappop(self._heap))
+        return events
+
+
+def load_schedule(filename, timeline):
+    """
+    Load a campaign's schedule, where each event has the date and time it
+    will happen (so the file is easy to read and edit) and a message.
+    """
+    scheduler = Scheduler(timeline)
+    if not filename or not os.path.exists(filename):
+        return scheduler
+
+    with open(filename, 'r') as fin:
+        data = toml.load(fin)
+
+    calendar = timeline.calendar
+    for event in data.get('events', []):
+        date = calendar.parse_date(event['date'])
+        m_time = re.match(r'^(\d+):(\d+)$', event.get('time', '0:00'))
+        if not date or not m_time:
+            print(f"Skipping scheduled event with a bad date or time: "
+                    f"{event}")
+            continue
+        time = Time(*map(int, m_time.groups()))
+        scheduler.add(timeline.minutes_at(date, time), event['message'])
+    return scheduler
@@ -11,13 +11,19 @@ import pytoml as toml
 from prompt_toolkit import HTML
 from prompt_toolkit import PromptSession
 from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
-from prompt_toolkit.completion import Completer, Completion
+from prompt_toolkit.completion import Completer, Completion, ThreadedCompleter
 from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.styles import Style
 
+from dndme.bestiary import Bestiary
+from dndme.completions import CompletionData
+from dndme.content import ContentTree, ImageIndex, warm_up
 from dndme.gametime import Calendar, Clock, Almanac
 from dndme.player_view import PlayerViewManager
+from dndme.scheduler import load_schedule
+from dndme.weather import Weather
 from dndme.models import Game
+from dndme.watcher import ContentWatcher
 
 base_dir = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
 
@@ -113,6 +119,52 @@ def load_commands(game, session, player_view):
             instance = loaded_class(game, session, player_view)
 
 
+def bottom_toolbar(game):
+    """
+    Get the toolbar under the prompt: the date, time, place, weather, sun,
+    and moons.
+    """
+    date = game.calendar.date
+    latitude = game.latitude
+
+    # Near the poles there may be no dawn, sunrise, sunset, or dusk at
+    # all; time_of_day works out polar days and nights for itself
+    time_of_day = game.almanac.time_of_day(date, game.clock, latitude)
+    day_night = {
+        "dawn": "🌅",
+        "day": "☀️",
+        "dusk": "🌅",
+        "night": "✨",
+    }[time_of_day]
+
+    moon_icons = []
+    for phases, _ in game.almanac.moon_phases(date).values():
+        phase = phases[0]
+        icons = {
+            "full": "🌕",
+            "waning gibbous": "🌖",
+            "third quarter": "🌗",
+            "waning crescent": "🌘",
+            "new": "🌑",
+            "waxing crescent": "🌒",
+            "first quarter": "🌓",
+            "waxing gibbous": "🌔",
+        }
+        moon_icons.append(icons[phase])
+
+    n_s = "N" if game.latitude >= 0 else "S"
+    pos = f"🌎 {abs(game.latitude)}°{n_s}"
+
+    weather = game.current_weather
+    if weather:
+        pos = f"{pos} {game.weather.icon(weather)} {weather}"
+    return [("class:bottom-toolbar",
+            " dndme 0.0.5 - help for help, exit to exit"
+            f" - 📆 {game.calendar}"
+            f" ⏰ {game.clock} {pos} {day_night} "
+            f"{''.join(moon_icons)}")]
+
+
 @click.command()
 @click.option('--campaign', default=default_campaign,
         help="Campaign settings to load; "
@@ -123,15 +175,32 @@ def main_loop(campaign, player_view):
     campaign_file = f'{base_dir}/campaigns/{campaign}/settings.toml'
     campaign_data = toml.load(open(campaign_file, 'r'))
 
+    # Keep the content, campaign, and calendar data in memory, and watch
+    # for changes so we can pick up edits made during the session
+    content = ContentTree([
+        f'{base_dir}/content',
+        f'{base_dir}/campaigns/{campaign}',
+        f'{base_dir}/calendars',
+    ])
+
+    # Get all the monsters and encounters parsed in the background while
+    # we carry on; whatever isn't ready yet gets waited for on demand. The
+    # worker processes are forked here, so this has to come before any
+    # threads get started
+    warm_up(content, base_dir)
+    ContentWatcher(content).start()
+
     # Load the calendar
     calendar_file = default_calendar_file
     if 'calendar_file' in campaign_data:
         calendar_file = f"{base_dir}/{campaign_data['calendar_file']}"
-    cal_data = toml.load(open(calendar_file, 'r'))
+    cal_data = content.load(calendar_file)
     calendar = Calendar(cal_data)
 
-    # Load the clock
-    clock = Clock(cal_data['hours_in_day'], cal_data['minutes_in_hour'])
+    # Load the clock, which tells the time from the same timeline as the
+    # calendar
+    clock = Clock(cal_data['hours_in_day'], cal_data['minutes_in_hour'],
+            timeline=calendar.timeline)
 
     # Load the almanac (sunrise/sunset times, moon phases)
     almanac = Almanac(calendar)
@@ -145,6 +214,10 @@ def main_loop(campaign, player_view):
     if 'party_file' in campaign_data:
         party_file = f"{base_dir}/{campaign_data['party_file']}"
 
+    schedule_file = f"{base_dir}/campaigns/{campaign}/schedule.toml"
+    if 'schedule_file' in campaign_data:
+        schedule_file = f"{base_dir}/{campaign_data['schedule_file']}"
+
     log_file = None
     if 'log_file' in campaign_data:
         log_file = f"{base_dir}/{campaign_data['log_file']}"
@@ -155,7 +228,32 @@ def main_loop(campaign, player_view):
             party_file=party_file, log_file=log_file,
             calendar=calendar, clock=clock,
             almanac=almanac,
-            latitude=default_latitude)
+            latitude=default_latitude,
+            content=content,
+            image_index=ImageIndex(content, base_dir),
+            bestiary=Bestiary(content, base_dir),
+            timeline=calendar.timeline,
+            schedule_file=schedule_file,
+            scheduler=load_schedule(schedule_file, calendar.timeline),
+            weather=Weather(calendar,
+                campaign_data.get('weather', cal_data.get('weather', {})),
+                seed=campaign_data.get('weather_seed', campaign)))
+
+    def reload_calendar(path):
+        if path == os.path.abspath(calendar_file):
+            game.calendar.cal_data = content.load(path)
+            # Scheduled events stay on their dates, wherever those now are
+            game.scheduler.rebuild()
+            game.almanac = Almanac(game.calendar)
+            game.weather = Weather(game.calendar,
+                    campaign_data.get('weather',
+                        game.calendar.cal_data.get('weather', {})),
+                    seed=game.weather.seed)
+
+    content.add_listener(reload_calendar)
+
+    # Listens after the calendar reload, so it rebuilds from the new data
+    game.completions = CompletionData(content, base_dir)
 
     session = PromptSession()
 
@@ -163,44 +261,14 @@ def main_loop(campaign, player_view):
 
     load_commands(game, session, player_view_manager)
 
-    def bottom_toolbar():
-        date = game.calendar.date
-        latitude = game.latitude
-
-        dawn, _ = game.almanac.dawn(date, latitude)
-        sunrise, _ = game.almanac.sunrise(date, latitude)
-        sunset, _ = game.almanac.sunset(date, latitude)
-        dusk, _ = game.almanac.dusk(date, latitude)
-        day_night = "✨"
-        if dawn <= (game.clock.hour, game.clock.minute) < sunrise:
-            day_night = "🌅"
-        elif sunrise <= (game.clock.hour, game.clock.minute) < sunset:
-            day_night = "☀️"
-        elif sunset <= (game.clock.hour, game.clock.minute) < dusk:
-            day_night = "🌅"
-
-        moon_icons = []
-        for moon_key in game.calendar.cal_data['moons']:
-            phase, _ = game.almanac.moon_phase(moon_key, date)
-            icons = {
-                "full": "🌕",
-                "waning gibbous": "🌖",
-                "third quarter": "🌗",
-                "waning crescent": "🌘",
-                "new": "🌑",
-                "waxing crescent": "🌒",
-                "first quarter": "🌓",
-                "waxing gibbous": "🌔",
-            }
-            moon_icons.append(icons[phase])
-
-        n_s = "N" if game.latitude >= 0 else "S"
-        pos = f"🌎 {abs(game.latitude)}°{n_s}"
-        return [("class:bottom-toolbar",
-                " dndme 0.0.5 - help for help, exit to exit"
-                f" - 📆 {game.calendar}"
-                f" ⏰ {game.clock} {pos} {day_night} "
-                f"{''.join(moon_icons)}")]
+    # Build completions in the background, and offer them from a thread of
+    # their own so typing never waits on them
+    game.completions.start()
+    completer = ThreadedCompleter(DnDCompleter(commands=game.commands,
+            ignore_case=True, match_middle=False))
+
+    def toolbar():
+        return bottom_toolbar(game)
 
     style = Style.from_dict({
         'bottom-toolbar': '#333333 bg:#ffcc00',
@@ -235,9 +303,8 @@ def main_loop(campaign, player_view):
     while True:
         try:
             user_input = session.prompt("> ",
-                completer=DnDCompleter(commands=game.commands,
-                        ignore_case=True, match_middle=False),
-                bottom_toolbar=bottom_toolbar,
+                completer=completer,
+                bottom_toolbar=toolbar,
                 auto_suggest=AutoSuggestFromHistory(),
                 key_bindings=kb,
                 style=style)
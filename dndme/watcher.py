@@ -0,0 +1,160 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+
+# From <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO |
+        IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+
+event_header = struct.Struct('iIII')
+
+
+class ContentWatcher(threading.Thread):
+    """
+    Watch the roots of a ContentTree in the background, and tell the tree
+    about every file that gets created, changed, or removed.
+
+    Uses inotify where we have it (Linux) and falls back to polling mtimes
+    everywhere else.
+    """
+
+    def __init__(self, tree, poll_interval=2.0):
+        super().__init__(name="dndme-content-watcher", daemon=True)
+        self.tree = tree
+        self.poll_interval = poll_interval
+        self.using_inotify = False
+        self._stop_event = threading.Event()
+        self._fd = None
+        self._watches = {}
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            self._start_inotify()
+        except OSError:
+            self.poll()
+        else:
+            self.using_inotify = True
+            try:
+                self.watch()
+            finally:
+                os.close(self._fd)
+
+    def _start_inotify(self):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify not available")
+
+        self._libc = libc
+        self._fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        for root in self.tree.roots:
+            self._add_watches(root)
+        # Catch up on anything that changed before we were watching
+        self.tree.scan()
+
+    def _add_watches(self, top):
+        for dirpath, dirnames, filenames in os.walk(top):
+            wd = self._libc.inotify_add_watch(
+                    self._fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                if dirpath == top and not self._watches:
+                    raise OSError(errno, f"Can't watch {dirpath}")
+                continue
+            self._watches[wd] = dirpath
+
+    def watch(self):
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select(
+                    [self._fd], [], [], self.poll_interval)
+            if not readable:
+                continue
+            self._handle_events(os.read(self._fd, 64 * 1024))
+
+    def _handle_events(self, buf):
+        offset = 0
+        while offset < len(buf):
+            wd, mask, cookie, length = event_header.unpack_from(buf, offset)
+            offset += event_header.size
+            name = os.fsdecode(buf[offset:offset+length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # We missed things; better look at everything again
+                self.tree.scan()
+                continue
+
+            dirpath = self._watches.get(wd)
+            if dirpath is None:
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd)
+                continue
+
+            path = os.path.join(dirpath, name) if name else dirpath
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_watches(path)
+                    self._update_dir(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.tree.remove(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF):
+                self.tree.remove(path)
+            elif mask & (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_TO):
+                self.tree.update(path)
+
+    def _update_dir(self, top):
+        for dirpath, dirnames, filenames in os.walk(top):
+            for filename in filenames:
+                self.tree.update(os.path.join(dirpath, filename))
+
+    def poll(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.check()
+
+    def check(self):
+        """
+        Compare the tree against the disk once, updating whatever changed.
+        """
+        known = self.tree.snapshot()
+        seen = set()
+        for root in self.tree.roots:
+            for dirpath, dirnames, filenames in os.walk(root):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    seen.add(path)
+                    try:
+                        mtime = os.stat(path).st_mtime_ns
+                    except FileNotFoundError:
+                        continue
+                    if known.get(path) != mtime:
+                        self.tree.update(path)
+
+        for path in set(known) - seen:
+            # Files in archives were never on the disk to begin with; they
+            # go when their archive does
+            if not self.tree.in_archive(path):
+                self.tree.remove(path)
@@ -0,0 +1,213 @@
+import zlib
+
+import numpy as np
+
+from dndme.gametime import Date
+
+# In the southern hemisphere, it's winter when the calendar says summer
+southern_seasons = {
+    'spring': 'autumn',
+    'summer': 'winter',
+    'autumn': 'spring',
+    'winter': 'summer',
+}
+
+
+class Weather:
+    """
+    Day-to-day weather, from a Markov chain for each climate: the chances
+    of each kind of weather tomorrow, given today's, optionally different
+    for each season.
+
+    A whole year of weather for a climate is worked out at once and kept,
+    so looking up the weather for the toolbar is just indexing an array.
+    The random numbers come from a generator seeded by the campaign, the
+    year, and the climate, so the weather on any given day is always the
+    same for a campaign, whichever order the days are visited in.
+
+    Example usage:
+
+    >>> weather = Weather(calendar, cal_data['weather'], seed='example')
+    >>> weather.at(Date(1, 'Hammer', 1488), Time(12, 0), 41)
+    'snow'
+    """
+
+    # How many years' worth of weather to hang on to
+    max_years = 32
+
+    # How many days of weather to run through before the start of a year,
+    # so that it doesn't always start out the same
+    burn_in_days = 30
+
+    def __init__(self, calendar, data, seed=''):
+        self.calendar = calendar
+        self.seed = str(seed)
+        self.icons = data.get('icons', {})
+        self.hourly_change = data.get('hourly_change', 0)
+
+        self.climates = {}
+        for name, climate in data.get('climates', {}).items():
+            self.climates[name] = Climate(name, climate)
+
+        self._years = {}
+
+    def climate(self, latitude):
+        """
+        Get the climate for a latitude (north or south).
+        """
+        for climate in self.climates.values():
+            low, high = climate.latitudes
+            if low <= abs(latitude) <= high:
+                return climate
+        return None
+
+    def at(self, date, time, latitude):
+        """
+        Get the weather at a time on a date, at a latitude; None if no
+        climate covers the latitude.
+        """
+        climate = self.climate(latitude)
+        if not climate:
+            return None
+
+        table = self.year(date.year, climate, southern=latitude < 0)
+        day = self.calendar.ordinal(date) - self.calendar.year_start(date.year)
+        if table.hourly is not None:
+            return climate.states[table.hourly[day, time.hour]]
+        return climate.states[table.daily[day]]
+
+    def icon(self, state):
+        return self.icons.get(state, '')
+
+    def year(self, year, climate, southern=False):
+        """
+        Get a year of weather for a climate, working it out if need be.
+        """
+        key = (year, climate.name, southern)
+        table = self._years.get(key)
+        if table is None:
+            if len(self._years) >= self.max_years:
+                self._years.clear()
+            table = self._generate(year, climate, southern)
+            self._years[key] = table
+        return table
+
+    def _generate(self, year, climate, southern):
+        calendar = self.calendar
+        days = calendar.days_in_year(year)
+        hours = calendar.cal_data['hours_in_day']
+        rng = np.random.default_rng(zlib.crc32(
+                f"{self.seed}:{year}:{climate.name}:{southern}".encode()))
+
+        seasons = self.seasons(year, southern)
+        transitions = np.array([climate.transitions(x) for x in seasons])
+        draws = rng.random(self.burn_in_days + days)
+
+        # Each day's weather depends on the day before's, so this bit has
+        # to go a day at a time; everything else is done for the whole
+        # year at once
+        daily = np.empty(days, dtype=np.int8)
+        state = 0
+        for i in range(self.burn_in_days):
+            state = np.searchsorted(transitions[0, state], draws[i],
+                    side='right')
+        for i in range(days):
+            state = np.searchsorted(transitions[i, state],
+                    draws[self.burn_in_days + i], side='right')
+            daily[i] = state
+
+        hourly = None
+        if self.hourly_change:
+            # Every so often, the weather turns within the day, following
+            # the same chain
+            hourly = np.empty((days, hours), dtype=np.int8)
+            hourly[:, 0] = daily
+            changes = rng.random((days, hours)) < self.hourly_change
+            hour_draws = rng.random((days, hours))
+            rows = np.arange(days)
+            for hour in range(1, hours):
+                previous = hourly[:, hour - 1]
+                cumulative = transitions[rows, previous]
+                turned = (cumulative <= hour_draws[:, hour, None]).sum(axis=1)
+                hourly[:, hour] = np.where(changes[:, hour],
+                        np.minimum(turned, len(climate.states) - 1), previous)
+
+        return WeatherYear(year, daily, hourly)
+
+    def seasons(self, year, southern=False):
+        """
+        Get the name of the season (winter, spring, ...) on each day of a
+        year, going by the calendar's equinoxes and solstices.
+        """
+        calendar = self.calendar
+        start = calendar.year_start(year)
+        days = np.arange(start, start + calendar.days_in_year(year))
+
+        markers = []
+        for key, season in calendar.cal_data.get('seasons', {}).items():
+            ordinal = calendar.ordinal(
+                    Date(season['day'], season['month'], year))
+            name = key.split('_')[0]
+            if southern:
+                name = southern_seasons.get(name, name)
+            markers.append((ordinal, name))
+        if not markers:
+            return [None] * len(days)
+        markers.sort()
+
+        # Before the first marker of the year, it's still the season the
+        # last one started
+        ordinals = np.array([x for x, _ in markers])
+        names = [x for _, x in markers]
+        i = np.searchsorted(ordinals, days, side='right') - 1
+        return [names[x] for x in i]
+
+
+class Climate:
+    """
+    A climate's Markov chain: for each kind of weather, the weights of
+    each kind of weather the next day, with optional replacements for
+    particular seasons.
+    """
+
+    def __init__(self, name, data):
+        self.name = name
+        self.latitudes = tuple(data.get('latitudes', (0, 90)))
+
+        self.states = list(data['transitions'])
+        self._transitions = {None: self._cumulative(data['transitions'])}
+        for season, transitions in data.get('seasons', {}).items():
+            self._transitions[season] = self._cumulative(
+                    dict(data['transitions'], **transitions))
+
+    def transitions(self, season=None):
+        """
+        Get the cumulative chances of going from each kind of weather to
+        each other kind, as a matrix.
+        """
+        return self._transitions.get(season, self._transitions[None])
+
+    def _cumulative(self, transitions):
+        matrix = np.zeros((len(self.states), len(self.states)))
+        for i, state in enumerate(self.states):
+            for next_state, weight in transitions[state].items():
+                if next_state not in self.states:
+                    raise ValueError(f"Unknown weather in {self.name}: "
+                            f"{next_state}")
+                matrix[i, self.states.index(next_state)] = weight
+        totals = matrix.sum(axis=1, keepdims=True)
+        if (totals <= 0).any():
+            raise ValueError(f"Every kind of weather in {self.name} needs "
+                    "somewhere to go")
+        cumulative = np.cumsum(matrix / totals, axis=1)
+        # So rounding can never leave a draw with nowhere to go
+        cumulative[:, -1] = 1.0
+        return cumulative
+
+
+class WeatherYear:
+
+    def __init__(self, year, daily, hourly=None):
+        self.year = year
+        self.daily = daily
+        self.hourly = hourly
@@ -10,3 +10,21 @@ class PartyWriter:
         #print(toml.dumps(party))
         with open(self.filename, 'w') as fout:
             toml.dump(party, fout)
+
+
+class ScheduleWriter:
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def write(self, scheduler, timeline):
+        events = []
+        for event in scheduler.events:
+            date, time = timeline.date_and_time(event.minutes)
+            events.append({
+                "date": f"{date.day} {date.month} {date.year}",
+                "time": f"{time.hour:02}:{time.minute:02}",
+                "message": event.message,
+            })
+        with open(self.filename, 'w') as fout:
+            toml.dump({"events": events}, fout)
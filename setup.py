@@ -18,6 +18,7 @@ setup(
         'six',
         'wcwidth',
         'flask',
+        'numpy',
     ],
     extras_require={
         'test': [
@@ -37,6 +38,8 @@ setup(
     entry_points={
         'console_scripts': [
             'dndme = dndme.shell:main_loop',
+            'dndme-check = dndme.check_data:main',
+            'dndme-import = dndme.importer:main',
             'dndme-new-campaign = dndme.new_campaign:main',
             'dndme-new-content = dndme.new_content:main',
         ],
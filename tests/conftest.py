@@ -0,0 +1,5 @@
+def pytest_addoption(parser):
+    parser.addoption('--check-speedups', action='store_true',
+            help="Fail the throughput tests if the cached or vectorized code "
+            "isn't enough faster; off by default, since timings on a busy "
+            "machine are anybody's guess.")
@@ -0,0 +1,252 @@
+import datetime
+import math
+import time
+
+import numpy as np
+import pytest
+import pytoml as toml
+
+from dndme.gametime import Almanac, Calendar, Date, Time
+
+# Refraction and the radius of the sun's disc, the same allowance the
+# almanac makes for sunrise and sunset
+zenith = 90.833
+
+# How far the almanac's declination (a plain cosine from the winter
+# solstice) may stray from the reference, in degrees
+max_declination_error = 2
+
+years = (1970, 2000, 2018, 2024)
+
+
+@pytest.fixture(scope='module')
+def calendar():
+    with open('calendars/gregorian.toml', 'r') as fin:
+        return Calendar(toml.load(fin))
+
+
+def gregorian_date(calendar, day):
+    """A datetime.date as one of the calendar's dates."""
+    months = [x['name'] for x in calendar.cal_data['months'].values()]
+    return Date(day.day, months[day.month - 1], day.year)
+
+
+def days_in(year):
+    start = datetime.date(year, 1, 1)
+    for i in range((datetime.date(year + 1, 1, 1) - start).days):
+        yield start + datetime.timedelta(days=i)
+
+
+def reference_declination(day):
+    """
+    The sun's declination in degrees, from NOAA's general solar position
+    equations (a Fourier series in the fraction of the year).
+    """
+    days_in_year = 366 if day.year % 4 == 0 and \
+            (day.year % 100 != 0 or day.year % 400 == 0) else 365
+    g = 2 * math.pi / days_in_year * (day.timetuple().tm_yday - 1)
+    return math.degrees(0.006918 - 0.399912 * math.cos(g) +
+            0.070257 * math.sin(g) - 0.006758 * math.cos(2 * g) +
+            0.000907 * math.sin(2 * g) - 0.002697 * math.cos(3 * g) +
+            0.00148 * math.sin(3 * g))
+
+
+def reference_cos_hour_angle(latitude, declination):
+    latitude = math.radians(latitude)
+    declination = math.radians(declination)
+    return ((math.cos(math.radians(zenith)) -
+            math.sin(latitude) * math.sin(declination)) /
+            (math.cos(latitude) * math.cos(declination)))
+
+
+def reference_sun_times(day, latitude):
+    """
+    Sunrise and sunset in minutes from midnight, local apparent solar
+    time (the almanac doesn't care about longitude or the equation of
+    time either), or None if the sun doesn't rise or set.
+    """
+    cos_hour_angle = reference_cos_hour_angle(latitude,
+            reference_declination(day))
+    if abs(cos_hour_angle) > 1:
+        return None
+    hour_angle = math.degrees(math.acos(cos_hour_angle))
+    return 720 - 4 * hour_angle, 720 + 4 * hour_angle
+
+
+def minutes(calendar, date, sun_time):
+    """Minutes from the start of a date to a (time, date) from the almanac."""
+    time_, time_date = sun_time
+    return time_.hour * 60 + time_.minute + \
+            calendar.days_since_date(date, time_date) * 1440
+
+
+def test_gregorian_dates_line_up(calendar):
+    for year in years:
+        day = datetime.date(year, 3, 1)
+        assert calendar.days_since_date(Date(1, 'January', 1970),
+                gregorian_date(calendar, day)) == \
+                (day - datetime.date(1970, 1, 1)).days
+
+
+def test_declination_against_reference(calendar):
+    almanac = Almanac(calendar)
+    for year in years:
+        for day in days_in(year):
+            declination = almanac.solar_declination(
+                    gregorian_date(calendar, day))
+            assert abs(declination - reference_declination(day)) < \
+                    max_declination_error
+
+
+# The further from the equator, the more an error in declination moves
+# sunrise and sunset; minutes allowed for latitudes up to this far
+@pytest.mark.parametrize('max_latitude,max_error', [
+    (30, 5),
+    (50, 9),
+    (65, 17),
+])
+def test_sun_times_against_reference(calendar, max_latitude, max_error):
+    almanac = Almanac(calendar)
+    for latitude in range(-max_latitude, max_latitude + 1, 5):
+        for year in years:
+            for day in days_in(year):
+                expected = reference_sun_times(day, latitude)
+                if not expected:
+                    continue
+                date = gregorian_date(calendar, day)
+                sunrise = minutes(calendar, date,
+                        almanac.sunrise(date, latitude))
+                sunset = minutes(calendar, date,
+                        almanac.sunset(date, latitude))
+                assert abs(sunrise - expected[0]) < max_error
+                assert abs(sunset - expected[1]) < max_error
+
+
+@pytest.mark.parametrize('latitude', [70, 75, 80, 85, 89.9, 90,
+        -70, -80, -90])
+def test_polar_days_and_nights(calendar, latitude):
+    almanac = Almanac(calendar)
+    checked = {'rises': 0, 'never sets': 0, 'never rises': 0}
+
+    for day in days_in(2018):
+        declination = reference_declination(day)
+        # Only where the almanac's declination can't change the answer
+        cos_hour_angles = [reference_cos_hour_angle(latitude, x)
+                for x in (declination - max_declination_error,
+                    declination + max_declination_error)]
+        if all(abs(x) < 1 for x in cos_hour_angles):
+            status = 'rises'
+        elif all(x < -1 for x in cos_hour_angles):
+            status = 'never sets'
+        elif all(x > 1 for x in cos_hour_angles):
+            status = 'never rises'
+        else:
+            continue
+        checked[status] += 1
+
+        date = gregorian_date(calendar, day)
+        if status == 'rises':
+            assert almanac.sunrise(date, latitude)
+            assert almanac.sunset(date, latitude)
+            continue
+
+        for direction in (almanac.rising, almanac.setting):
+            with pytest.raises(ValueError):
+                almanac.calc_time(almanac.depression_horizon, direction,
+                        date, latitude)
+        assert almanac.sunrise(date, latitude) is None
+        assert almanac.sunset(date, latitude) is None
+        expected = 'day' if status == 'never sets' else 'night'
+        for hour in (0, 12):
+            assert almanac.time_of_day(date, Time(hour, 0),
+                    latitude) == expected
+
+    assert checked['never sets'] and checked['never rises']
+    if abs(latitude) < 85:
+        assert checked['rises']
+
+
+def best_time(func, repeat=3):
+    """The fastest of a few runs, in seconds."""
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@pytest.fixture
+def compare_throughput(request, record_property):
+    """
+    Time the same work done a date at a time and all at once, and record
+    dates per second for each. Only with --check-speedups does it fail if
+    all at once isn't at least so many times faster.
+    """
+    def compare(name, count, scalar, vectorized, min_speedup):
+        scalar_time = best_time(scalar)
+        vectorized_time = best_time(vectorized)
+        record_property(f'{name}_scalar_per_second', count / scalar_time)
+        record_property(f'{name}_vectorized_per_second',
+                count / vectorized_time)
+        if request.config.getoption('--check-speedups'):
+            assert scalar_time / vectorized_time > min_speedup
+    return compare
+
+
+def test_sun_times_throughput(calendar, compare_throughput):
+    start = calendar.year_start(2018)
+    dates = [calendar.date_from_ordinal(x) for x in range(start, start + 1461)]
+    latitudes = (0, 45, 60)
+
+    def scalar():
+        almanac = Almanac(calendar)
+        for latitude in latitudes:
+            for date in dates:
+                almanac.calc_time(almanac.depression_horizon,
+                        almanac.rising, date, latitude)
+
+    def vectorized():
+        # A new almanac each time, so building the ephemerides is counted
+        almanac = Almanac(calendar)
+        for latitude in latitudes:
+            for date in dates:
+                almanac.sunrise(date, latitude)
+
+    compare_throughput('sunrise', len(dates) * len(latitudes), scalar,
+            vectorized, 1.5)
+
+
+def test_declination_throughput(calendar, compare_throughput):
+    almanac = Almanac(calendar)
+    years = range(2018, 2022)
+    dates = [calendar.date_from_ordinal(x)
+            for x in range(calendar.year_start(years[0]),
+                calendar.year_start(years[-1] + 1))]
+
+    def scalar():
+        for date in dates:
+            almanac.solar_declination(date)
+
+    def vectorized():
+        for year in years:
+            start = calendar.year_start(year)
+            almanac.solar_declinations(year,
+                    start + np.arange(calendar.days_in_year(year)))
+
+    compare_throughput('declination', len(dates), scalar, vectorized, 10)
+
+
+def test_moon_phase_throughput(calendar, compare_throughput):
+    almanac = Almanac(calendar)
+    start = calendar.year_start(2018)
+    dates = [calendar.date_from_ordinal(x) for x in range(start, start + 1461)]
+
+    def scalar():
+        for date in dates:
+            almanac.moon_phase('luna', date)
+
+    def vectorized():
+        almanac.moon_phases(dates[0], dates[-1])
+
+    compare_throughput('moon_phase', len(dates), scalar, vectorized, 10)
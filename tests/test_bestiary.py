@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from dndme.bestiary import Bestiary, average_hp, category_matches
+from dndme.content import ContentTree
+
+
+@pytest.fixture
+def bestiary():
+    return Bestiary(base_dir='.')
+
+
+def test_find_monsters(bestiary):
+    assert len(bestiary) == 4
+    assert bestiary.find("cr>=5 mtype=dragon size=large") == \
+            ['young_green_dragon']
+    assert bestiary.find("mtype=goblinoid") == ['goblin']
+    assert bestiary.find("cr<1 alignment=evil") == ['goblin', 'skeleton']
+    assert bestiary.find("name=*mage*") == ['evil_mage']
+    assert bestiary.find("mtype!=humanoid") == \
+            ['skeleton', 'young_green_dragon']
+
+
+def test_find_monsters_by_damage_type(bestiary):
+    assert bestiary.find("immune=poison") == \
+            ['skeleton', 'young_green_dragon']
+    assert bestiary.find("vulnerable=bludgeoning") == ['skeleton']
+
+
+def test_bad_queries(bestiary):
+    for query in ("cr>>5", "mtype>dragon", "colour=red", "resist=cheese"):
+        with pytest.raises(ValueError):
+            bestiary.find(query)
+
+
+def test_row(bestiary):
+    goblin = bestiary.row('goblin')
+    assert goblin['cr'] == 0.25
+    assert goblin['hp'] == 7
+    assert goblin['pack'] == 'example'
+    assert bestiary.row('nothing') is None
+
+
+def test_rebuilds_when_monsters_change(tmpdir):
+    monsters = tmpdir.mkdir('content').mkdir('pack').mkdir('monsters')
+    monsters.join('kobold.toml').write('name = "kobold"\ncr = 0.125\n')
+    tree = ContentTree([str(tmpdir.join('content'))])
+    bestiary = Bestiary(tree, str(tmpdir))
+    assert bestiary.find("cr<1") == ['kobold']
+
+    monsters.join('kobold.toml').write('name = "kobold"\ncr = 2\n')
+    os.utime(str(monsters.join('kobold.toml')), ns=(0, 1))
+    tree.update(str(monsters.join('kobold.toml')))
+    assert bestiary.find("cr<1") == []
+
+
+def test_helpers():
+    assert average_hp("2d6") == 7
+    assert average_hp("16d10+48") == 136
+    assert average_hp(13) == 13
+    assert category_matches("neutral evil", "evil")
+    assert category_matches("humanoid:goblinoid", "goblin*")
+    assert not category_matches("humanoid:goblinoid", "dragon")
@@ -0,0 +1,155 @@
+from dndme.check_data import check_file, check_files, checkers, cross_check
+
+
+def test_check_encounter(tmpdir):
+    encounter = tmpdir.mkdir('encounters').join('ambush.toml')
+    encounter.write('''
+name = "Ambush"
+
+[groups.goblins]
+monster = "goblin"
+count = 3
+max_hp = [6, 5]
+
+[groups.orcs]
+monster = "orc"
+count = "goblins + trolls"
+''')
+    result = check_file(str(encounter))
+
+    assert result['kind'] == 'encounter'
+    assert result['problems'] == [
+        "group goblins: has 2 max_hp values but a count of 3",
+        "group orcs: count refers to unknown groups: trolls",
+    ]
+
+
+def test_check_all_problems_at_once(tmpdir):
+    monsters = tmpdir.mkdir('monsters')
+    monsters.join('goblin.toml').write('name = "goblin"\nmax_hp = "2d6"\n')
+    monsters.join('orc.toml').write('name = "orc"\nmax_hp = "lots"\nac = "x"\n')
+    monsters.join('broken.toml').write('name = \n')
+    encounter = tmpdir.mkdir('encounters').join('ambush.toml')
+    encounter.write('name = "Ambush"\n[groups.ogres]\n'
+            'monster = "ogre"\ncount = 1\n')
+
+    results = check_files(
+            sorted(str(x) for x in tmpdir.visit('*.toml')), {}, jobs=2)
+    problems = [(x.split('/')[-1], y) for x, y in cross_check(results)]
+
+    assert len(problems) == 4
+    assert ('orc.toml', 'ac should be int, not str') in problems
+    assert ('orc.toml', 'max_hp is not a number or dice: lots') in problems
+    assert ('ambush.toml', 'group ogres: no such monster: ogre') in problems
+    assert problems[0][0] == 'broken.toml'
+
+
+def test_cached_results_are_reused(tmpdir):
+    monster = tmpdir.mkdir('monsters').join('goblin.toml')
+    monster.write('name = "goblin"\nmax_hp = 7\n')
+    results = check_files([str(monster)], {})
+    cache = {r['hash']: dict(r, problems=['cached']) for r in results.values()}
+
+    results = check_files([str(monster)], cache)
+    assert results[str(monster)]['problems'] == ['cached']
+
+
+def test_check_random_table(tmpdir):
+    tmpdir.mkdir('monsters').join('goblin.toml').write(
+            'name = "goblin"\nmax_hp = "2d6"\n')
+    tmpdir.mkdir('encounters').join('ambush.toml').write(
+            'name = "Ambush"\n[groups.goblins]\nmonster = "goblin"\n'
+            'count = 2\n')
+    tmpdir.mkdir('tables').join('road.toml').write('''
+name = "Road"
+dice = "1d6"
+
+[entries.ambush]
+roll = "1"
+encounter = "Ambush"
+
+[entries.bandits]
+roll = "2-3"
+encounter = "Bandits"
+
+[entries.wolves]
+roll = "4-6"
+monster = "wolf"
+time = "noon"
+''')
+
+    results = check_files(
+            sorted(str(x) for x in tmpdir.visit('*.toml')), {})
+    problems = [y for x, y in cross_check(results)]
+
+    assert problems == [
+        "Unknown time of day in Road entry wolves: noon",
+        "entry wolves: no such monster: wolf",
+        "entry bandits: no such encounter: Bandits",
+    ]
+
+
+def test_check_calendar_with_the_wrong_shapes(tmpdir):
+    calendars = tmpdir.mkdir('calendars')
+    calendars.join('odd.toml').write('''
+name = "Odd"
+hours_in_day = 24
+minutes_in_hour = 60
+axial_tilt = 0
+solar_days_in_year = 10
+default_day = 1
+default_month = "Only"
+default_year = 1
+months = {only = {name = "Only", days = 10}, extra = "Extra"}
+
+[seasons]
+x = "1 A"
+
+[moons]
+luna = 3
+
+[weather]
+climates = {temperate = 3}
+''')
+    calendars.join('fine.toml').write('name = 4\n')
+
+    results = check_files(
+            sorted(str(x) for x in calendars.visit('*.toml')), {}, jobs=2)
+    odd = results[str(calendars.join('odd.toml'))]['problems']
+    assert odd == [
+        "month extra: should be a table",
+        "season x: should be a table",
+        "weather climate temperate: should be a table",
+        "moon luna: should be a table",
+    ]
+    assert results[str(calendars.join('fine.toml'))]['problems']
+
+
+def test_checker_errors_are_problems(tmpdir, monkeypatch):
+    def broken(data, result):
+        raise RuntimeError("oops")
+    monkeypatch.setitem(checkers, 'monster', broken)
+
+    monster = tmpdir.mkdir('monsters').join('goblin.toml')
+    monster.write('name = "goblin"\nmax_hp = 7\n')
+    assert check_file(str(monster))['problems'] == \
+            ["Can't check: RuntimeError('oops')"]
+
+
+def test_check_random_table_with_a_list_of_groups(tmpdir):
+    table = tmpdir.mkdir('tables').join('road.toml')
+    table.write('''
+name = "Road"
+
+[entries.wolves]
+groups = ["wolf", "wolf"]
+
+[entries.bandits]
+groups = {thugs = {monster = "thug", count = 2}, boss = "bandit_captain"}
+''')
+    result = check_file(str(table))
+    assert result['problems'] == [
+        "entry wolves: groups should be dict, not list",
+        "entry bandits group boss: should be a table",
+    ]
+    assert result['refs']['monsters'] == [['bandits', 'thug']]
@@ -0,0 +1,40 @@
+import time
+
+from dndme.completions import CompletionData
+from dndme.content import ContentTree
+
+
+def test_completions_cached_until_sources_change(tmpdir):
+    monsters = tmpdir.mkdir('content').mkdir('pack').mkdir('monsters')
+    monsters.join('goblin.toml').write('name = "goblin"\n')
+    tree = ContentTree([str(tmpdir.join('content'))])
+    completions = CompletionData(tree, str(tmpdir))
+    calls = []
+
+    def provider():
+        calls.append(1)
+        return sorted(x.basename for x in monsters.listdir())
+
+    completions.register('monsters', provider,
+            sources=['content/*/monsters/*.toml'])
+    assert completions.get('monsters') == ['goblin.toml']
+    assert completions.get('monsters') == ['goblin.toml']
+    assert len(calls) == 1
+
+    monsters.join('orc.toml').write('name = "orc"\n')
+    tree.update(str(monsters.join('orc.toml')))
+    completions.start()
+    for _ in range(100):
+        if completions.get('monsters') == ['goblin.toml', 'orc.toml']:
+            break
+        time.sleep(0.01)
+    assert completions.get('monsters') == ['goblin.toml', 'orc.toml']
+
+
+def test_completions_without_content_are_not_cached():
+    completions = CompletionData()
+    words = ['a']
+    completions.register('words', lambda: list(words))
+    assert completions.get('words') == ['a']
+    words.append('b')
+    assert completions.get('words') == ['a', 'b']
@@ -0,0 +1,213 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from dndme import archives
+from dndme.archives import open_archive
+from dndme.content import ContentIndex, ContentTree, ImageIndex, warm_up
+from dndme.watcher import ContentWatcher
+
+
+@pytest.fixture
+def content_dir(tmpdir):
+    monsters = tmpdir.mkdir('content').mkdir('pack').mkdir('monsters')
+    monsters.join('goblin.toml').write('name = "goblin"\nac = 15\n')
+    monsters.join('orc.toml').write('name = "orc"\nac = 13\n')
+    return tmpdir
+
+
+def test_glob_from_memory(content_dir):
+    tree = ContentTree([str(content_dir.join('content'))])
+
+    paths = tree.glob(f'{content_dir}/content/*/monsters/*.toml')
+    assert sorted(os.path.basename(x) for x in paths) == \
+            ['goblin.toml', 'orc.toml']
+    assert tree.glob(f'{content_dir}/content/*.toml') == []
+
+
+def test_load_returns_copies(content_dir):
+    tree = ContentTree([str(content_dir.join('content'))])
+    path = str(content_dir.join('content/pack/monsters/goblin.toml'))
+
+    goblin = tree.load(path)
+    goblin['ac'] = 99
+    assert tree.load(path)['ac'] == 15
+
+
+def test_polling_picks_up_changes(content_dir):
+    tree = ContentTree([str(content_dir.join('content'))])
+    watcher = ContentWatcher(tree)
+    changed = []
+    tree.add_listener(changed.append)
+    goblin = content_dir.join('content/pack/monsters/goblin.toml')
+    assert tree.load(str(goblin))['ac'] == 15
+
+    goblin.write('name = "goblin"\nac = 17\n')
+    os.utime(str(goblin), ns=(0, 1))
+    content_dir.join('content/pack/monsters/orc.toml').remove()
+    watcher.check()
+
+    assert tree.load(str(goblin))['ac'] == 17
+    assert sorted(os.path.basename(x) for x in changed) == \
+            ['goblin.toml', 'orc.toml']
+    assert len(tree.glob(f'{content_dir}/content/*/monsters/*.toml')) == 1
+
+
+def test_watcher_thread_picks_up_new_files(content_dir):
+    tree = ContentTree([str(content_dir.join('content'))])
+    watcher = ContentWatcher(tree, poll_interval=0.05)
+    watcher.start()
+    try:
+        time.sleep(0.2)
+        content_dir.join('content/pack/monsters/kobold.toml').write(
+                'name = "kobold"\n')
+        pattern = f'{content_dir}/content/*/monsters/*.toml'
+        for _ in range(100):
+            if len(tree.glob(pattern)) == 3:
+                break
+            time.sleep(0.05)
+        assert len(tree.glob(pattern)) == 3
+    finally:
+        watcher.stop()
+
+
+def test_warm_up_indexes_content(content_dir):
+    tree = ContentTree([str(content_dir.join('content'))])
+    warm_up(tree, str(content_dir), executor=ThreadPoolExecutor(2))
+
+    assert tree.load(str(content_dir.join(
+            'content/pack/monsters/orc.toml')))['ac'] == 13
+    for _ in range(100):
+        if len(tree.index('monsters').paths) == 2:
+            break
+        time.sleep(0.01)
+    assert sorted(tree.index('monsters').paths) == ['goblin', 'orc']
+    assert tree.is_loaded(str(content_dir.join(
+            'content/pack/monsters/goblin.toml')))
+
+
+def test_index_follows_changes(content_dir):
+    tree = ContentTree([str(content_dir.join('content'))])
+    index = tree.add_index('monsters',
+            f'{content_dir}/content/*/monsters/*.toml', lambda x: x['name'])
+    goblin = content_dir.join('content/pack/monsters/goblin.toml')
+
+    goblin.write('name = "hobgoblin"\n')
+    os.utime(str(goblin), ns=(0, 1))
+    tree.update(str(goblin))
+    assert index.paths == {'hobgoblin': str(goblin)}
+
+    tree.remove(str(goblin))
+    assert index.paths == {}
+
+
+def test_index_duplicates_go_by_path():
+    index = ContentIndex('*', lambda x: x['name'])
+    index.add('/content/c/goblin.toml', {'name': 'goblin'})
+    index.add('/content/a/goblin.toml', {'name': 'goblin'})
+    index.add('/content/b/goblin.toml', {'name': 'goblin'})
+    assert index.paths == {'goblin': '/content/a/goblin.toml'}
+
+    index.discard('/content/a/goblin.toml')
+    assert index.paths == {'goblin': '/content/b/goblin.toml'}
+
+
+def test_image_index(content_dir):
+    images = content_dir.join('content/pack').mkdir('images')
+    images.join('map.jpg').write('')
+    images.mkdir('monsters').join('goblin.png').write('')
+    tree = ContentTree([str(content_dir.join('content'))])
+    image_index = ImageIndex(tree, str(content_dir))
+
+    assert image_index.url('monsters', 'goblin.png') == \
+            '/static/content/pack/images/monsters/goblin.png'
+    assert image_index.url('monsters', 'orc.png') == ''
+    assert image_index.filenames('content', 'content/pack/images') == \
+            ['map.jpg']
+
+    images.join('monsters/orc.png').write('')
+    tree.update(str(images.join('monsters/orc.png')))
+    tree.remove(str(images.join('map.jpg')))
+    assert image_index.url('monsters', 'orc.png') == \
+            '/static/content/pack/images/monsters/orc.png'
+    assert image_index.filenames('content') == []
+
+
+def make_archive(path, files):
+    import zipfile
+    with zipfile.ZipFile(str(path), 'w') as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+
+
+def test_archive_pack_reads_in_place(content_dir):
+    make_archive(content_dir.join('content/boxed.zip'), {
+        'boxed/monsters/kobold.toml': 'name = "kobold"\nac = 12\n',
+        'boxed/images/monsters/kobold.png': 'not really a png',
+    })
+    tree = ContentTree([str(content_dir.join('content'))])
+    kobold = str(content_dir.join('content/boxed/monsters/kobold.toml'))
+
+    assert kobold in tree.glob(f'{content_dir}/content/*/monsters/*.toml')
+    assert tree.in_archive(kobold)
+    assert tree.load(kobold) == {'name': 'kobold', 'ac': 12}
+    assert tree.open(kobold).read().startswith('name = "kobold"')
+
+    images = ImageIndex(tree, str(content_dir))
+    assert images.url('monsters', 'kobold.png') == \
+            '/static/content/boxed/images/monsters/kobold.png'
+
+    # Polling doesn't mistake archived files for deleted ones...
+    watcher = ContentWatcher(tree)
+    watcher.check()
+    assert tree.load(kobold)['ac'] == 12
+
+    # ...but notices when the archive changes
+    make_archive(content_dir.join('content/boxed.zip'), {
+        'monsters/kobold.toml': 'name = "kobold"\nac = 13\n',
+    })
+    os.utime(str(content_dir.join('content/boxed.zip')), ns=(0, 1))
+    watcher.check()
+    assert tree.load(kobold)['ac'] == 13
+    assert images.url('monsters', 'kobold.png') == ''
+
+    content_dir.join('content/boxed.zip').remove()
+    watcher.check()
+    assert tree.glob(f'{content_dir}/content/boxed/*/*') == []
+
+
+def test_archive_members_stay_inside_the_pack(content_dir):
+    make_archive(content_dir.join('content/boxed.zip'), {
+        'monsters/kobold.toml': 'name = "kobold"\n',
+        'monsters/./imp.toml': 'name = "imp"\n',
+        '../../settings.toml': 'sneaky = true\n',
+        '/etc/passwd': 'root\n',
+        'images/../../escape.png': '',
+    })
+    archive = open_archive(str(content_dir.join('content/boxed.zip')))
+
+    assert archive.names == ['monsters/imp.toml', 'monsters/kobold.toml']
+    assert 'monsters/../monsters/kobold.toml' in archive
+    assert '../../settings.toml' not in archive
+    with pytest.raises(KeyError):
+        archive.read('../../settings.toml')
+    with pytest.raises(ValueError):
+        archive.path_for('../escape.png')
+
+
+def test_evicted_archives_are_closed(content_dir, monkeypatch):
+    monkeypatch.setattr(archives, 'max_open_archives', 1)
+    for name in ('one', 'two'):
+        make_archive(content_dir.join(f'content/{name}.zip'),
+                {'monsters/kobold.toml': f'name = "{name}"\n'})
+
+    one = open_archive(str(content_dir.join('content/one.zip')))
+    assert open_archive(str(content_dir.join('content/one.zip'))) is one
+    two = open_archive(str(content_dir.join('content/two.zip')))
+    assert one._file is None
+    assert two._file is not None
+
+    # Anyone still holding on to it can carry on reading
+    assert one.read('monsters/kobold.toml') == b'name = "one"\n'
@@ -0,0 +1,91 @@
+import time
+
+import numpy as np
+import pytest
+
+from dndme.bestiary import Bestiary
+from dndme.encounter_builder import EncounterBuilder, encounter_multiplier, \
+        party_thresholds
+
+
+@pytest.fixture
+def builder():
+    return EncounterBuilder(Bestiary(base_dir='.'))
+
+
+def test_party_thresholds():
+    assert party_thresholds([4, 4, 4, 4]) == \
+            {'easy': 500, 'medium': 1000, 'hard': 1500, 'deadly': 2000}
+
+
+def test_encounter_multiplier():
+    counts = np.array([1, 2, 3, 6, 7, 10, 11, 14, 15, 30])
+    assert list(encounter_multiplier(counts, 4)) == \
+            [1, 1.5, 2, 2, 2.5, 2.5, 3, 3, 4, 4]
+    assert encounter_multiplier(1, 2) == 1.5
+    assert encounter_multiplier(1, 6) == 0.5
+
+
+def test_build_hits_the_budget(builder):
+    rng = np.random.default_rng(1)
+    for difficulty in ('easy', 'medium', 'hard'):
+        encounter = builder.build([3, 3, 3, 3], difficulty, rng=rng)
+        monsters = builder.bestiary
+        xp = sum(monsters.row(x['monster'])['xp'] * x['count']
+                for x in encounter.groups.values())
+        count = sum(x['count'] for x in encounter.groups.values())
+        adjusted = xp * encounter_multiplier(count, 4)
+        thresholds = party_thresholds([3, 3, 3, 3])
+        assert thresholds[difficulty] <= adjusted
+        assert adjusted < min(x for x in thresholds.values()
+                if x > thresholds[difficulty])
+
+
+def test_build_with_criteria(builder):
+    encounter = builder.build([1, 1, 1, 1], 'medium', query='mtype=undead')
+    assert list(encounter.groups) == ['skeleton']
+
+    encounter = builder.build([1, 1, 1, 1], 'medium', names={'goblin'})
+    assert list(encounter.groups) == ['goblin']
+
+    with pytest.raises(ValueError):
+        builder.build([1, 1, 1, 1], 'easy', query='mtype=dragon')
+    with pytest.raises(ValueError):
+        builder.build([1, 1, 1, 1], 'impossible')
+
+
+def test_build_is_quick_with_a_big_bestiary(builder):
+    columns = builder.bestiary.columns
+    size = 20000
+    rng = np.random.default_rng(2)
+    builder.bestiary._columns = dict(columns,
+            name=np.array([f"monster_{i}" for i in range(size)]),
+            xp=rng.choice([10, 25, 50, 100, 200, 450, 700, 1100], size)
+                    .astype(float),
+            cr=np.zeros(size), mtype=np.zeros(size, dtype=np.int32))
+
+    start = time.perf_counter()
+    encounter = builder.build([5, 5, 5, 5, 5], 'hard', query='mtype=*')
+    assert time.perf_counter() - start < 0.5
+    assert encounter.groups
+
+
+def test_build_searches_every_monster(builder):
+    columns = builder.bestiary.columns
+    size = 20000
+    builder.bestiary._columns = dict(columns,
+            name=np.array([f"monster_{i}" for i in range(size)]),
+            xp=np.array([1.0] * (size - 1) + [3000.0]),
+            cr=np.zeros(size), mtype=np.zeros(size, dtype=np.int32))
+
+    # Only the one big monster, with a few little ones, makes the budget
+    for seed in range(5):
+        encounter = builder.build([5, 5, 5, 5, 5], 'hard', query='mtype=*',
+                rng=np.random.default_rng(seed))
+        assert encounter.groups[f"monster_{size - 1}"]['count'] == 1
+
+    # And when nothing fits, it's as close as it gets
+    encounter = builder.build([5, 5, 5, 5, 5], 'hard', query='mtype=*',
+            names={'monster_0'})
+    assert encounter.groups == {'monster_0': {'monster': 'monster_0',
+            'count': 12}}
@@ -1,8 +1,12 @@
+import os
+
 from attr import attrib
 import pytest
 
-from dndme.loaders import EncounterLoader
-from dndme.models import Combat
+from dndme.content import ContentTree
+from dndme.loaders import EncounterLoader, EncounterPlan, GroupPlan, \
+        MonsterLoader
+from dndme.models import Character, Combat, Encounter, Monster
 
 
 @pytest.fixture
@@ -24,3 +28,126 @@ def test_get_available_encounters(encounter_loader):
     assert 'goblins' in available_encounters[0].groups
     assert available_encounters[0].groups['goblins']['count'] == 4
 
+
+def test_get_encounter_summaries(encounter_loader):
+    summaries = encounter_loader.get_encounter_summaries()
+
+    assert len(summaries) == 5
+    assert summaries[0].name == 'LMoP 1.1.1: Goblin Ambush'
+    assert summaries[0].location == 'Triboar Trail'
+
+    encounter = encounter_loader.load_encounter_file(summaries[0].path)
+    assert encounter.name == summaries[0].name
+    assert encounter.groups['goblins']['count'] == 4
+
+
+def test_encounter_summaries_refresh_on_change(tmpdir):
+    encounter_file = tmpdir.join('ambush.toml')
+    encounter_file.write('name = "Ambush"\nlocation = "Road"\n'
+            'notes = """\n[not a table]\n"""\n\n'
+            '[groups.goblins]\nmonster = "goblin"\ncount = 2\n')
+    loader = EncounterLoader(
+        base_dir=str(tmpdir), monster_loader=None, combat=Combat())
+
+    summaries = loader.get_encounter_summaries()
+    assert [(x.name, x.location) for x in summaries] == [('Ambush', 'Road')]
+
+    encounter_file.write('name = "Bigger Ambush"\nlocation = "Road"\n')
+    os.utime(str(encounter_file), ns=(0, 1))
+    summaries = loader.get_encounter_summaries()
+    assert summaries[0].name == 'Bigger Ambush'
+
+
+def test_determine_count_from_expression(encounter_loader):
+    encounter_loader.combat.characters.update({
+        'Sariel': Character(name='Sariel'),
+        'Pip': Character(name='Pip'),
+    })
+    monster_groups = {'goblins': [object()] * 3}
+
+    assert encounter_loader._determine_count(
+            GroupPlan('orcs', {'monster': 'orc',
+                'count': 'goblins * 2 + players'}),
+            monster_groups) == 8
+    assert encounter_loader._determine_count(
+            GroupPlan('orcs', {'monster': 'orc', 'count': 'party - 5'}),
+            monster_groups) == 1
+    with pytest.raises(ValueError):
+        GroupPlan('orcs', {'monster': 'orc', 'count': 'open("x").read()'})
+
+
+def test_encounter_plan_load_order():
+    encounter = Encounter(name='Test', groups={
+        'dragons': {'monster': 'young_green_dragon',
+            'count': 'goblins + evil_mage'},
+        'goblins': {'monster': 'goblin', 'count': '1d4+2'},
+        'evil_mage': {'monster': 'evil_mage', 'count': 'goblins'},
+        'skeletons': {'monster': 'skeleton', 'count': 'players + 2'},
+    })
+    plan = EncounterPlan(encounter)
+    assert plan.load_order == ['goblins', 'skeletons', 'evil_mage', 'dragons']
+
+    encounter.groups['goblins']['count'] = 'dragons'
+    with pytest.raises(ValueError):
+        EncounterPlan(encounter)
+
+
+def test_group_plan_apply():
+    plan = GroupPlan('goblins', {
+        'monster': 'goblin',
+        'count': 2,
+        'alias': ['Grip', 'Grab'],
+        'max_hp': [6, 5],
+        'ac': 17,
+        'skills': {'athletics': 2},
+        'remove': ['actions.shortbow'],
+    })
+    monsters = [Monster(name='goblin', max_hp='2d6',
+            actions={'shortbow': {}, 'scimitar': {}}) for i in range(2)]
+    plan.apply(monsters)
+
+    assert [x.alias for x in monsters] == ['Grip', 'Grab']
+    assert monsters[0].name.startswith('goblin-01/')
+    assert [x.max_hp for x in monsters] == [6, 5]
+    assert [x.cur_hp for x in monsters] == [6, 5]
+    assert monsters[1].ac == 17
+    assert monsters[1].skills == {'athletics': 2}
+    assert list(monsters[0].actions) == ['scimitar']
+
+
+def test_monster_loader_prepare_reuses_template():
+    image_loader = type('ImageLoader', (), {
+            'get_monster_image_path': lambda self, x: f"/images/{x}"})()
+    monster_loader = MonsterLoader(image_loader)
+
+    template = monster_loader.prepare('goblin')
+    assert monster_loader.prepare('goblin') is template
+
+    monsters = monster_loader.load('goblin', count=2)
+    assert len(monsters) == 2
+    monsters[0].conditions['prone'] = 1
+    assert monsters[1].conditions == {}
+    assert monster_loader.prepare('nothing_like_this') is None
+
+
+def test_monster_loader_notices_edits(tmpdir):
+    goblin = tmpdir.mkdir('content').mkdir('pack').mkdir('monsters') \
+            .join('goblin.toml')
+    goblin.write('name = "goblin"\nmax_hp = 7\nimage_url = "goblin.png"\n')
+    tree = ContentTree([str(tmpdir.join('content'))])
+    tree.add_index('monsters', f'{tmpdir}/content/*/monsters/*.toml',
+            lambda x: x['name'])
+    tree.load(str(goblin))
+    image_loader = type('ImageLoader', (), {
+            'get_monster_image_path': lambda self, x: f"/images/{x}"})()
+    monster_loader = MonsterLoader(image_loader, content=tree)
+
+    template = monster_loader.prepare('goblin')
+    assert template['image_url'] == '/images/goblin.png'
+    assert monster_loader.prepare('goblin') is template
+
+    goblin.write('name = "goblin"\nmax_hp = 7\nimage_url = "grinch.png"\n')
+    os.utime(str(goblin), ns=(0, 1))
+    tree.update(str(goblin))
+    assert monster_loader.prepare('goblin')['image_url'] == \
+            '/images/grinch.png'
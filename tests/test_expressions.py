@@ -0,0 +1,95 @@
+import ast
+import sys
+
+import pytest
+
+from dndme.expressions import compile_expression
+from dndme.gametime import Calendar
+
+
+def test_compile_expression():
+    expression = compile_expression("goblins + evil_mage * 2")
+    assert expression.names == ('evil_mage', 'goblins')
+    assert expression(goblins=3, evil_mage=1) == 5
+    assert compile_expression("goblins + evil_mage * 2") is expression
+
+
+def test_leap_year_rule():
+    expression = compile_expression(
+            "(year % 4 == 0) and (year % 100 != 0) or (year % 400 == 0)")
+    assert expression.moduli == (4, 100, 400)
+    assert [expression(year=x) for x in (1900, 2000, 2019, 2020)] == \
+            [False, True, False, True]
+
+
+def test_literals():
+    expression = compile_expression("year % 7 == 3 and not False or 2.5 > -1")
+    assert expression.moduli == (7,)
+    assert expression.constants == (1, 2.5, 3, 7)
+    assert expression(year=10) is True
+    with pytest.raises(ValueError):
+        compile_expression("year == None")
+
+
+@pytest.mark.skipif(sys.version_info >= (3, 8),
+        reason="numbers only parse as ast.Num before Python 3.8")
+def test_literals_parsed_as_num():
+    tree = ast.parse("year % 4 == 0", mode='eval')
+    assert any(isinstance(node, ast.Num) for node in ast.walk(tree))
+
+    expression = compile_expression("year % 4 == 0 and True")
+    assert expression.moduli == (4,)
+    assert expression.constants == (0, 4)
+    assert expression(year=1488)
+    assert Calendar({
+        'default_day': 1,
+        'default_month': 'Hammer',
+        'default_year': 1488,
+        'leap_year_rule': 'year % 4 == 0',
+        'months': {'hammer': {'name': 'Hammer', 'days': 30}},
+    }).is_leap_year(1488)
+
+
+@pytest.mark.parametrize('text', [
+    "__import__('os').system('ls')",
+    "goblins.__class__",
+    "[x for x in range(10)]",
+    "'a' * 1000",
+    "players +",
+])
+def test_unsafe_or_invalid_expressions(text):
+    with pytest.raises(ValueError):
+        compile_expression(text)
+
+
+def test_division_by_zero():
+    with pytest.raises(ValueError):
+        compile_expression("year % 0 == 0")(year=1488)
+    with pytest.raises(ValueError):
+        Calendar({
+            'default_day': 1,
+            'default_month': 'Hammer',
+            'default_year': 1488,
+            'leap_year_rule': 'year % 0 == 0',
+            'months': {'hammer': {'name': 'Hammer', 'days': 30}},
+        })
+
+
+def test_missing_variable():
+    with pytest.raises(ValueError):
+        compile_expression("goblins + 1")()
+
+
+def test_calendar_leap_year():
+    calendar = Calendar({
+        'default_day': 1,
+        'default_month': 'Hammer',
+        'default_year': 1488,
+        'leap_year_rule': 'year % 4 == 0',
+        'months': {'hammer': {'name': 'Hammer', 'days': 30}},
+    })
+    assert calendar.is_leap_year(1488)
+    assert not calendar.is_leap_year(1489)
+
+    calendar.cal_data = dict(calendar.cal_data, leap_year_rule='year % 5 == 0')
+    assert calendar.is_leap_year(1490)
@@ -0,0 +1,340 @@
+import random
+
+import pytest
+import pytoml as toml
+
+from dndme.gametime import Almanac, Calendar, Clock, Date, Time
+from dndme.models import Character, Game
+
+
+def load_calendar(name):
+    with open(f'calendars/{name}.toml', 'r') as fin:
+        return Calendar(toml.load(fin))
+
+
+def walk(calendar, date, days):
+    """The slow way: a day at a time."""
+    months = list(calendar.cal_data['months'].values())
+    day, month, year = date
+    i = [x['name'] for x in months].index(month)
+    step = 1 if days > 0 else -1
+    for _ in range(abs(days)):
+        day += step
+        while day < 1 or day > calendar.days_in_month(months[i]['name'], year):
+            if day < 1:
+                i -= 1
+                if i < 0:
+                    i, year = len(months) - 1, year - 1
+                day = calendar.days_in_month(months[i]['name'], year)
+            else:
+                i += 1
+                if i == len(months):
+                    i, year = 0, year + 1
+                day = 1
+    return Date(day, months[i]['name'], year)
+
+
+@pytest.mark.parametrize('name', ['gregorian', 'forgotten_realms'])
+def test_offsets_match_walking(name):
+    calendar = load_calendar(name)
+    rng = random.Random(name)
+    date = calendar.date
+    for _ in range(200):
+        days = rng.randint(-800, 800)
+        expected = walk(calendar, date, days)
+        assert calendar.date_from_date_and_offset(date, days) == expected
+        assert calendar.days_since_date(date, expected) == days
+        date = expected
+
+
+def test_ordinals():
+    calendar = load_calendar('gregorian')
+    assert calendar.ordinal(Date(1, 'January', 0)) == 0
+    assert calendar.date_from_ordinal(-1) == Date(31, 'December', -1)
+    assert calendar.days_since_date(
+            Date(1, 'January', 1970), Date(1, 'January', 2000)) == 10957
+    assert calendar.date_from_date_and_offset(
+            Date(28, 'February', 2000), 1) == Date(29, 'February', 2000)
+    assert calendar.date_from_date_and_offset(
+            Date(28, 'February', 1900), 1) == Date(1, 'March', 1900)
+    assert calendar.day_of_year(Date(31, 'December', 2000)) == 366
+
+
+def test_leap_only_months_are_skipped():
+    calendar = load_calendar('forgotten_realms')
+    shieldmeet = Date(1, 'Shieldmeet', 1488)
+    assert calendar.date_from_date_and_offset(
+            Date(1, 'Midsummer', 1488), 1) == shieldmeet
+    assert calendar.date_from_date_and_offset(
+            Date(1, 'Midsummer', 1489), 1) == Date(1, 'Eleasis', 1489)
+
+
+def test_rule_that_never_repeats():
+    calendar = Calendar({
+        'default_day': 1,
+        'default_month': 'Hammer',
+        'default_year': 1488,
+        'leap_year_rule': 'year > 1000 and year % 4 == 0',
+        'months': {
+            'hammer': {'name': 'Hammer', 'days': 30},
+            'extra': {'name': 'Extra', 'days': 0, 'leap_year_days': 1},
+        },
+    })
+    assert calendar._leap_cycle is None
+
+    date = Date(30, 'Hammer', 1004)
+    assert calendar.date_from_date_and_offset(date, 1) == Date(1, 'Extra', 1004)
+    assert calendar.date_from_date_and_offset(date, 2) == Date(1, 'Hammer', 1005)
+    assert calendar.date_from_date_and_offset(date, -30) == \
+            Date(30, 'Hammer', 1003)
+    # 996 and 1000 come too early to be leap years
+    assert calendar.days_since_date(Date(1, 'Hammer', 996), date) == \
+            8 * 30 + 29
+
+
+@pytest.mark.parametrize('name', ['gregorian', 'forgotten_realms'])
+@pytest.mark.parametrize('latitude', [0, 41.5, 66, -70])
+def test_ephemeris_matches_scalar_calculation(name, latitude):
+    calendar = load_calendar(name)
+    almanac = Almanac(calendar)
+    start = calendar.year_start(calendar.date.year)
+
+    for ordinal in range(start, start + 400, 3):
+        date = calendar.date_from_ordinal(ordinal)
+        for depression, direction, method in (
+                (almanac.depression_civil, almanac.rising, almanac.dawn),
+                (-0.833, almanac.rising, almanac.sunrise),
+                (-0.833, almanac.setting, almanac.sunset),
+                (almanac.depression_civil, almanac.setting, almanac.dusk)):
+            try:
+                expected = almanac.calc_time(depression, direction, date,
+                        latitude)
+            except ValueError:
+                expected = None
+            assert method(date, latitude) == expected
+
+
+def test_sun_times_range():
+    calendar = load_calendar('forgotten_realms')
+    almanac = Almanac(calendar)
+    start = calendar.parse_date('25 Nightal 1488')
+    end = calendar.parse_date('5 Hammer 1489')
+
+    rows = almanac.sun_times(start, end, 45)
+    assert len(rows) == calendar.days_since_date(start, end) + 1
+    assert rows[0][0] == start
+    assert rows[-1][0] == end
+    assert rows[0][2] == almanac.sunrise(start, 45)
+
+
+def test_parse_date():
+    calendar = load_calendar('forgotten_realms')
+    assert calendar.parse_date('1 hammer') == \
+            Date(1, 'Hammer', calendar.date.year)
+    assert calendar.parse_date('1 Hammer', default_year=0) == \
+            Date(1, 'Hammer', 0)
+    assert calendar.parse_date('30 Hammer 1489') == Date(30, 'Hammer', 1489)
+    assert calendar.parse_date('31 Hammer 1489') is None
+    assert calendar.parse_date('1 Nope') is None
+
+
+@pytest.mark.parametrize('name', ['gregorian', 'forgotten_realms'])
+def test_moon_phases_match_single_dates(name):
+    calendar = load_calendar(name)
+    almanac = Almanac(calendar)
+    start = calendar.ordinal(calendar.date)
+    end = start + 100
+
+    moons = almanac.moon_phases(calendar.date_from_ordinal(start),
+            calendar.date_from_ordinal(end))
+    for moon_key, (phases, fractions) in moons.items():
+        assert len(phases) == len(fractions) == 101
+        for i, ordinal in enumerate(range(start, end + 1, 7)):
+            date = calendar.date_from_ordinal(ordinal)
+            assert almanac.moon_phase(moon_key, date) == \
+                    (phases[i * 7], fractions[i * 7])
+
+
+def test_moon_phases_cycle():
+    calendar = load_calendar('gregorian')
+    almanac = Almanac(calendar)
+    full = Date(1, 'January', 2018)
+    assert almanac.moon_phase('luna', full) == ('full', 0)
+
+    # Dates before the reference full moon go round the same cycle
+    before = calendar.date_from_date_and_offset(full, -15)
+    after = calendar.date_from_date_and_offset(full, round(29.53 * 10) - 15)
+    assert almanac.moon_phase('luna', before)[0] == 'new'
+    assert almanac.moon_phase('luna', after)[0] == 'new'
+
+    phases, _ = almanac.moon_phases(full,
+            calendar.date_from_date_and_offset(full, 29))['luna']
+    assert all(phase for phase in phases)
+
+
+def three_moon_almanac():
+    with open('calendars/forgotten_realms.toml', 'r') as fin:
+        cal_data = toml.load(fin)
+    cal_data['moons']['second'] = {'name': "Second", 'period': 41.3,
+            'full_on': "5 Hammer 1480"}
+    cal_data['moons']['third'] = {'name': "Third", 'period': 17.9,
+            'full_on': "12 Ches 1470"}
+    return Almanac(Calendar(cal_data))
+
+
+@pytest.mark.parametrize('phase,window', [
+    ('full', None), ('new', None), ('full', 0.05), (None, None)])
+def test_conjunctions_match_scanning(phase, window):
+    almanac = three_moon_almanac()
+    calendar = almanac.calendar
+    start = Date(1, 'Hammer', 1488)
+
+    found = almanac.find_conjunctions(start, count=3, phase=phase,
+            window=window)
+    assert len(found) == 3
+
+    # Every day up to the last one found, the slow way
+    moons = almanac.moon_phases(start, found[-1])
+    expected = []
+    for i in range(calendar.days_since_date(start, found[-1]) + 1):
+        phases = [x[0][i] for x in moons.values()]
+        fractions = sorted(x[1][i] for x in moons.values())
+        if phase and not window:
+            ok = all(x == phase for x in phases)
+        elif phase:
+            ok = all(min(x, 1 - x) <= window for x in fractions)
+        else:
+            gaps = [b - a for a, b in zip(fractions,
+                    fractions[1:] + [fractions[0] + 1])]
+            ok = 1 - max(gaps) <= 0.02 + 1e-9
+        if ok:
+            expected.append(calendar.date_from_date_and_offset(start, i))
+    assert found == expected
+
+
+def test_conjunctions_that_never_happen():
+    almanac = three_moon_almanac()
+    almanac.calendar.cal_data['moons']['twin'] = {'name': "Twin",
+            'period': 30.4375, 'full_on': "15 Hammer 1488"}
+    start = Date(1, 'Hammer', 1488)
+
+    assert almanac.find_conjunctions(start, moons=['selune', 'twin']) == []
+    assert almanac.find_conjunctions(start, phase=None,
+            moons=['selune', 'twin']) == []
+    with pytest.raises(ValueError):
+        almanac.find_conjunctions(start, moons=['nope'])
+
+
+def test_timeline_rolls_the_date_with_the_clock():
+    calendar = load_calendar('forgotten_realms')
+    clock = Clock(24, 60, timeline=calendar.timeline)
+    calendar.set_date(Date(30, 'Hammer', 1488))
+    clock.hour, clock.minute = 23, 0
+
+    clock.adjust_time(minutes=90)
+    assert calendar.date == Date(1, 'Midwinter', 1488)
+    assert (clock.hour, clock.minute) == (0, 30)
+
+    clock.adjust_time(hours=-1)
+    assert calendar.date == Date(30, 'Hammer', 1488)
+    assert str(clock) == "23:30"
+
+    clock.adjust_time(hours=72)
+    assert calendar.date == Date(2, 'Alturiak', 1488)
+
+    calendar.adjust_date(400)
+    assert calendar.date == calendar.date_from_ordinal(
+            calendar.ordinal(Date(2, 'Alturiak', 1488)) + 400)
+    assert str(clock) == "23:30"
+
+
+def test_timeline_minutes():
+    calendar = load_calendar('gregorian')
+    timeline = calendar.timeline
+    date, time = Date(20, 'July', 1969), Time(20, 17)
+
+    minutes = timeline.minutes_at(date, time)
+    assert timeline.date_and_time(minutes) == (date, time)
+    assert timeline.date_and_time(minutes + 24 * 60) == \
+            (Date(21, 'July', 1969), time)
+
+    timeline.date, timeline.time = date, time
+    assert timeline.minutes == minutes
+    assert calendar.date == date
+
+
+def test_conditions_wear_off_as_time_passes():
+    calendar = load_calendar('forgotten_realms')
+    clock = Clock(24, 60, timeline=calendar.timeline)
+    game = Game(base_dir='', encounters_dir='', party_file='', log_file=None,
+            calendar=calendar, clock=clock, almanac=Almanac(calendar),
+            latitude=0, stash={}, combats=[], timeline=calendar.timeline)
+    bilbo = Character(name='Bilbo')
+    game.combat.characters['Bilbo'] = bilbo
+    bilbo.set_condition('poisoned', 600)
+    bilbo.set_condition('invisible', 100)
+    bilbo.set_condition('prone')
+
+    assert game.pass_time(5) == {}
+    assert game.pass_time(55) == {'Bilbo': ['poisoned', 'invisible']}
+    assert list(bilbo.conditions) == ['prone']
+    assert str(clock) == "01:00"
+
+
+def test_seasonal_index():
+    calendar = load_calendar('forgotten_realms')
+    calendar.cal_data['festivals'] = {
+        'shieldmeet': {'name': "Shieldmeet", 'month': "Shieldmeet", 'day': 1},
+    }
+    calendar.cal_data = calendar.cal_data
+
+    index = calendar.seasonal_index(1488)
+    names = {name: calendar.date_from_ordinal(ordinal)
+            for ordinal, names in index.items() for name in names}
+    assert names['Spring Equinox'] == Date(19, 'Ches', 1488)
+    assert names['Winter Solstice'] == Date(20, 'Nightal', 1488)
+    assert names['Shieldmeet'] == Date(1, 'Shieldmeet', 1488)
+
+    # No Shieldmeet, outside leap years
+    assert len(calendar.seasonal_index(1489)) == 4
+
+
+def test_moon_events():
+    calendar = load_calendar('forgotten_realms')
+    almanac = Almanac(calendar)
+    start, end = Date(1, 'Hammer', 1488), Date(30, 'Nightal', 1488)
+
+    events = almanac.moon_events(start, end)
+    phases, _ = almanac.moon_phases(start, end)['selune']
+    for ordinal, moon_events in events.items():
+        i = ordinal - calendar.ordinal(start)
+        assert moon_events == [('selune', phases[i])]
+        assert i == 0 or phases[i - 1] != phases[i]
+    assert sum(1 for x in events.values() if x[0][1] == 'full') == 12
+
+
+def test_convert_dates_between_calendars():
+    realms = load_calendar('forgotten_realms')
+    gregorian = load_calendar('gregorian')
+
+    assert realms.convert_date(Date(1, 'Hammer', 1488), gregorian) == \
+            Date(1, 'January', 2018)
+    assert gregorian.convert_date(Date(1, 'January', 2018), realms) == \
+            Date(1, 'Hammer', 1488)
+
+    rng = random.Random(0)
+    for _ in range(200):
+        date = realms.date_from_ordinal(rng.randint(0, 1000000))
+        converted = realms.convert_date(date, gregorian)
+        assert gregorian.convert_date(converted, realms) == date
+        assert gregorian.days_since_date(Date(1, 'January', 2018),
+                converted) == realms.days_since_date(
+                Date(1, 'Hammer', 1488), date)
+
+
+def test_convert_needs_an_epoch():
+    realms = load_calendar('forgotten_realms')
+    cal_data = dict(realms.cal_data)
+    del cal_data['epoch']
+    with pytest.raises(ValueError):
+        realms.convert_date(realms.date, Calendar(cal_data))
@@ -0,0 +1,30 @@
+import zipfile
+
+from dndme import http_api
+
+
+def test_static_content_from_archive(tmpdir, monkeypatch):
+    content = tmpdir.mkdir('content')
+    content.mkdir('loose').join('goblin.png').write('loose goblin')
+    with zipfile.ZipFile(str(content.join('boxed.zip')), 'w') as archive:
+        archive.writestr('images/monsters/kobold.png', 'boxed kobold')
+        archive.writestr('../secret.png', 'not for players')
+    monkeypatch.setattr(http_api, 'base_dir', str(tmpdir))
+    client = http_api.app.test_client()
+
+    response = client.get('/static/content/boxed/images/monsters/kobold.png')
+    assert response.status_code == 200
+    assert response.data == b'boxed kobold'
+    assert response.mimetype == 'image/png'
+
+    response = client.get('/static/content/loose/goblin.png')
+    assert response.data == b'loose goblin'
+    response.close()
+
+    response = client.get('/static/content/boxed/images/missing.png')
+    assert response.status_code == 404
+
+    response = client.get('/static/content/boxed/images/../../secret.png')
+    assert response.status_code == 404
+    response = client.get('/static/content/boxed/..%2Fsecret.png')
+    assert response.status_code == 404
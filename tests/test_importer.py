@@ -0,0 +1,95 @@
+import io
+import json
+
+import pytoml as toml
+from click.testing import CliRunner
+
+from dndme.importer import convert_record, main, read_csv_records, \
+        read_json_records
+
+
+def test_read_json_records_streams_list_and_lines():
+    records = [{'name': f"Monster {i}", 'notes': "[, ]" * i}
+            for i in range(20)]
+
+    listing = io.StringIO(json.dumps(records, indent=2))
+    assert list(read_json_records(listing, chunk_size=7)) == records
+
+    lines = io.StringIO("\n".join(json.dumps(x) for x in records))
+    assert list(read_json_records(lines, chunk_size=5)) == records
+
+
+def test_read_csv_records_nests_dotted_columns():
+    source = io.StringIO("name,cr,skills.stealth,senses.darkvision\n"
+            "goblin,1/4,+6,60\n")
+    assert list(read_csv_records(source)) == [{
+        'name': 'goblin',
+        'cr': '1/4',
+        'skills': {'stealth': '+6'},
+        'senses': {'darkvision': '60'},
+    }]
+
+
+def test_convert_record():
+    monster = convert_record({
+        'name': "Goblin Boss",
+        'size': "Small",
+        'type': "humanoid",
+        'subtype': "goblinoid",
+        'armor_class': 17,
+        'armor_desc': "chain shirt, shield",
+        'hit_points': "21 (6d6)",
+        'speed': {'walk': 30},
+        'dexterity': "14",
+        'challenge_rating': "1/4",
+        'skills': "Stealth +6",
+        'senses': "darkvision 60 ft., passive Perception 9",
+        'actions': [{'name': "Scimitar", 'desc': "Slash."}],
+        'unknown_field': "ignored",
+    })
+
+    assert monster == {
+        'name': 'goblin_boss',
+        'size': 'small',
+        'mtype': 'humanoid:goblinoid',
+        'ac': 17,
+        'armor': "chain shirt, shield",
+        'max_hp': '6d6',
+        'speed': 30,
+        'dex': 14,
+        'cr': 0.25,
+        'skills': {'stealth': 6},
+        'senses': {'darkvision': 60, 'perception': 9},
+        'actions': {'scimitar': {'name': "Scimitar", 'description': "Slash."}},
+    }
+
+
+def test_import_writes_monsters_and_images(tmpdir):
+    tmpdir.join('goblin.png').write('not really a png')
+    source = tmpdir.join('bestiary.json')
+    source.write(json.dumps([
+        {'name': 'Goblin', 'hit_dice': '2d6', 'img_main': 'goblin.png'},
+        {'name': ''},
+        {'name': 'Skeleton', 'hit_points': 13},
+        {'name': '???', 'hit_points': 1},
+    ]))
+    content_dir = tmpdir.join('content')
+
+    result = CliRunner().invoke(main, [str(source), 'imported',
+            '--content-dir', str(content_dir)])
+
+    assert "Imported 2 monsters" in result.output
+    assert "record 2: monster has no name" in result.output
+    assert "record 4: monster name has no letters or numbers: '???'" in \
+            result.output
+    assert result.exit_code == 1
+
+    monsters_dir = content_dir.join('imported', 'monsters')
+    goblin = toml.loads(monsters_dir.join('goblin.toml').read())
+    assert goblin == {'name': 'goblin', 'max_hp': '2d6',
+            'image_url': 'goblin.png'}
+    assert content_dir.join('imported', 'images', 'monsters',
+            'goblin.png').check()
+    assert toml.loads(monsters_dir.join('skeleton.toml').read())['max_hp'] \
+            == 13
+    assert not monsters_dir.join('.toml').check()
@@ -0,0 +1,60 @@
+import random
+from collections import Counter
+
+import pytest
+
+from dndme.random_tables import AliasSampler, RandomTable, \
+        RandomTableLoader, dice_weights
+
+
+def test_alias_sampler_matches_weights():
+    sampler = AliasSampler(['a', 'b', 'c', 'd'], [1, 2, 3, 4])
+    rng = random.Random(42)
+    counts = Counter(sampler.sample(rng) for i in range(40000))
+    for choice, weight in zip('abcd', [1, 2, 3, 4]):
+        assert counts[choice] / 40000 == pytest.approx(weight / 10, abs=0.01)
+
+
+def test_alias_sampler_rejects_bad_weights():
+    with pytest.raises(ValueError):
+        AliasSampler([], [])
+    with pytest.raises(ValueError):
+        AliasSampler(['a', 'b'], [0, 0])
+
+
+def test_dice_weights():
+    assert dice_weights('1d4') == {1: 1, 2: 1, 3: 1, 4: 1}
+    assert dice_weights('2d6')[7] == 6
+    assert dice_weights('1d4+2') == {3: 1, 4: 1, 5: 1, 6: 1}
+
+
+def test_table_weights_and_times():
+    table = RandomTable({
+        'name': 'Road',
+        'dice': '2d6',
+        'entries': {
+            'wolves': {'roll': '2-4', 'monster': 'wolf', 'count': '1d4'},
+            'ghosts': {'roll': '5-6', 'monster': 'ghost', 'time': 'night'},
+            'nothing': {'roll': '7-12'},
+        },
+    })
+
+    assert [x['weight'] for x in table.entries] == [6, 9, 21]
+    assert len(table.samplers['day'].choices) == 2
+    assert len(table.samplers['night'].choices) == 3
+
+    wolves = table.entries[0]
+    encounter = table.encounter_for(wolves)
+    assert encounter.name == 'Wolves'
+    assert encounter.groups == {'wolf': {'monster': 'wolf', 'count': '1d4'}}
+    assert table.encounter_for(table.entries[2]) is None
+
+
+def test_table_loader():
+    loader = RandomTableLoader('.')
+    assert loader.get_table_keys() == ['wilderness']
+
+    table = loader.get_table('Wilderness')
+    assert table is loader.get_table('wilderness')
+    entry = table.roll('day', random.Random(1))
+    assert entry['key'] in ('goblins', 'mage', 'nothing')
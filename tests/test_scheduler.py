@@ -0,0 +1,189 @@
+import copy
+import threading
+
+import pytest
+import pytoml as toml
+
+from dndme.commands.schedule import Schedule
+from dndme.gametime import Almanac, Calendar, Clock, Date, Time
+from dndme.models import Game
+from dndme.scheduler import Scheduler, load_schedule
+from dndme.writers import ScheduleWriter
+
+
+def load_calendar():
+    with open('calendars/forgotten_realms.toml', 'r') as fin:
+        return Calendar(toml.load(fin))
+
+
+def test_due_events_come_out_in_order():
+    scheduler = Scheduler()
+    scheduler.add(300, "third")
+    scheduler.add(100, "first")
+    scheduler.add(200, "second")
+    scheduler.add(100, "also first")
+    later = scheduler.add(1000, "later")
+
+    assert scheduler.due(50) == []
+    assert [x.message for x in scheduler.due(300)] == \
+            ["first", "also first", "second", "third"]
+    assert scheduler.events == [later]
+
+    scheduler.cancel(later)
+    assert len(scheduler) == 0
+
+
+def test_events_fire_as_the_timeline_moves():
+    calendar = load_calendar()
+    timeline = calendar.timeline
+    scheduler = Scheduler()
+    fired = []
+    timeline.add_listener(lambda previous, minutes:
+            fired.extend(x.message for x in scheduler.due(minutes)))
+
+    start = timeline.minutes
+    scheduler.add(start + 60, "an hour in")
+    scheduler.add(start + 3 * 24 * 60, "three days in")
+
+    calendar.adjust_date(1)
+    assert fired == ["an hour in"]
+    timeline.advance(2 * 24 * 60)
+    assert fired == ["an hour in", "three days in"]
+
+
+def test_schedule_round_trip(tmpdir):
+    calendar = load_calendar()
+    timeline = calendar.timeline
+    scheduler = Scheduler()
+    ritual = timeline.minutes_at(Date(15, 'Mirtul', 1489), Time(19, 30))
+    scheduler.add(ritual, "The ritual begins")
+    scheduler.add(ritual - 60, "/log Cultists gather")
+
+    filename = str(tmpdir.join('schedule.toml'))
+    ScheduleWriter(filename).write(scheduler, timeline)
+    with open(filename, 'r') as fin:
+        assert toml.load(fin)['events'][0] == {'date': "15 Mirtul 1489",
+                'time': "18:30", 'message': "/log Cultists gather"}
+
+    loaded = load_schedule(filename, timeline)
+    assert [(x.minutes, x.message) for x in loaded.events] == \
+            [(x.minutes, x.message) for x in scheduler.events]
+
+
+class FakeCommand:
+
+    def __init__(self):
+        self.calls = []
+        self.messages = []
+
+    def do_command(self, *args):
+        self.calls.append(args)
+
+    def log_message(self, message, with_bullet=False):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def game(tmpdir):
+    calendar = load_calendar()
+    calendar.timeline.time = Time(12, 0)
+    game = Game(base_dir='', encounters_dir='', party_file='', log_file=None,
+            calendar=calendar, clock=Clock(timeline=calendar.timeline),
+            almanac=Almanac(calendar), latitude=41, stash={}, combats=[],
+            commands={'log': FakeCommand(), 'fake': FakeCommand()},
+            timeline=calendar.timeline,
+            schedule_file=str(tmpdir.join('schedule.toml')),
+            scheduler=Scheduler(calendar.timeline))
+    Schedule(game, None, None)
+    return game
+
+
+def test_parse_when(game):
+    schedule = game.commands['schedule']
+    timeline = game.timeline
+    day = timeline.minutes_in_day
+
+    assert schedule.parse_when("in 3 days".split()) == \
+            (timeline.minutes + 3 * day, [])
+    assert schedule.parse_when("in 1 hour 30 minutes The guard".split()) == \
+            (timeline.minutes + 90, ["The", "guard"])
+
+    dusk, dusk_date = game.almanac.dusk(Date(15, 'Mirtul', 1488), 41)
+    assert schedule.parse_when(
+            "at dusk on 15 Mirtul The werewolves hunt".split()) == \
+            (timeline.minutes_at(dusk_date, dusk),
+            ["The", "werewolves", "hunt"])
+
+    # Already gone today, so tomorrow
+    assert schedule.parse_when("at 08:00 Breakfast".split()) == \
+            (timeline.minutes + 20 * 60, ["Breakfast"])
+
+    for words in ("in a while", "at 25:00 Late", "on 40 Hammer Nope", "x"):
+        with pytest.raises(ValueError):
+            schedule.parse_when(words.split())
+
+
+def test_past_times_are_rejected(game, capsys):
+    schedule = game.commands['schedule']
+    schedule.do_command(*"on 1 Hammer 1400 Too late".split())
+    schedule.do_command(*"at 08:00 on 1 Hammer 1488 Too late".split())
+    assert capsys.readouterr().out.count("already passed") == 2
+    assert not len(game.scheduler)
+
+
+def test_due_events_are_logged_and_run(game, capsys, tmpdir):
+    schedule = game.commands['schedule']
+    schedule.do_command(*"in 1 hour The caravan arrives".split())
+    schedule.do_command(*"in 2 hours /fake it up".split())
+    schedule.do_command(*"in 3 days Much later".split())
+    with open(game.schedule_file, 'r') as fin:
+        assert len(toml.load(fin)['events']) == 3
+
+    game.changed = False
+    game.pass_time(150)
+    assert game.commands['log'].messages == [
+            "1 Hammer 1488 13:00: The caravan arrives",
+            "1 Hammer 1488 14:00: /fake it up"]
+    assert game.commands['fake'].calls == [("it", "up")]
+    assert "Scheduled for 1 Hammer 1488 13:00: The caravan arrives" in \
+            capsys.readouterr().out
+    assert game.changed
+    assert [x.message for x in game.scheduler.events] == ["Much later"]
+    with open(game.schedule_file, 'r') as fin:
+        assert len(toml.load(fin)['events']) == 1
+
+
+def test_events_only_fire_on_the_main_thread(game):
+    game.commands['schedule'].do_command(*"in 1 hour /fake".split())
+
+    thread = threading.Thread(target=game.timeline.advance, args=(120,))
+    thread.start()
+    thread.join()
+    assert not game.commands['fake'].calls
+
+    game.timeline.advance(1)
+    assert game.commands['fake'].calls == [()]
+
+
+def test_events_stay_on_their_dates_when_the_calendar_changes(game):
+    calendar = game.calendar
+    schedule = game.commands['schedule']
+    schedule.do_command(*"at 09:00 on 1 Tarsakh 1488 /fake".split())
+
+    cal_data = copy.deepcopy(calendar.cal_data)
+    cal_data['months']['hammer']['days'] = 40
+    calendar.cal_data = cal_data
+    assert not game.commands['fake'].calls
+    game.scheduler.rebuild()
+
+    assert calendar.date == Date(1, 'Hammer', 1488)
+    assert game.clock.hour == 12
+    event, = game.scheduler.events
+    assert game.timeline.date_and_time(event.minutes) == \
+            (Date(1, 'Tarsakh', 1488), Time(9, 0))
+
+    game.timeline.advance(1)
+    assert not game.commands['fake'].calls
+    game.timeline.minutes = event.minutes
+    assert game.commands['fake'].calls == [()]
+    assert game.commands['log'].messages == ["1 Tarsakh 1488 09:00: /fake"]
@@ -0,0 +1,70 @@
+import pytoml as toml
+
+from dndme.commands.show_calendar import ShowCalendar
+from dndme.commands.travel import Travel
+from dndme.gametime import Almanac, Calendar, Clock, Date, Time
+from dndme.models import Game
+from dndme.shell import bottom_toolbar
+
+
+def make_game(latitude):
+    with open('calendars/forgotten_realms.toml', 'r') as fin:
+        calendar = Calendar(toml.load(fin))
+    calendar.timeline.time = Time(12, 0)
+    return Game(base_dir='', encounters_dir='', party_file='', log_file=None,
+            calendar=calendar, clock=Clock(timeline=calendar.timeline),
+            almanac=Almanac(calendar), latitude=latitude, stash={},
+            combats=[], commands={}, timeline=calendar.timeline)
+
+
+def toolbar_text(game):
+    return ''.join(text for style, text in bottom_toolbar(game))
+
+
+def test_toolbar_at_the_poles():
+    game = make_game(41)
+    assert "☀️" in toolbar_text(game)
+    game.clock.set_time(23, 0)
+    assert "✨" in toolbar_text(game)
+
+    # Deep in winter, the sun never rises up north...
+    game = make_game(70)
+    assert game.almanac.dawn(game.calendar.date, 70) is None
+    assert "✨" in toolbar_text(game)
+    game.clock.set_time(0, 0)
+    assert "✨" in toolbar_text(game)
+
+    # ...and never sets down south
+    game.latitude = -70
+    assert "☀️" in toolbar_text(game)
+
+    game.calendar.date = Date(20, 'Kythorn', 1488)
+    assert "✨" in toolbar_text(game)
+
+
+def test_toolbar_after_travelling_to_the_pole(capsys):
+    game = make_game(41)
+    travel = Travel(game, None, None)
+    travel.do_command('6', '10')
+
+    assert game.latitude == 90
+    assert "no sunrise or sunset" in capsys.readouterr().out
+    assert "90°N" in toolbar_text(game)
+    assert "✨" in toolbar_text(game)
+
+
+def test_calendar_with_awkward_names(tmp_path, capsys):
+    game = make_game(41)
+    month = next(iter(game.calendar.cal_data['months'].values()))
+    month['name'] = "Ice & <Snow>"
+    calendar = ShowCalendar(game, None, None)
+
+    lines = calendar.render_year(1488)
+    assert "1-30 Ice &amp; &lt;Snow&gt;" in lines
+
+    handout = tmp_path / 'handout.txt'
+    calendar.do_command('1488', '>', str(handout))
+    assert "1-30 Ice & <Snow>\n" in handout.read_text()
+
+    calendar.do_command('0..100000')
+    assert "Can only show up to" in capsys.readouterr().out
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import pytoml as toml
+
+from dndme.gametime import Calendar, Date, Time
+from dndme.weather import Climate, Weather
+
+
+def load_weather(seed='example', **changes):
+    with open('calendars/forgotten_realms.toml', 'r') as fin:
+        cal_data = toml.load(fin)
+    cal_data['weather'].update(changes)
+    calendar = Calendar(cal_data)
+    return Weather(calendar, cal_data['weather'], seed=seed)
+
+
+def test_weather_is_the_same_for_a_campaign():
+    weather = load_weather()
+    other = load_weather()
+    climate = weather.climate(41)
+
+    year = weather.year(1488, climate)
+    assert np.array_equal(year.daily, other.year(1488, climate).daily)
+    assert weather.at(Date(5, 'Ches', 1488), Time(9, 0), 41) == \
+            other.at(Date(5, 'Ches', 1488), Time(9, 0), 41)
+    assert not np.array_equal(year.daily,
+            load_weather(seed='another').year(1488, climate).daily)
+
+
+def test_climates_and_seasons():
+    weather = load_weather(hourly_change=0)
+    assert weather.climate(10).name == 'tropical'
+    assert weather.climate(-41).name == 'temperate'
+    assert weather.climate(80).name == 'polar'
+
+    seasons = weather.seasons(1488)
+    calendar = weather.calendar
+    start = calendar.year_start(1488)
+    assert seasons[0] == 'winter'
+    assert seasons[calendar.ordinal(Date(20, 'Kythorn', 1488)) - start] == \
+            'summer'
+    assert weather.seasons(1488, southern=True)[0] == 'summer'
+
+    # No snow in a temperate summer
+    climate = weather.climate(41)
+    daily = weather.year(1488, climate).daily
+    summer = np.array([x == 'summer' for x in seasons])
+    assert climate.states.index('snow') not in daily[summer]
+
+
+def test_hourly_weather():
+    weather = load_weather(hourly_change=0.5)
+    climate = weather.climate(41)
+    year = weather.year(1488, climate)
+    assert year.hourly.shape == (len(year.daily), 24)
+    assert np.array_equal(year.hourly[:, 0], year.daily)
+    assert (year.hourly[:, 1:] != year.hourly[:, :-1]).any()
+    assert weather.at(Date(1, 'Hammer', 1488), Time(13, 0), 41) == \
+            climate.states[year.hourly[0, 13]]
+
+
+def test_bad_chains():
+    with pytest.raises(ValueError):
+        Climate('odd', {'transitions': {'clear': {'hail': 1}}})
+    with pytest.raises(ValueError):
+        Climate('stuck', {'transitions': {'clear': {}}})